@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Check and measure animated display (lib.animate)
+
+Plays every effect on generated art, ASCII and wide characters, feeding
+each frame's output to a small terminal emulator. Reports render time and
+bytes per frame next to redrawing the whole art every frame, and fails if
+the emulated screen ever differs from the frame, or if a player on a
+terminal slower than the frame rate overruns its time budget:
+
+    python bench/animation.py
+    python bench/animation.py --size 120x40 --gradient diagonal
+"""
+
+import io
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+ESCAPE_RE = re.compile(r'\033\[\??([0-9;]*)([A-Za-z])|.', re.DOTALL)
+
+class Terminal:
+    """Just enough of a terminal to replay the player's output"""
+    
+    def __init__(self, rows: int, cols: int):
+        from lib.animate import BLANK
+        self.cells = [[BLANK] * cols for _ in range(rows)]
+        self.row = self.col = 0
+        self.style = ''
+    
+    def feed(self, text: str):
+        from lib.animate import _apply_sgr
+        from lib.width import char_width
+        
+        for match in ESCAPE_RE.finditer(text):
+            token = match.group(0)
+            if token[0] == '\033':
+                count = int(match.group(1) or 1) if match.group(1).isdigit() else 1
+                kind = match.group(2)
+                if kind == 'm':
+                    self.style = _apply_sgr(self.style, token)
+                elif kind == 'A':
+                    self.row -= count
+                elif kind == 'B':
+                    self.row += count
+                elif kind == 'C':
+                    self.col += count
+                elif kind == 'D':
+                    self.col -= count
+            elif token == '\r':
+                self.col = 0
+            elif token == '\n':
+                self.row += 1
+            elif char_width(token) == 0:
+                row = self.cells[self.row]
+                lead = self.col - 1 if row[self.col - 1][0] else self.col - 2
+                row[lead] = (row[lead][0] + token, row[lead][1])
+            else:
+                self.cells[self.row][self.col] = (token, self.style)
+                if char_width(token) == 2:
+                    self.cells[self.row][self.col + 1] = ('', self.style)
+                self.col += char_width(token)
+
+def generate(cols: int, rows: int, wide: bool, seed: int) -> str:
+    """Art with ragged lines and blank patches, optionally with wide characters"""
+    rng = random.Random(seed)
+    chars = list('  ..::--==++**##%%@@') + (['木', '火', '🌲', '🚀'] if wide else [])
+    lines = []
+    for _ in range(rows):
+        line, width = '', 0
+        while width < rng.randint(cols * 3 // 4, cols):
+            char = rng.choice(chars)
+            if width + (2 if ord(char) > 0x2000 else 1) > cols:
+                break
+            line += char
+            width += 2 if ord(char) > 0x2000 else 1
+        lines.append(line)
+    return '\n'.join(lines)
+
+class SlowTerminal(io.StringIO):
+    """A terminal that takes `delay` seconds per write, like a congested link"""
+    
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+    
+    def write(self, text):
+        time.sleep(self.delay)
+        return super().write(text)
+
+@click.command()
+@click.option('--size', default='80x24', show_default=True, help='Art columns x rows')
+@click.option('--gradient', default='vertical', show_default=True, help='DISPLAY_GRADIENT for the art')
+@click.option('--frames', default=30, show_default=True, help='Frames per effect')
+@click.option('--seed', default=1, show_default=True, help='Random seed for the art')
+def main(size, gradient, frames, seed):
+    """Replay each effect through an emulated terminal and report its cost"""
+    os.environ.update({'DISPLAY_GRADIENT': gradient, 'COLOR_DEPTH': 'truecolor', 'DISPLAY_COLOR': 'true',
+                       'RANDOM_COLOR': 'false'})
+    from lib.animate import AnimationPlayer, Screen, play_frames, rain, scroll, to_grid, typewriter
+    from lib.display import ArtDisplay
+    
+    cols, rows = (int(n) for n in size.split('x'))
+    display = ArtDisplay()
+    failures = []
+    for wide in (False, True):
+        art = generate(cols, rows, wide, seed)
+        final = to_grid(display.render(art, theme='cyberpunk'), rows, cols)
+        multi = [to_grid(display.render(generate(cols, rows, wide, seed + i), theme='cyberpunk'), rows, cols)
+                 for i in range(4)] + [final]
+        full = len(display.render(art, theme='cyberpunk').encode('utf-8'))
+        effects = {
+            'frames': play_frames(multi, frames),
+            'rain': rain(final, frames, random.Random(seed)),
+            'typewriter': typewriter(final, frames),
+            'scroll': scroll(final, frames),
+        }
+        for name, grids in effects.items():
+            screen = Screen(rows, cols)
+            terminal = Terminal(rows + 1, cols)
+            terminal.feed(screen.reserve())
+            times, sizes = [], []
+            for index, grid in enumerate(grids):
+                start = time.perf_counter()
+                text = screen.update(grid)
+                times.append(time.perf_counter() - start)
+                sizes.append(len(text.encode('utf-8')))
+                terminal.feed(text)
+                if terminal.cells[:rows] != grid:
+                    failures.append(f"{name}{' (wide)' if wide else ''}: screen differs after frame {index}")
+                    break
+            terminal.feed(screen.finish())
+            if (terminal.row, terminal.col) != (rows, 0):
+                failures.append(f"{name}: cursor left at {terminal.row},{terminal.col}")
+            times.sort()
+            click.echo(f"{name:>10}{' wide' if wide else '':5}: {len(sizes)} frames, render "
+                       f"{times[len(times) // 2] * 1e6:6.0f} us median, {times[-1] * 1e6:6.0f} us max; "
+                       f"{sum(sizes) / len(sizes):7.0f} bytes per frame (full redraw {full}), "
+                       f"{max(sizes)} max")
+    
+    # A terminal slower than the frame rate must not stretch the budget
+    budget = 0.5
+    player = AnimationPlayer(out=SlowTerminal(0.03), fps=30, budget=budget)
+    start = time.monotonic()
+    player.play(typewriter(final, player.frame_count()), final)
+    elapsed = time.monotonic() - start
+    report = player.report()
+    click.echo(f"slow terminal: {report['frames']} frames drawn, {report['dropped']} dropped "
+               f"in {elapsed:.2f}s (budget {budget}s)")
+    terminal = Terminal(rows + 1, cols)
+    terminal.feed(player.out.getvalue())
+    if terminal.cells[:rows] != final or (terminal.row, terminal.col) != (rows, 0):
+        failures.append("player output doesn't end on the final frame below the art")
+    # Allow for one write that takes longer than the last
+    if elapsed > budget + 0.03:
+        failures.append(f"played {elapsed:.2f}s on a slow terminal, budget {budget}s")
+    
+    if failures:
+        for failure in failures:
+            click.echo(f"FAIL: {failure}", err=True)
+        sys.exit(1)
+    click.echo("OK: every frame reached the screen intact within the budget")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Time bulk imports of synthetic art into a scratch cache
+
+Writes a directory of generated pieces (a tenth with sidecar metadata, plus
+exact duplicates and unreadable files), a tar.gz of the same files, and
+imports the directory and then the archive into a fresh cache. Fails if
+pieces go missing, duplicates are imported or sidecars are ignored:
+
+    python bench/bulk_import.py --pieces 10000
+    python bench/bulk_import.py --backend pack --jobs 8
+"""
+
+import os
+import sys
+import json
+import random
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lib.bulk import import_sources
+
+CHARS = ' .:-=+*#%@/\\|_()[]<>^v~oO0'
+
+def write_pieces(directory: Path, count: int, seed: int) -> int:
+    """Write count pieces plus duplicates and bad files, return sidecar count"""
+    rng = random.Random(seed)
+    sidecars = 0
+    for i in range(count):
+        art = '\n'.join(''.join(rng.choice(CHARS) for _ in range(40)) for _ in range(12))
+        folder = directory / f"set{i % 8}"
+        folder.mkdir(exist_ok=True)
+        (folder / f"piece{i}.txt").write_text(art + '  \r\n\n')
+        if i % 10 == 0:
+            (folder / f"piece{i}.json").write_text(json.dumps({'theme': 'space', 'prompt': f"piece {i}"}))
+            sidecars += 1
+    for i in range(0, count, max(1, count // 20)):
+        folder = directory / f"set{i % 8}"
+        (folder / f"zcopy{i}.txt").write_text((folder / f"piece{i}.txt").read_text())
+    (directory / 'binary.txt').write_bytes(b'\xff\xfe\x00\x01')
+    (directory / 'blank.txt').write_text('\n   \n')
+    return sidecars
+
+@click.command()
+@click.option('--pieces', default=10000, show_default=True, help='Pieces to generate')
+@click.option('--backend', type=click.Choice(['files', 'pack']), default='files', show_default=True)
+@click.option('--jobs', '-j', type=int, help='Worker processes (default: CPU count)')
+@click.option('--seed', default=1, show_default=True, help='Random seed for the generated art')
+def main(pieces, backend, jobs, seed):
+    """Import generated pieces from a directory and a tar.gz and check the results"""
+    os.environ.update({'CACHE_BACKEND': backend, 'CACHE_SIZE': str(pieces * 2), 'DEDUP_MODE': 'off'})
+    from lib.cache import open_cache
+    
+    failures = []
+    with tempfile.TemporaryDirectory() as scratch:
+        source = Path(scratch) / 'art'
+        source.mkdir()
+        sidecars = write_pieces(source, pieces, seed)
+        archive = Path(scratch) / 'art.tar.gz'
+        with tarfile.open(archive, 'w:gz') as tar:
+            tar.add(source, arcname='art')
+        
+        cache = open_cache(Path(scratch) / 'cache')
+        defaults = {'prompt': 'bench', 'theme': 'custom', 'style': 'ASCII art'}
+        for label, sources, expected in (('directory', [str(source)], pieces), ('tar.gz', [str(archive)], 0)):
+            start = time.perf_counter()
+            report = import_sources(cache, sources, defaults, jobs=jobs)
+            elapsed = time.perf_counter() - start
+            imported = len(report['imported'])
+            seconds = report['seconds']
+            click.echo(f"{label}: {imported} of {report['found']} imported in {elapsed:.2f}s "
+                       f"({imported / elapsed:.0f}/s; prepare {seconds['prepare']:.2f}s, "
+                       f"save {seconds['save']:.2f}s), {len(report['duplicates'])} duplicates, "
+                       f"{len(report['failed'])} failed")
+            if imported != expected:
+                failures.append(f"{label}: imported {imported}, expected {expected}")
+            if len(report['failed']) != 2:
+                failures.append(f"{label}: {len(report['failed'])} failed, expected 2")
+        
+        cache = open_cache(Path(scratch) / 'cache')
+        themed = sum(1 for item in cache.iter_cached_art() if item['theme'] == 'space')
+        if cache.size() != pieces:
+            failures.append(f"cache holds {cache.size()} pieces, expected {pieces}")
+        if themed != sidecars:
+            failures.append(f"{themed} pieces took their theme from a sidecar, expected {sidecars}")
+        stored = cache.get_art_by_id(cache.ids()[0])
+        if stored != stored.strip('\n') or ' \n' in stored:
+            failures.append("stored art was not normalised")
+    
+    if failures:
+        for failure in failures:
+            click.echo(f"FAIL: {failure}", err=True)
+        sys.exit(1)
+    click.echo("OK: every piece imported once with its sidecar metadata")
+
+if __name__ == '__main__':
+    main()
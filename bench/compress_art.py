@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Check dictionary-compressed storage on a scratch cache
+
+Saves generated pieces sharing a style (borders, motifs and shading runs)
+into a per-file cache with CACHE_COMPRESS=zlib, runs recompress and
+compares the result with deflating each piece without a dictionary. Fails
+if a piece doesn't read back intact, if the dictionary doesn't beat plain
+deflate or if switching compression off doesn't restore plain text:
+
+    python bench/compress_art.py --pieces 5000
+    python bench/compress_art.py --dict-size 16384
+"""
+
+import os
+import sys
+import random
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+MOTIFS = ['  /\\_/\\  ', ' ( o.o ) ', '  > ^ <  ', '|~~~~~~~|', '.:*~*:._.', '[##]', '<==>',
+          '~~~~', '((@))', '  ||  ', '_/\\_', '\\____/']
+FILL = ' .:-=+*#%@'
+
+def generate(rng: random.Random, width: int = 40, height: int = 12) -> str:
+    """Generate a framed piece from the shared motifs and shading"""
+    border = '+' + '-' * (width - 2) + '+'
+    lines = [border]
+    for _ in range(height - 2):
+        row = ''
+        while len(row) < width - 2:
+            roll = rng.random()
+            if roll < 0.4:
+                row += rng.choice(MOTIFS)
+            elif roll < 0.7:
+                row += rng.choice(FILL) * rng.randint(2, 8)
+            else:
+                row += rng.choice(FILL)
+        lines.append('|' + row[:width - 2] + '|')
+    lines.append(border)
+    return '\n'.join(lines)
+
+@click.command()
+@click.option('--pieces', default=2000, show_default=True, help='Pieces to generate')
+@click.option('--dict-size', default=32768, show_default=True, help='Dictionary size in bytes')
+@click.option('--seed', default=1, show_default=True, help='Random seed for the generated art')
+def main(pieces, dict_size, seed):
+    """Compress generated pieces with a trained dictionary and check them"""
+    os.environ.update({'CACHE_BACKEND': 'files', 'CACHE_SIZE': str(pieces), 'DEDUP_MODE': 'off',
+                       'CACHE_COMPRESS': 'zlib'})
+    from lib.cache import ArtCache
+    
+    rng = random.Random(seed)
+    arts = [generate(rng) for _ in range(pieces)]
+    failures = []
+    with tempfile.TemporaryDirectory() as scratch:
+        cache = ArtCache(Path(scratch) / 'cache')
+        art_ids = cache.save_many([{'art': art, 'theme': 'bench'} for art in arts])
+        report = cache.recompress(dict_size)
+        
+        plain = sum(len(zlib.compress(art.encode('utf-8'), 9)) - 6 for art in arts)
+        ratio = report['text_bytes'] / report['stored_bytes']
+        decode = report['decode_us']
+        click.echo(f"{pieces} pieces, {report['text_bytes'] / 1024:.0f} KiB as text")
+        click.echo(f"  deflate per piece:       {report['text_bytes'] / plain:.2f}x")
+        click.echo(f"  with {report['dictionary_bytes'] / 1024:.0f} KiB dictionary:  {ratio:.2f}x "
+                   f"(trained in {report['train_seconds']:.2f}s)")
+        click.echo(f"  decode {decode['p50']:.0f} us median, {decode['p99']:.0f} us p99, "
+                   f"dictionary read {report['dictionary_load_us']:.0f} us")
+        if report['stored_bytes'] >= plain:
+            failures.append(f"dictionary stored {report['stored_bytes']} bytes, plain deflate {plain}")
+        
+        # A fresh process reads each piece with a cold dictionary
+        reader = ArtCache(Path(scratch) / 'cache')
+        start = time.perf_counter()
+        mismatched = sum(1 for art_id, art in zip(art_ids, arts) if reader.get_art_by_id(art_id) != art)
+        click.echo(f"  read back in {(time.perf_counter() - start) / pieces * 1e6:.0f} us per piece")
+        if mismatched:
+            failures.append(f"{mismatched} pieces read back changed")
+        
+        os.environ['CACHE_COMPRESS'] = 'off'
+        plain_cache = ArtCache(Path(scratch) / 'cache')
+        plain_cache.recompress()
+        names = os.listdir(Path(scratch) / 'cache')
+        if any(name.endswith('.txtz') for name in names) or sum(name.endswith('.txt') for name in names) != pieces:
+            failures.append("CACHE_COMPRESS=off recompress left compressed pieces")
+        if any(plain_cache.get_art_by_id(art_id) != art for art_id, art in zip(art_ids, arts)):
+            failures.append("pieces changed on the way back to plain text")
+    
+    if failures:
+        for failure in failures:
+            click.echo(f"FAIL: {failure}", err=True)
+        sys.exit(1)
+    click.echo("OK: compressed pieces read back intact and beat plain deflate")
+
+if __name__ == '__main__':
+    main()
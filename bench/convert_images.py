@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""Time local image conversion against fetching from the API
+
+Writes generated images as PNG (every colour type, bit depth and row
+filter) and PGM/PPM, checks the built-in decoders read them back exactly,
+then converts the directory in every mode into a scratch cache, in-process
+and with a worker pool. Reports pieces/s next to fetching the same number
+of pieces from an in-process stub API that answers after --api-latency.
+Fails if a piece exceeds ASCII_WIDTH x ASCII_HEIGHT, uses characters
+outside its mode, or an image is not converted:
+
+    python bench/convert_images.py --images 500
+    python bench/convert_images.py --size 800x600 --api-latency 4
+"""
+
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import click
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_openai import StubHandler
+
+# (PNG colour type, bit depth) written in turn
+PNG_FORMATS = ((0, 8), (2, 8), (6, 8), (3, 8), (0, 16), (4, 8), (0, 1), (3, 4))
+
+def picture(rng: np.random.Generator, width: int, height: int) -> np.ndarray:
+    """An RGB picture: a gradient background with a few discs and noise"""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    angle = rng.uniform(0, np.pi)
+    base = (np.cos(angle) * x / width + np.sin(angle) * y / height) * rng.uniform(60, 160)
+    image = np.repeat(base[..., None], 3, axis=2) + rng.uniform(0, 40, 3)
+    for _ in range(rng.integers(2, 6)):
+        cx, cy, r = rng.uniform(0, width), rng.uniform(0, height), rng.uniform(0.05, 0.3) * min(width, height)
+        image[(x - cx) ** 2 + (y - cy) ** 2 < r * r] = rng.uniform(0, 255, 3)
+    image += rng.normal(0, 6, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+def encode_png(rgb: np.ndarray, color_type: int, depth: int, index: int) -> tuple:
+    """Encode as PNG with every row filter in turn; returns (bytes, expected samples)"""
+    height, width = rgb.shape[:2]
+    grey = (rgb @ np.array([0.299, 0.587, 0.114])).astype(np.uint8)
+    palette = None
+    if color_type == 0:
+        samples = grey[..., None]
+        if depth == 1:
+            samples = (samples >= np.median(samples)).astype(np.uint8)
+    elif color_type == 2:
+        samples = rgb
+    elif color_type == 4:
+        samples = np.dstack([grey, np.full_like(grey, 200)])
+    elif color_type == 6:
+        samples = np.dstack([rgb, (np.arange(width, dtype=np.uint8)[None, :] * 7).repeat(height, 0)])
+    else:
+        levels = 1 << depth
+        palette = np.stack([np.linspace(0, 255, levels), np.linspace(255, 0, levels), np.full(levels, 99)],
+                           axis=1).astype(np.uint8)
+        samples = (grey // (256 // levels))[..., None]
+    
+    if depth == 16:
+        raw = (samples.astype('>u2') * 257).tobytes()
+        rows = np.frombuffer(raw, dtype=np.uint8).reshape(height, -1)
+        expected = samples
+    elif depth < 8:
+        per_byte = 8 // depth
+        padded = np.zeros((height, -(-width // per_byte) * per_byte), dtype=np.uint8)
+        padded[:, :width] = samples[..., 0]
+        shifts = np.arange(8 - depth, -1, -depth, dtype=np.uint8)
+        rows = (padded.reshape(height, -1, per_byte) << shifts).sum(axis=2).astype(np.uint8)
+        expected = samples * (255 if color_type == 0 else 1)
+    else:
+        rows = samples.reshape(height, -1)
+        expected = samples
+    if palette is not None:
+        expected = palette[samples[..., 0]]
+    
+    bpp = max(1, samples.shape[2] * depth // 8)
+    filtered = bytearray()
+    previous = np.zeros(rows.shape[1], dtype=np.int64)
+    for y, row in enumerate(rows.astype(np.int64)):
+        kind = (index + y) % 5
+        left = np.concatenate([np.zeros(bpp, dtype=np.int64), row[:-bpp]])
+        corner = np.concatenate([np.zeros(bpp, dtype=np.int64), previous[:-bpp]])
+        if kind == 0:
+            out = row
+        elif kind == 1:
+            out = row - left
+        elif kind == 2:
+            out = row - previous
+        elif kind == 3:
+            out = row - (left + previous) // 2
+        else:
+            estimate = left + previous - corner
+            pa, pb, pc = abs(estimate - left), abs(estimate - previous), abs(estimate - corner)
+            out = row - np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, previous, corner))
+        filtered.append(kind)
+        filtered += (out & 0xff).astype(np.uint8).tobytes()
+        previous = row
+    
+    def chunk(kind: bytes, body: bytes) -> bytes:
+        return struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body))
+    
+    data = b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, depth, color_type, 0, 0, 0))
+    if palette is not None:
+        data += chunk(b'PLTE', palette.tobytes())
+    data += chunk(b'IDAT', zlib.compress(bytes(filtered), 6)) + chunk(b'IEND', b'')
+    return data, expected
+
+def encode_netpbm(rgb: np.ndarray, index: int) -> tuple:
+    """Encode as binary PPM, binary PGM or ASCII PGM in turn"""
+    height, width = rgb.shape[:2]
+    kind = index % 3
+    if kind == 0:
+        return f"P6\n# generated\n{width} {height}\n255\n".encode() + rgb.tobytes(), rgb
+    grey = rgb[..., 1:2]
+    if kind == 1:
+        return f"P5 {width} {height} 255\n".encode() + grey.tobytes(), grey
+    body = '\n'.join(' '.join(map(str, row)) for row in grey[..., 0])
+    return f"P2\n{width} {height}\n255\n{body}\n".encode(), grey
+
+def write_images(directory: Path, count: int, size: str, seed: int) -> list:
+    """Write count images, return decode mismatches"""
+    from lib.convert import read_image
+    
+    rng = np.random.default_rng(seed)
+    width, height = (int(n) for n in size.split('x'))
+    failures = []
+    for i in range(count):
+        rgb = picture(rng, int(width * rng.uniform(0.6, 1.4)), int(height * rng.uniform(0.6, 1.4)))
+        if i % 4 == 3:
+            data, expected = encode_netpbm(rgb, i)
+            name = f"image{i}.{'ppm' if i % 3 == 0 else 'pgm'}"
+        else:
+            color_type, depth = PNG_FORMATS[i % len(PNG_FORMATS)]
+            data, expected = encode_png(rgb, color_type, depth, i)
+            name = f"image{i}.png"
+        (directory / name).write_bytes(data)
+        if i < 4 * len(PNG_FORMATS):
+            decoded = read_image(data)
+            if decoded.shape != expected.shape or not np.array_equal(decoded, expected.astype(np.uint8)):
+                failures.append(f"{name} decoded differently from what was written")
+    return failures
+
+def check_art(art: str, mode: str, width: int, height: int) -> str:
+    """Describe what's wrong with a converted piece, or return ''"""
+    from lib.convert import QUADRANTS, RAMP
+    
+    lines = art.split('\n')
+    if len(lines) > height or max(len(line) for line in lines) > width:
+        return f"{max(len(line) for line in lines)}x{len(lines)} exceeds {width}x{height}"
+    allowed = {'ascii': set(RAMP), 'blocks': set(QUADRANTS),
+               'braille': {chr(code) for code in range(0x2800, 0x2900)} | {' '}}[mode]
+    stray = set(art) - allowed - {'\n'}
+    return f"characters outside {mode} mode: {''.join(sorted(stray))!r}" if stray else ''
+
+def fetch_rate(pieces: int, latency: float, concurrency: int) -> float:
+    """Pieces per second fetched from an in-process stub API"""
+    from lib.fetch import ArtFetcher
+    
+    StubHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({'OPENAI_BASE_URL': f"http://127.0.0.1:{server.server_address[1]}/v1",
+                       'OPENAI_API_KEY': 'stub'})
+    try:
+        start = time.perf_counter()
+        results, errors = ArtFetcher().fetch_batch(pieces, concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    return len(results) / elapsed
+
+@click.command()
+@click.option('--images', default=200, show_default=True, help='Images to generate and convert')
+@click.option('--size', default='320x240', show_default=True, help='Typical image width x height')
+@click.option('--width', default=80, show_default=True, help='ASCII_WIDTH for the conversion')
+@click.option('--height', default=24, show_default=True, help='ASCII_HEIGHT for the conversion')
+@click.option('--jobs', default=os.cpu_count() or 1, show_default=True, help='Worker processes for the pool run')
+@click.option('--api-pieces', default=8, show_default=True, help='Pieces to fetch from the stub API')
+@click.option('--api-latency', default=2.0, show_default=True, help='Seconds the stub takes per request')
+@click.option('--seed', default=1, show_default=True, help='Random seed for the images')
+def main(images, size, width, height, jobs, api_pieces, api_latency, seed):
+    """Convert generated images in every mode and compare with the API"""
+    os.environ.update({'ASCII_WIDTH': str(width), 'ASCII_HEIGHT': str(height), 'CACHE_SIZE': str(images * 4),
+                       'DEDUP_MODE': 'off', 'AUTO_FETCH': 'false', 'CACHE_BACKEND': 'pack'})
+    from lib.bulk import import_sources
+    from lib.cache import open_cache
+    from lib.convert import IMAGE_PATTERN, MODES, ImageConverter
+    
+    with tempfile.TemporaryDirectory() as scratch:
+        source = Path(scratch) / 'images'
+        source.mkdir()
+        failures = write_images(source, images, size, seed)
+        
+        for mode in MODES:
+            converter = ImageConverter(mode=mode)
+            rates = []
+            for run, run_jobs in enumerate((1, jobs)):
+                cache = open_cache(Path(scratch) / f"cache-{mode}-{run}")
+                start = time.perf_counter()
+                report = import_sources(cache, [str(source)], {'theme': 'bench'}, pattern=IMAGE_PATTERN,
+                                        jobs=run_jobs, prepare_piece=converter.prepare)
+                rates.append(len(report['imported']) / (time.perf_counter() - start))
+                for failed in report['failed']:
+                    failures.append(f"{mode}: {failed['name']}: {failed['error']}")
+                converted = len(report['imported']) + len(report['duplicates'])
+                if converted + len(report['failed']) != images:
+                    failures.append(f"{mode}: {converted} of {images} images converted")
+            for item in cache.iter_cached_art():
+                problem = check_art(cache.get_art_by_id(item['id']), mode, width, height)
+                if problem:
+                    failures.append(f"{mode} {item['id']}: {problem}")
+                    break
+            click.echo(f"{mode:>8}: {rates[0]:7.0f} pieces/s in-process, {rates[1]:7.0f} pieces/s "
+                       f"with {jobs} workers")
+    
+    api = fetch_rate(api_pieces, api_latency, int(os.getenv('FETCH_CONCURRENCY', '4')))
+    click.echo(f"     api: {api:7.2f} pieces/s ({api_pieces} fetches, {api_latency}s latency, stub server)")
+    
+    if failures:
+        for failure in failures:
+            click.echo(f"FAIL: {failure}", err=True)
+        sys.exit(1)
+    click.echo("OK: every image decoded and converted within ASCII_WIDTH x ASCII_HEIGHT")
+
+if __name__ == '__main__':
+    main()
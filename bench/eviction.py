@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Time lru/lfu eviction per save as the cache grows
+
+Drives an Evictor the way a save does: shows are logged between saves, each
+save adds a piece and evicts to stay within CACHE_SIZE. Every pick is
+compared with ranking all pieces from scratch. Deleting and unpinning
+pieces between saves forces usage.heap to be rebuilt, and it has to keep
+the shows. Fails if a pick differs from the full ranking or if a save at the
+largest size takes longer than --max-ms:
+
+    python bench/eviction.py --pieces 10000 --pieces 100000
+    python bench/eviction.py --policy lfu --saves 500
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+def expected_victim(pieces: dict, usage: dict, policy: str, protected: str) -> str:
+    """Rank every unpinned piece as lru/lfu define it and return the first"""
+    def rank(art_id):
+        created, _, _ = pieces[art_id]
+        shows, last_shown = usage.get(art_id, (0, 0.0))
+        recent = max(last_shown, created)
+        key = (shows, recent, created) if policy == 'lfu' else (recent, created)
+        return (art_id == protected, *key, art_id.encode())
+    
+    return min((art_id for art_id, (_, _, pinned) in pieces.items() if not pinned), key=rank)
+
+@click.command()
+@click.option('--pieces', 'sizes', multiple=True, type=int, default=(10000, 100000), show_default=True,
+              help='Cache size, repeatable')
+@click.option('--policy', type=click.Choice(['lru', 'lfu', 'both']), default='both', show_default=True)
+@click.option('--saves', default=100, show_default=True, help='Saves timed per size')
+@click.option('--shows', default=20, show_default=True, help='Pieces shown between saves')
+@click.option('--max-ms', default=10.0, show_default=True, help='Allowed median time per save')
+def main(sizes, policy, saves, shows, max_ms):
+    """Report rebuild and per-save eviction times per cache size"""
+    from lib.eviction import Evictor, record_show
+    
+    failures = []
+    for name in (('lru', 'lfu') if policy == 'both' else (policy,)):
+        os.environ['EVICTION'] = name
+        for size in sizes:
+            rng = random.Random(size)
+            with tempfile.TemporaryDirectory() as scratch:
+                directory = Path(scratch)
+                start = 1.7e9
+                # ID -> (created, bytes, pinned); every 50th piece pinned
+                pieces = {f"{i:08x}": (start + i, 100, i % 50 == 0) for i in range(size)}
+                usage = {}
+                budget = sum(1 for _, _, pinned in pieces.values() if not pinned)
+                evictor = Evictor(directory, budget, policy=name)
+                clock = start + size
+                stamp = 0
+                times = []
+                
+                def save(number: int):
+                    """Save one piece, check and apply the pick, return the time select took"""
+                    nonlocal stamp
+                    art_id = f"new{number:05d}"
+                    pieces[art_id] = (clock + number, 100, False)
+                    expected = expected_victim(pieces, usage, name, art_id)
+                    entries = ((key, *value) for key, value in pieces.items())
+                    began = time.perf_counter()
+                    victims = evictor.select(entries, protected=[art_id], totals=(budget + 1, 0),
+                                             lookup=lambda key: (key, *pieces[key]) if key in pieces else None,
+                                             stamp=stamp)
+                    stamp += 1
+                    evictor.saved(stamp)
+                    took = time.perf_counter() - began
+                    if victims != [expected]:
+                        failures.append(f"{name} {size}: save {number} evicted {victims}, expected {expected}")
+                    for victim in victims:
+                        del pieces[victim]
+                        usage.pop(victim, None)
+                    return took
+                
+                rebuild = save(0)
+                for number in range(1, saves + 1):
+                    live = list(pieces)
+                    for _ in range(shows):
+                        art_id = rng.choice(live)
+                        record_show(directory, art_id)
+                        # record_show stamps the wall clock; the check ranks by it too
+                        count, _ = usage.get(art_id, (0, 0.0))
+                        usage[art_id] = (count + 1, time.time())
+                    times.append(save(number))
+                
+                # Deletes change the index stamp and pins invalidate the
+                # heap; both rebuild it, which has to keep the shows
+                for art_id in rng.sample([key for key, value in pieces.items() if not value[2]], 10):
+                    del pieces[art_id]
+                    usage.pop(art_id, None)
+                    budget -= 1
+                stamp += 1
+                # CACHE_SIZE shrinks along, so each save still evicts one
+                evictor.max_items = budget
+                after = save(saves + 1)
+                # The oldest pinned piece, once unpinned, goes next
+                unpinned = min(key for key, value in pieces.items() if value[2])
+                pieces[unpinned] = (pieces[unpinned][0], 100, False)
+                budget += 1
+                evictor.max_items = budget
+                evictor.usage.invalidate()
+                save(saves + 2)
+                
+                median = statistics.median(times) * 1000
+                click.echo(f"{name} {size:>7} pieces: rebuild {rebuild * 1000:8.1f} ms, save {median:6.2f} ms "
+                           f"(median of {saves}), rebuild after deletes {after * 1000:8.1f} ms")
+                if size == max(sizes) and median > max_ms:
+                    failures.append(f"{name} {size}: a save took {median:.2f} ms, expected at most {max_ms} ms")
+    
+    if failures:
+        for failure in failures[:20]:
+            click.echo(f"FAIL: {failure}", err=True)
+        sys.exit(1)
+    click.echo(f"OK: every pick matched a full ranking, saves within {max_ms} ms")
+
+if __name__ == '__main__':
+    main()
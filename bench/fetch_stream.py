@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Check streamed fetching against the stub server
+
+Feeds ArtLines hand-written replies split at awkward places, then fetches
+from an in-process stub server that streams chatty replies taller than
+ASCII_HEIGHT. Fails if fences or preambles leak into the art, if art
+exceeds the configured size or if streams are not closed at the cut-off:
+
+    python bench/fetch_stream.py
+    python bench/fetch_stream.py --fetches 20 --chunk-delay 0.005
+"""
+
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_openai import StubHandler
+from lib.fetch import ArtFetcher, ArtLines
+from lib.width import line_width
+
+# (description, streamed pieces, width, height, expected art)
+PARSER_CASES = [
+    ('plain art', ['/\\\\\n', '\\/\n'], 10, 5, '/\\\\\n\\/'),
+    ('fenced with preamble', ["Here's a cat:\n", '\n```\n', ' /\\_/\\\n', '( o.o )\n', '```\n', 'Enjoy!'],
+     20, 5, ' /\\_/\\\n( o.o )'),
+    ('fence split across chunks', ['`', '``te', 'xt\nab', 'c\n`', '``\nprose'], 10, 5, 'abc'),
+    ('preamble without fence', ['Sure! Here is a tree', ':\n\n  *\n', ' ***\n'], 10, 5, '  *\n ***'),
+    ('cut at height', ['1\n2\n3\n4\n5\n'], 10, 3, '1\n2\n3'),
+    ('trim to width', ['0123456789\n', '日本語の線画\n'], 6, 5, '012345\n日本語'),
+    ('CRLF and unterminated last line', ['a\r\nb\r\n', 'c'], 10, 5, 'a\nb\nc'),
+    ('colon in art is not preamble', ['::==::\n', '-=:=-\n'], 10, 5, '::==::\n-=:=-'),
+]
+
+def check_parser() -> list:
+    """Return descriptions of parser cases that failed"""
+    failures = []
+    for description, pieces, width, height, expected in PARSER_CASES:
+        lines = ArtLines(width, height)
+        for piece in pieces:
+            if lines.feed(piece):
+                break
+        art = lines.finish()
+        status = 'ok' if art == expected else 'FAIL'
+        click.echo(f"  {status:<5}{description}")
+        if art != expected:
+            failures.append(f"{description}: got {art!r}, expected {expected!r}")
+    return failures
+
+@click.command()
+@click.option('--fetches', default=10, show_default=True, help='Streamed fetches to run')
+@click.option('--width', default=30, show_default=True, help='ASCII_WIDTH for the fetches')
+@click.option('--height', default=12, show_default=True, help='ASCII_HEIGHT for the fetches')
+@click.option('--art-height', default=48, show_default=True, help='Lines the stub sends per reply')
+@click.option('--chunk-delay', default=0.002, show_default=True, help='Seconds between streamed chunks')
+def main(fetches, width, height, art_height, chunk_delay):
+    """Check the stream parser and the cut-off against the stub server"""
+    click.echo("Parser:")
+    failures = check_parser()
+    
+    StubHandler.chatty = True
+    StubHandler.art_height = art_height
+    StubHandler.chunk_delay = chunk_delay
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({
+        'OPENAI_BASE_URL': f"http://127.0.0.1:{server.server_address[1]}/v1",
+        'OPENAI_API_KEY': 'stub',
+        'ASCII_WIDTH': str(width),
+        'ASCII_HEIGHT': str(height),
+        'ASCII_STYLE': 'ASCII art',
+    })
+    
+    fetcher = ArtFetcher()
+    click.echo(f"Streaming {fetches} fetches (max_tokens {fetcher.max_tokens}):")
+    start = time.perf_counter()
+    for i in range(fetches):
+        art = fetcher.fetch_art()['art']
+        lines = art.split('\n')
+        problems = []
+        if len(lines) != height:
+            problems.append(f"{len(lines)} lines")
+        if any(line_width(line) > width for line in lines):
+            problems.append("line wider than ASCII_WIDTH")
+        if '`' in art or "Here's" in art or 'piece uses' in art:
+            problems.append("fence or prose in art")
+        if problems:
+            failures.append(f"fetch {i + 1}: {', '.join(problems)}")
+    elapsed = time.perf_counter() - start
+    
+    # Let the server notice the last closed connection
+    time.sleep(0.2)
+    server.shutdown()
+    sent, planned = StubHandler.chunks_sent, StubHandler.chunks_planned
+    click.echo(f"  {elapsed / fetches * 1000:.0f} ms per fetch, {sent} of {planned} chunks sent, "
+               f"{StubHandler.closed_early} of {fetches} streams closed early")
+    if StubHandler.closed_early < fetches:
+        failures.append(f"only {StubHandler.closed_early} of {fetches} streams were closed at the cut-off")
+    
+    if failures:
+        for failure in failures:
+            click.echo(f"FAIL: {failure}", err=True)
+        sys.exit(1)
+    click.echo("OK: streamed art fits and streams stop at the cut-off")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""Time `fsck` on a large cache with every kind of damage planted
+
+Writes a scratch cache of --pieces pieces directly (the files backend as
+per-piece files plus metadata.json, the pack backend through its append
+path), damages a few of them in each way fsck knows about, then checks
+it in-process and with a worker pool and repairs it. Fails if a check
+takes longer than --max-seconds, misses or misreports a planted problem,
+or if after --repair anything but the planted hash mismatches remains or
+a random pick can come up empty:
+
+    python bench/fsck_cache.py --pieces 100000
+    python bench/fsck_cache.py --backend pack --damage 50
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+def make_art(i: int) -> str:
+    """A small distinct piece"""
+    strokes = '#/\\|'
+    return '\n'.join(f"{i:>8} {strokes[(i + row) % 4] * (8 + (i + row) % 30)}" for row in range(8))
+
+def unique_pieces(count: int):
+    """Yield (number, art) for count pieces whose 8-hex IDs don't collide"""
+    from lib.cache import content_id
+    
+    # 32-bit IDs collide about once per 100k pieces
+    seen = set()
+    i = 0
+    while len(seen) < count:
+        art = make_art(i)
+        if content_id(art) not in seen:
+            seen.add(content_id(art))
+            yield i, art
+        i += 1
+
+def write_files_cache(directory: Path, pieces: int) -> list:
+    """Write a per-file cache as save_many would, return the IDs oldest first"""
+    from lib.cache import content_id, index_entry
+    
+    start = datetime(2024, 1, 1)
+    items = []
+    for i, art in unique_pieces(pieces):
+        metadata = {'id': content_id(art), 'created': (start + timedelta(seconds=i)).isoformat(),
+                    'prompt': f"piece {i}", 'theme': 'bench', 'style': 'bench',
+                    'metrics': {'lines': 8, 'max_width': max(map(len, art.split('\n'))), 'bytes': len(art)}}
+        (directory / f"{metadata['id']}.txt").write_text(art)
+        (directory / f"{metadata['id']}.json").write_text(json.dumps(metadata, indent=2))
+        items.append(index_entry(metadata))
+    (directory / 'metadata.json').write_text(json.dumps({'items': items, 'last_updated': None}, indent=2))
+    return [item['id'] for item in items]
+
+def write_pack_cache(directory: Path, pieces: int) -> list:
+    """Write a pack through its append path, return the IDs oldest first"""
+    from lib.cache import content_id
+    from lib.pack import PackedArtCache
+    
+    cache = PackedArtCache(directory)
+    start = datetime(2024, 1, 1).timestamp()
+    entries = []
+    for i, art in unique_pieces(pieces):
+        entries.append((content_id(art), art, f"piece {i}", 'bench', 'bench', start + i, 0,
+                        {'lines': 8, 'bytes': len(art)}, 0))
+    with cache._writer_lock():
+        cache._append_many(entries)
+    return [entry[0] for entry in entries]
+
+def damage_files(directory: Path, ids: list, count: int) -> dict:
+    """Plant count problems of each kind in a per-file cache, return {kind: IDs}"""
+    picks = iter(random.Random(1).sample(ids, count * 4))
+    planted = {kind: [next(picks) for _ in range(count)] for kind in ('dangling', 'missing_metadata', 'orphan',
+                                                                       'mismatch')}
+    for art_id in planted['dangling']:
+        (directory / f"{art_id}.txt").unlink()
+    for art_id in planted['missing_metadata']:
+        (directory / f"{art_id}.json").unlink()
+    for art_id in planted['mismatch']:
+        path = directory / f"{art_id}.txt"
+        path.write_text(path.read_text().replace('#', '%', 1) + ' ')
+    
+    index = json.loads((directory / 'metadata.json').read_text())
+    orphaned = set(planted['orphan'])
+    items = [item for item in index['items'] if item['id'] not in orphaned]
+    # Listed twice, and entries with art that cannot be decoded
+    planted['duplicate'] = [item['id'] for item in items[-count:]]
+    items += [dict(item) for item in items[-count:]]
+    planted['unreadable'] = []
+    for i in range(count):
+        art_id = f"bad{i:05d}"
+        (directory / f"{art_id}.txt").write_bytes(b'\xff\xfe not utf-8')
+        (directory / f"{art_id}.json").write_text(json.dumps({'id': art_id, 'created': '2024-01-01T00:00:00'}))
+        items.append({'id': art_id, 'created': '2024-01-01T00:00:00', 'theme': '', 'style': '', 'prompt': ''})
+        planted['unreadable'].append(art_id)
+    index['items'] = items
+    (directory / 'metadata.json').write_text(json.dumps(index))
+    
+    planted['orphan_metadata'] = [f"gone{i:04d}" for i in range(count)]
+    for art_id in planted['orphan_metadata']:
+        (directory / f"{art_id}.json").write_text(json.dumps({'id': art_id, 'created': '2024-01-01T00:00:00'}))
+    planted['temporary'] = [f".metadata.json.{i}x.tmp" for i in range(count)]
+    for name in planted['temporary']:
+        (directory / name).write_text('{')
+    return planted
+
+def damage_pack(directory: Path, ids: list, count: int) -> dict:
+    """Plant count problems of each kind in a pack, return {kind: IDs}"""
+    from lib.pack import INDEX_HEADER, PackedArtCache
+    
+    cache = PackedArtCache(directory)
+    # Away from the records left dangling below
+    picks = random.Random(1).sample(ids[:-count], count)
+    slots = {art_id: slot for slot, art_id in enumerate(ids)}
+    with open(directory / 'art.pack', 'r+b') as f:
+        for art_id in picks:
+            record = cache._record(slots[art_id])
+            f.seek(record[1])
+            f.write(b'%')
+    planted = {'mismatch': picks}
+    
+    # Loose pieces, as an interrupted migrate leaves them
+    loose = [make_art(len(ids) * 2 + i) for i in range(count)]
+    from lib.cache import content_id
+    planted['orphan'] = [content_id(art) for art in loose]
+    for art in loose:
+        (directory / f"{content_id(art)}.txt").write_text(art)
+    planted['temporary'] = [f".art.pack.{i}x.tmp" for i in range(count)]
+    for name in planted['temporary']:
+        (directory / name).write_bytes(b'')
+    
+    # A header that miscounts, and a pack cut short under its last records
+    data = bytearray((directory / 'art.idx').read_bytes())
+    magic, records, live, generation = INDEX_HEADER.unpack_from(data, 0)
+    INDEX_HEADER.pack_into(data, 0, magic, records, live + 1, generation)
+    (directory / 'art.idx').write_bytes(bytes(data))
+    cut = cache._record(slots[ids[-count]])[1]
+    os.truncate(directory / 'art.pack', cut)
+    planted['counts'] = ['art.idx']
+    planted['dangling'] = ids[-count:]
+    return planted
+
+def compare(report: dict, planted: dict) -> list:
+    """Describe differences between the problems found and those planted"""
+    failures = []
+    for kind in sorted(set(report['problems']) | set(planted)):
+        found = {name for name, _ in report['problems'].get(kind, [])}
+        expected = set(planted.get(kind, []))
+        if found != expected:
+            failures.append(f"{kind}: found {len(found)}, planted {len(expected)} "
+                            f"({len(expected - found)} missed, {len(found - expected)} unexpected)")
+    return failures
+
+@click.command()
+@click.option('--pieces', default=100000, show_default=True, help='Pieces in the scratch cache')
+@click.option('--backend', type=click.Choice(['files', 'pack', 'both']), default='both', show_default=True)
+@click.option('--damage', default=20, show_default=True, help='Pieces damaged per kind of problem')
+@click.option('--jobs', default=os.cpu_count() or 1, show_default=True, help='Worker processes for the pool run')
+@click.option('--max-seconds', default=10.0, show_default=True, help='Allowed time for one check')
+def main(pieces, backend, damage, jobs, max_seconds):
+    """Check and repair a damaged cache, timing each check"""
+    os.environ.update({'CACHE_SIZE': str(pieces * 2), 'DEDUP_MODE': 'off', 'AUTO_FETCH': 'false',
+                       'CACHE_COMPRESS': 'off', 'SYSTEM_STORE': ''})
+    from lib.cache import open_cache
+    from lib.fsck import check
+    
+    failures = []
+    for name in (('files', 'pack') if backend == 'both' else (backend,)):
+        os.environ['CACHE_BACKEND'] = name
+        with tempfile.TemporaryDirectory() as scratch:
+            directory = Path(scratch)
+            start = time.perf_counter()
+            ids = (write_files_cache if name == 'files' else write_pack_cache)(directory, pieces)
+            planted = (damage_files if name == 'files' else damage_pack)(directory, ids, damage)
+            click.echo(f"{name:>5}: wrote {pieces} pieces in {time.perf_counter() - start:.1f}s")
+            
+            for run_jobs in (1, jobs):
+                report = check(open_cache(directory), jobs=run_jobs)
+                click.echo(f"{name:>5}: checked {report['checked']} pieces in {report['seconds']:.2f}s "
+                           f"with {run_jobs} process{'es' if run_jobs > 1 else ''}")
+                if report['seconds'] > max_seconds:
+                    failures.append(f"{name}: check took {report['seconds']:.2f}s with {run_jobs} processes")
+                failures += [f"{name}: {failure}" for failure in compare(report, planted)]
+            
+            report = check(open_cache(directory), repair=True, jobs=jobs)
+            click.echo(f"{name:>5}: repaired in {report['seconds']:.2f}s: {report.get('repaired')}")
+            report = check(open_cache(directory), jobs=jobs)
+            failures += [f"{name} after repair: {failure}"
+                         for failure in compare(report, {'mismatch': planted['mismatch']})]
+            
+            cache = open_cache(directory)
+            # Files orphans were dropped from the index, pack ones are new pieces
+            expected = len(ids) - len(planted['dangling']) + (len(planted['orphan']) if name == 'pack' else 0)
+            if cache.size() != expected:
+                failures.append(f"{name}: {cache.size()} pieces after repair, expected {expected}")
+            if any(cache.get_random_entry() is None for _ in range(200)):
+                failures.append(f"{name}: a random pick came up empty after repair")
+    
+    if failures:
+        for failure in failures:
+            click.echo(f"FAIL: {failure}", err=True)
+        sys.exit(1)
+    click.echo(f"OK: every planted problem found within {max_seconds}s and repaired")
+
+if __name__ == '__main__':
+    main()
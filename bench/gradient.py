@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Benchmark the gradient engine against per-character escapes
+
+Renders random art of each size in every direction and colour depth and
+reports the bytes emitted and the render time, next to a naive renderer
+that computes colours in Python and writes one escape per character.
+Fails if characters after a wide one are coloured by code point rather
+than by the terminal column they land in:
+
+    python bench/gradient.py
+    python bench/gradient.py --size 120x40 --repeat 50
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lib import gradient
+from lib.display import ArtDisplay
+
+def random_art(cols: int, rows: int, seed: int = 0) -> str:
+    """Return art with ragged lines and blank patches, like generated pieces"""
+    rng = random.Random(seed)
+    chars = '  ..::--==++**##%%@@'
+    return '\n'.join(''.join(rng.choice(chars) for _ in range(rng.randint(cols * 3 // 4, cols)))
+                     for _ in range(rows))
+
+def naive_render(art: str, stops, direction: str, depth: str) -> str:
+    """Per-cell gradient computed in Python with one escape per character"""
+    lines = art.split('\n')
+    rows = len(lines)
+    cols = max(len(line) for line in lines)
+    out = []
+    for y, line in enumerate(lines):
+        for x, char in enumerate(line):
+            ty = y / (rows - 1) if rows > 1 else 0.0
+            tx = x / (cols - 1) if cols > 1 else 0.0
+            if direction == 'vertical':
+                t = ty
+            elif direction == 'horizontal':
+                t = tx
+            elif direction == 'diagonal':
+                height = rows * gradient.CELL_ASPECT
+                t = (ty * height + tx * cols) / (height + cols)
+            else:
+                dy = (ty - 0.5) * rows * gradient.CELL_ASPECT
+                dx = (tx - 0.5) * cols
+                corner = ((rows * gradient.CELL_ASPECT / 2) ** 2 + (cols / 2) ** 2) ** 0.5
+                t = (dy * dy + dx * dx) ** 0.5 / corner
+            position = t * (len(stops) - 1)
+            i = min(int(position), len(stops) - 2)
+            f = position - i
+            r, g, b = (round(a + (c - a) * f) for a, c in zip(stops[i], stops[i + 1]))
+            if depth == 'truecolor':
+                out.append(f"\033[38;2;{r};{g};{b}m{char}")
+            else:
+                index = 16 + 36 * round(r / 51) + 6 * round(g / 51) + round(b / 51)
+                out.append(f"\033[38;5;{index}m{char}")
+        out.append('\033[0m\n')
+    return ''.join(out)
+
+def check_wide(stops) -> list:
+    """Describe cells of art with wide characters that miss their column's colour"""
+    import re
+    
+    # Both 'a's and 'e' start in column 4, both 'b's and 'f' in the last column
+    art = '漢字ab\nabcdef\n😀  ab'
+    failures = []
+    for depth in gradient.DEPTHS:
+        out = gradient.render(art, stops, 'horizontal', depth)
+        colours = [dict(), dict(), dict()]
+        row = 0
+        for sgr, chars in re.findall(r'\033\[([\d;]+)m([^\033]*)', out):
+            for char in chars:
+                if char == '\n':
+                    row += 1
+                elif char != ' ':
+                    colours[row][char] = sgr
+        if not colours[0]['a'] == colours[1]['e'] == colours[2]['a']:
+            failures.append(f"{depth}: column 4 coloured {colours[0]['a']}, {colours[1]['e']} "
+                            f"and {colours[2]['a']} on lines of different widths")
+        if not colours[0]['b'] == colours[1]['f'] == colours[2]['b']:
+            failures.append(f"{depth}: last column coloured {colours[0]['b']}, {colours[1]['f']} "
+                            f"and {colours[2]['b']} on lines of different widths")
+    return failures
+
+def timed(func, repeat: int):
+    """Return (result, best time in ms) over several runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+@click.command()
+@click.option('--size', 'sizes', multiple=True, default=('80x24', '200x60'), show_default=True,
+              help='Art size as COLSxROWS, repeatable')
+@click.option('--theme', default='cyberpunk', show_default=True, help='Theme whose colors form the gradient')
+@click.option('--repeat', default=20, show_default=True, help='Take the best of this many runs')
+def main(sizes, theme, repeat):
+    """Report bytes and render time per size, direction and colour depth"""
+    stops = gradient.theme_stops(ArtDisplay().themes[theme])
+    # Import and first-call costs are not part of the render time
+    gradient.render(random_art(10, 3), stops)
+    
+    for size in sizes:
+        cols, rows = (int(n) for n in size.lower().split('x'))
+        art = random_art(cols, rows)
+        click.echo(f"{cols}x{rows} ({len(art)} characters)")
+        click.echo(f"  {'direction':<11}{'depth':<10}{'bytes':>8}{'SGRs':>7}{'ms':>8}"
+                   f"{'naive bytes':>13}{'naive ms':>10}")
+        for depth in gradient.DEPTHS:
+            for direction in gradient.DIRECTIONS:
+                out, ms = timed(lambda: gradient.render(art, stops, direction, depth), repeat)
+                naive, naive_ms = timed(lambda: naive_render(art, stops, direction, depth), max(1, repeat // 4))
+                click.echo(f"  {direction:<11}{depth:<10}{len(out.encode()):>8}{out.count(chr(27)):>7}"
+                           f"{ms:>8.2f}{len(naive.encode()):>13}{naive_ms:>10.2f}")
+    
+    failures = check_wide(stops)
+    if failures:
+        for failure in failures:
+            click.echo(f"FAIL: {failure}", err=True)
+        sys.exit(1)
+    click.echo("OK: wide characters coloured by the column they start in")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Import-time budget check for the login path
+
+Runs `python -X importtime` on login.py, plus the modules its run() loads
+when no daemon answers, and fails if the cumulative import time exceeds the
+budget or if a heavy module (click, dotenv, openai) is imported at all. Run
+it from CI or after touching the login path:
+
+    python bench/importtime.py --budget-ms 15
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import click
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules that must never be loaded while displaying login art
+FORBIDDEN = ('click', 'dotenv', 'openai', 'httpx', 'pydantic')
+
+# Imported inside login.run(), once no daemon has answered
+LOGIN_DEFERRED = ('lib.cache', 'lib.display', 'lib.render_cache', 'lib.rotation')
+
+def measure_imports(module: str = 'login', then: tuple = LOGIN_DEFERRED):
+    """Return ({imported name: cumulative us}, total us) for importing `module`
+    
+    The modules in `then` are imported afterwards and count towards the
+    total, for imports a module defers to the functions that need them.
+    """
+    targets = (module, *then)
+    code = f"import sys; sys.path.insert(0, {str(ROOT)!r}); " + '; '.join(f"import {name}" for name in targets)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    
+    # Nested imports are listed before their parent and indented under it,
+    # so a target's subtree is everything since the previous top-level line
+    timings = {}
+    subtree = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        subtree[name.strip()] = int(cumulative_us)
+        if name[1:2] != ' ':
+            if name.strip() in targets:
+                timings.update(subtree)
+                total += int(cumulative_us)
+            subtree = {}
+    return timings, total
+
+@click.command()
+@click.option('--budget-ms', default=15.0, show_default=True, help='Allowed cumulative import time')
+@click.option('--runs', default=5, show_default=True, help='Take the best of this many runs')
+@click.option('--module', default='login', show_default=True, help='Module to import')
+def main(budget_ms, runs, module):
+    """Check that importing the login path stays within its budget"""
+    then = LOGIN_DEFERRED if module == 'login' else ()
+    best = None
+    for _ in range(runs):
+        timings, total_us = measure_imports(module, then)
+        if best is None or total_us < best[1]:
+            best = (timings, total_us)
+    timings, total_us = best
+    
+    total_ms = total_us / 1000
+    click.echo(f"{module}: {total_ms:.1f} ms cumulative import time (budget {budget_ms:.1f} ms)")
+    for name, us in sorted(timings.items(), key=lambda kv: kv[1], reverse=True)[:10]:
+        click.echo(f"  {us / 1000:7.2f} ms  {name}")
+    
+    failed = False
+    loaded = {name.split('.')[0] for name in timings}
+    forbidden = [name for name in FORBIDDEN if name in loaded]
+    if forbidden:
+        click.echo(f"FAIL: {module} imports {', '.join(forbidden)}", err=True)
+        failed = True
+    if total_ms > budget_ms:
+        click.echo(f"FAIL: import time over budget by {total_ms - budget_ms:.1f} ms", err=True)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
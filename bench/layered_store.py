@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Check a per-user cache layered over a large system store
+
+Fills a scratch SYSTEM_STORE (pack backend) and a small user overlay, then
+times opening the layered cache and picking a piece as login does against
+opening each layer on its own. Fails if the layered pick takes more than
+--max-ms, if a rotation round misses or repeats a piece, if a
+hidden store piece is still shown or listed, or if the merged listing is
+out of order:
+
+    python bench/layered_store.py --pieces 20000
+    python bench/layered_store.py --overlay files
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+def best_of(runs: int, func) -> float:
+    """Best wall time of func over several runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+@click.command()
+@click.option('--pieces', default=20000, show_default=True, help='Pieces in the system store')
+@click.option('--own', default=50, show_default=True, help='Pieces in the user overlay')
+@click.option('--overlay', type=click.Choice(['files', 'pack']), default='pack', show_default=True)
+@click.option('--runs', default=50, show_default=True, help='Timed open-and-pick runs')
+@click.option('--max-ms', default=1.0, show_default=True, help='Allowed layered open-and-pick time')
+def main(pieces, own, overlay, runs, max_ms):
+    """Time picks from a layered cache and check the merged view"""
+    os.environ.update({'CACHE_SIZE': str(pieces + own), 'DEDUP_MODE': 'off', 'AUTO_FETCH': 'false',
+                       'ROTATION': 'shuffle'})
+    from lib.cache import open_cache
+    from lib.rotation import Rotation
+    
+    failures = []
+    with tempfile.TemporaryDirectory() as scratch:
+        store, user = Path(scratch) / 'store', Path(scratch) / 'user'
+        os.environ['CACHE_BACKEND'] = 'pack'
+        store_ids = open_cache(store).save_many([{'art': f"system {i}\n{'#' * (i % 60)}", 'theme': 'space'}
+                                                 for i in range(pieces)])
+        os.environ.update({'CACHE_BACKEND': overlay, 'SYSTEM_STORE': str(store), 'CACHE_DIR': str(user)})
+        cache = open_cache()
+        own_ids = cache.save_many([{'art': f"own {i}", 'theme': 'forest'} for i in range(own)])
+        
+        # Layering adds one cache open, never a merge of the two indexes
+        single = best_of(runs, lambda: Rotation(open_cache(store)).next_entry())
+        alone = best_of(runs, lambda: Rotation(open_cache(user)).next_entry())
+        layered = best_of(runs, lambda: Rotation(open_cache()).next_entry())
+        click.echo(f"open and pick: store {single:.2f} ms, overlay {alone:.2f} ms, layered {layered:.2f} ms "
+                   f"({pieces} system + {own} own pieces)")
+        if layered > max_ms:
+            failures.append(f"layered pick took {layered:.2f} ms, expected at most {max_ms} ms")
+        
+        hidden = store_ids[:10]
+        for art_id in hidden:
+            cache.delete_art_by_id(art_id)
+        cache = open_cache()
+        expected = set(store_ids[10:]) | set(own_ids)
+        if cache.size() != len(expected):
+            failures.append(f"size {cache.size()}, expected {len(expected)}")
+        
+        # The timed picks started a round that goes on past the deletes in
+        # a new order: its rest shows distinct visible pieces, and the next
+        # round every visible piece once
+        rotation = Rotation(cache)
+        done, total = rotation.status()['round']
+        rest = [rotation.next_entry()[0] for _ in range(total - done)]
+        if len(rest) != len(set(rest)) or not set(rest) <= expected:
+            failures.append(f"the rest of a round showed {len(set(rest))} distinct of {len(rest)} picks, "
+                            f"{len(set(rest) - expected)} of them not visible")
+        shown = [rotation.next_entry()[0] for _ in range(len(expected))]
+        if set(shown) != expected or len(shown) != len(set(shown)):
+            failures.append(f"a round showed {len(set(shown))} distinct of {len(shown)} picks, "
+                            f"{len(set(shown) - expected)} of them not visible")
+        
+        listed = list(cache.iter_cached_art())
+        created = [item['created'] for item in listed]
+        if any(item['id'] in hidden for item in listed):
+            failures.append("hidden store pieces listed")
+        if created != sorted(created):
+            failures.append("merged listing out of creation order")
+        if sum(1 for item in listed if item.get('system')) != pieces - len(hidden):
+            failures.append("store pieces not marked as system pieces")
+    
+    if failures:
+        for failure in failures:
+            click.echo(f"FAIL: {failure}", err=True)
+        sys.exit(1)
+    click.echo("OK: layered picks cover both layers, hidden pieces stay hidden")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Load test for the `main.py serve` daemon
+
+Starts the daemon on a scratch cache in a separate process and keeps a
+number of concurrent clients requesting art over its Unix socket, as
+simultaneous logins would. Then deletes a piece and checks the daemon
+stops serving it once it has noticed the write. Fails on empty or
+failed replies, or if throughput is below --min-rate:
+
+    python bench/serve_load.py --clients 200 --seconds 5
+    python bench/serve_load.py --backend pack --min-rate 2000
+"""
+
+import os
+import sys
+import asyncio
+import json
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lib.serve import request
+
+def run_server(cache_dir: str, path: str):
+    """Serve a cache directory until terminated (runs in a child process)"""
+    from lib.cache import open_cache
+    from lib.serve import ArtServer
+    ArtServer(open_cache(cache_dir), Path(path)).serve()
+
+async def client(path: str, deadline: float, latencies: list, failures: list, replies: set):
+    """Request art over fresh connections until the deadline"""
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b'show colorterm=truecolor term=xterm-256color\n')
+            data = await reader.read()
+            writer.close()
+        except OSError as e:
+            failures.append(f"{type(e).__name__}: {e}")
+            continue
+        if not data:
+            failures.append("empty reply")
+            continue
+        latencies.append(time.perf_counter() - start)
+        replies.add(data)
+
+async def load(path: str, clients: int, seconds: float):
+    latencies, failures, replies = [], [], set()
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(client(path, deadline, latencies, failures, replies) for _ in range(clients)))
+    return latencies, failures, replies
+
+@click.command()
+@click.option('--pieces', default=500, show_default=True, help='Pieces in the scratch cache')
+@click.option('--clients', default=100, show_default=True, help='Concurrent client connections')
+@click.option('--seconds', default=3.0, show_default=True, help='Load duration')
+@click.option('--backend', type=click.Choice(['files', 'pack']), default='files', show_default=True)
+@click.option('--min-rate', default=1000, show_default=True, help='Requests per second to pass')
+def main(pieces, clients, seconds, backend, min_rate):
+    """Measure daemon throughput and latency under concurrent requests"""
+    os.environ.update({'CACHE_BACKEND': backend, 'CACHE_SIZE': str(pieces), 'DEDUP_MODE': 'off',
+                       'AUTO_FETCH': 'false', 'DISPLAY_GRADIENT': 'off'})
+    from lib.cache import open_cache
+    
+    failures = []
+    with tempfile.TemporaryDirectory() as scratch:
+        cache_dir = Path(scratch) / 'cache'
+        cache = open_cache(cache_dir)
+        cache.save_many([{'art': '\n'.join(f"{i:>6} {'#' * (i % 40)}" for _ in range(12)), 'theme': 'space'}
+                         for i in range(pieces)])
+        path = str(Path(scratch) / 'motd.sock')
+        server = multiprocessing.Process(target=run_server, args=(str(cache_dir), path), daemon=True)
+        server.start()
+        for _ in range(100):
+            if request(Path(path), 'status') is not None:
+                break
+            time.sleep(0.05)
+        else:
+            server.terminate()
+            raise click.ClickException("daemon did not start")
+        
+        try:
+            latencies, errors, replies = asyncio.run(load(path, clients, seconds))
+            latencies.sort()
+            rate = len(latencies) / seconds
+            p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+            p99 = latencies[len(latencies) * 99 // 100] * 1000 if latencies else 0
+            click.echo(f"{len(latencies)} requests from {clients} clients in {seconds:.0f}s: {rate:.0f}/s, "
+                       f"p50 {p50:.2f} ms, p99 {p99:.2f} ms, {len(replies)} distinct pieces, "
+                       f"{len(errors)} failed")
+            if errors:
+                failures.append(f"{len(errors)} requests failed, e.g. {errors[0]}")
+            if rate < min_rate:
+                failures.append(f"{rate:.0f} requests/s, expected at least {min_rate}")
+            
+            # A deleted piece must drop out on the daemon's next request
+            gone = cache.ids()[0]
+            cache.delete_art_by_id(gone)
+            marker = f"{0:>6}".encode()
+            served = [request(Path(path), 'show') or b'' for _ in range(pieces * 2)]
+            if any(marker in data for data in served):
+                failures.append(f"deleted piece {gone} still served")
+            
+            # Art saved again under its custom ID must not be served from the old rendering
+            for art in ('old art under a reused id', 'new art under a reused id'):
+                cache.save_art({'id': 'reused', 'art': art, 'theme': 'space'})
+                served = [request(Path(path), 'show') or b'' for _ in range(pieces * 2)]
+            if any(b'old art' in data for data in served):
+                failures.append("reimported piece served from its old rendering")
+            elif not any(b'new art' in data for data in served):
+                failures.append("reimported piece never served")
+            status = json.loads(request(Path(path), 'status'))
+            click.echo(f"daemon: {status['requests']} requests, {status['failures']} failures, "
+                       f"{status['rendered']} renders in memory ({status['rendered_bytes'] / 1024:.0f} KiB)")
+            if status['failures']:
+                failures.append(f"daemon counted {status['failures']} failures")
+        finally:
+            server.terminate()
+            server.join()
+        if os.path.exists(path):
+            failures.append("socket left behind after SIGTERM")
+    
+    if failures:
+        for failure in failures:
+            click.echo(f"FAIL: {failure}", err=True)
+        sys.exit(1)
+    click.echo("OK: every request served, deleted and reimported art picked up")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Check that display commands keep to SHOW_BUDGET when the API misbehaves
+
+Runs `main.py show` and `login.py` on an empty cache against an in-process
+stub API that hangs, then one that answers quickly. Fails if a run takes
+longer than the budget plus --slack, if a run shows nothing instead of the
+bundled saved/ art, if requests still reach the API once the circuit
+breaker has opened, or if a quick API's piece is not fetched and cached:
+
+    python bench/show_budget.py
+    python bench/show_budget.py --budget 2 --failures 3
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import click
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from stub_openai import StubHandler
+
+# SHOW_BUDGET for the quick API run: importing the SDK alone can take most
+# of a second, and it counts against the budget
+QUICK_BUDGET = 3.0
+
+def run(script: str, args: list, env: dict) -> tuple:
+    """Run a command of the tree, return (seconds, stdout, stderr)"""
+    start = time.monotonic()
+    result = subprocess.run([sys.executable, str(ROOT / script), *args], env=env, capture_output=True,
+                            text=True, timeout=120)
+    return time.monotonic() - start, result.stdout, result.stderr
+
+@click.command()
+@click.option('--budget', default=1.0, show_default=True, help='SHOW_BUDGET seconds')
+@click.option('--failures', default=2, show_default=True, help='BREAKER_FAILURES')
+@click.option('--slack', default=0.5, show_default=True,
+              help='Seconds allowed over the budget for interpreter start-up and imports')
+@click.option('--hang', default=30.0, show_default=True, help='Seconds the hung stub takes to answer')
+def main(budget, failures, slack, hang):
+    """Time show and login against a hung and a quick stub API"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    failed = []
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(os.environ, OPENAI_BASE_URL=f"http://127.0.0.1:{server.server_address[1]}/v1",
+                   OPENAI_API_KEY='stub', ART_SOURCE='openai', AUTO_FETCH='true', SHOW_BUDGET=str(budget),
+                   BREAKER_FAILURES=str(failures), BREAKER_COOLDOWN='600', CACHE_DIR=str(Path(scratch) / 'hung'),
+                   SYSTEM_STORE='', CACHE_BACKEND='files', ANIMATION='off', DISPLAY_COLOR='false',
+                   MOTD_SOCKET=str(Path(scratch) / 'none.sock'),
+                   # Keep background refills out of the request counts
+                   REFILL_THRESHOLD='0')
+        
+        # A hung API costs each display at most the budget until the breaker opens
+        StubHandler.latency = hang
+        for attempt in range(failures + 2):
+            script = 'main.py' if attempt % 2 == 0 else 'login.py'
+            before = StubHandler.requests
+            seconds, out, err = run(script, ['show'] if script == 'main.py' else [], env)
+            sent = StubHandler.requests - before
+            click.echo(f"hung api, {script:<8} run {attempt + 1}: {seconds:.2f}s, {sent} requests")
+            if seconds > budget + slack:
+                failed.append(f"{script} took {seconds:.2f}s with a {budget}s budget")
+            if not out.strip():
+                failed.append(f"{script} showed nothing: {err.strip()}")
+            if attempt >= failures and sent:
+                failed.append(f"{script} reached the API with the breaker open")
+        state = json.loads((Path(scratch) / 'hung' / 'breaker.json').read_text())
+        if state['opened'] is None:
+            failed.append(f"breaker still closed after {state['failures']} failures")
+        
+        # A quick API fills the empty cache in the foreground, given a budget
+        # that also covers loading the client on a cold start
+        StubHandler.latency = 0.05
+        env['CACHE_DIR'] = str(Path(scratch) / 'quick')
+        seconds, out, err = run('main.py', ['show'], dict(env, SHOW_BUDGET=str(max(budget, QUICK_BUDGET))))
+        cached = len(list((Path(scratch) / 'quick').glob('*.txt')))
+        click.echo(f"quick api, main.py show: {seconds:.2f}s, {cached} pieces cached")
+        if cached != 1:
+            failed.append(f"quick fetch cached {cached} pieces: {err.strip()}")
+        
+        # Fetches known to take longer than the budget are not even tried
+        breaker_file = Path(scratch) / 'quick' / 'breaker.json'
+        breaker_file.write_text(json.dumps(dict(json.loads(breaker_file.read_text()), latency=budget * 2)))
+        for piece in (Path(scratch) / 'quick').glob('*.txt'):
+            subprocess.run([sys.executable, str(ROOT / 'main.py'), 'delete', '-f', piece.stem], env=env,
+                           capture_output=True)
+        before = StubHandler.requests
+        seconds, out, err = run('main.py', ['show'], env)
+        click.echo(f"slow api, main.py show: {seconds:.2f}s, {StubHandler.requests - before} requests")
+        if StubHandler.requests != before:
+            failed.append("fetched although recent fetches took longer than the budget")
+    server.shutdown()
+    
+    if failed:
+        for failure in failed:
+            click.echo(f"FAIL: {failure}", err=True)
+        sys.exit(1)
+    click.echo("OK: displays kept to the budget and fell back to bundled art")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Concurrency stress test for cache writes
+
+Runs writer processes that save and delete art alongside reader processes
+that open the cache and pick art the way login does. Fails if any reader
+hits a partially written index or the final index references missing art:
+
+    python bench/stress_cache.py --writers 4 --readers 16 --seconds 10
+    python bench/stress_cache.py --backend pack
+"""
+
+import os
+import sys
+import json
+import random
+import tempfile
+import time
+import multiprocessing
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lib.cache import open_cache
+
+def writer(cache_dir: str, deadline: float, seed: int):
+    """Save and delete random pieces until the deadline, return (ops, errors)"""
+    rng = random.Random(seed)
+    cache = open_cache(cache_dir)
+    ops = 0
+    errors = []
+    while time.time() < deadline:
+        try:
+            if rng.random() < 0.7:
+                batch = []
+                for _ in range(rng.randint(1, 3)):
+                    art = '\n'.join(f"{seed}-{ops}-{rng.random()}" * 3 for _ in range(rng.randint(1, 20)))
+                    batch.append({'art': art, 'prompt': 'stress', 'theme': 'space', 'style': 'ASCII art'})
+                cache.save_many(batch)
+            else:
+                ids = cache.ids()
+                if ids:
+                    cache.delete_art_by_id(rng.choice(ids))
+            ops += 1
+        except Exception as e:
+            errors.append(f"writer {seed}: {type(e).__name__}: {e}")
+    return ops, errors
+
+def reader(cache_dir: str, deadline: float, seed: int):
+    """Open the cache and read art until the deadline, return (reads, misses, errors)
+    
+    A miss is a pick that found nothing because writers deleted the chosen
+    pieces in the meantime; that is expected under heavy churn. Errors are
+    exceptions, e.g. from reading a partially written index.
+    """
+    reads = 0
+    misses = 0
+    errors = []
+    while time.time() < deadline:
+        try:
+            cache = open_cache(cache_dir)
+            if not cache.is_empty() and cache.get_random_art() is None:
+                misses += 1
+            if reads % 10 == 0:
+                cache.list_cached_art()
+            reads += 1
+        except Exception as e:
+            errors.append(f"reader {seed}: {type(e).__name__}: {e}")
+    return reads, misses, errors
+
+def check_final(cache_dir: str):
+    """Return problems with the cache left behind by the run"""
+    cache = open_cache(cache_dir)
+    problems = []
+    for art_id in cache.ids():
+        if cache.get_art_by_id(art_id) is None:
+            problems.append(f"index entry {art_id} has no art")
+    metadata_file = Path(cache_dir) / 'metadata.json'
+    if metadata_file.exists():
+        with open(metadata_file) as f:
+            json.load(f)
+    return problems
+
+@click.command()
+@click.option('--writers', default=4, show_default=True)
+@click.option('--readers', default=16, show_default=True)
+@click.option('--seconds', default=10.0, show_default=True)
+@click.option('--backend', type=click.Choice(['files', 'pack']), default='files', show_default=True)
+@click.option('--cache-size', default=50, show_default=True)
+def main(writers, readers, seconds, backend, cache_size):
+    """Hammer a temporary cache with concurrent readers and writers"""
+    os.environ['CACHE_BACKEND'] = backend
+    os.environ['CACHE_SIZE'] = str(cache_size)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        open_cache(cache_dir)
+        deadline = time.time() + seconds
+        with multiprocessing.Pool(writers + readers) as pool:
+            writes = [pool.apply_async(writer, (cache_dir, deadline, i)) for i in range(writers)]
+            reads = [pool.apply_async(reader, (cache_dir, deadline, i)) for i in range(readers)]
+            writer_results = [result.get() for result in writes]
+            reader_results = [result.get() for result in reads]
+        
+        problems = [error for *_, errors in writer_results + reader_results for error in errors]
+        problems += check_final(cache_dir)
+        reads = sum(count for count, _, _ in reader_results)
+        misses = sum(count for _, count, _ in reader_results)
+        
+        click.echo(f"{backend}: {reads} reads ({misses} raced with deletes) by {readers} readers "
+                   f"alongside {writers} writers in {seconds:.0f}s, "
+                   f"{open_cache(cache_dir).size()} pieces left")
+        for problem in problems[:20]:
+            click.echo(f"  {problem}", err=True)
+        if problems:
+            click.echo(f"FAIL: {len(problems)} problems", err=True)
+            sys.exit(1)
+        click.echo("OK: no corrupted reads")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Local stand-in for the OpenAI chat completions API
+
+Serves canned ASCII art so fetch paths can be exercised without network
+access or API costs. Point the fetcher at it with OPENAI_BASE_URL:
+
+    python bench/stub_openai.py --port 8765 --latency 0.5 --error-rate 0.2 &
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub \\
+        python main.py fetch --count 20 --concurrency 8
+
+Requests with "stream": true are answered with server-sent events, a few
+characters per chunk. --chatty wraps the art in a preamble, a markdown
+fence and a closing remark, as real models often do.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+
+def canned_art(width: int = 40, height: int = 12) -> str:
+    """Return a random block of ASCII art"""
+    chars = ' .:-=+*#%@'
+    return '\n'.join(''.join(random.choice(chars) for _ in range(width)) for _ in range(height))
+
+def chatty_reply(art: str) -> str:
+    """Wrap art the way chat models tend to"""
+    return f"Here's your ASCII art:\n\n```\n{art}\n```\n\nThis piece uses shading to suggest depth."
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Handle POST /v1/chat/completions with optional latency and errors"""
+    
+    latency = 0.0
+    error_rate = 0.0
+    art_height = 12
+    chatty = False
+    chunk_delay = 0.0
+    requests = 0
+    # Streamed chunks prepared and actually sent, and streams the client closed
+    chunks_planned = 0
+    chunks_sent = 0
+    closed_early = 0
+    lock = threading.Lock()
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        with StubHandler.lock:
+            StubHandler.requests += 1
+        
+        if not self.path.endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+        
+        time.sleep(self.latency)
+        if random.random() < self.error_rate:
+            self._send_json(429, {'error': {'message': 'rate limited', 'type': 'rate_limit'}},
+                            headers={'Retry-After': '0'})
+            return
+        
+        art = canned_art(height=self.art_height)
+        if self.chatty:
+            art = chatty_reply(art)
+        if body.get('stream'):
+            include_usage = (body.get('stream_options') or {}).get('include_usage', False)
+            self._send_stream(body.get('model', 'stub'), art, include_usage)
+            return
+        self._send_json(200, {
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': art},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 50, 'completion_tokens': len(art) // 4,
+                      'total_tokens': 50 + len(art) // 4}
+        })
+    
+    def _send_stream(self, model: str, content: str, include_usage: bool):
+        """Send content as chat completion chunks, a few characters each"""
+        pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+        with StubHandler.lock:
+            StubHandler.chunks_planned += len(pieces)
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        
+        def chunk(delta: dict, finish_reason=None, usage=None) -> dict:
+            return {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}] if delta is not None else [],
+                'usage': usage
+            }
+        
+        try:
+            self._send_event(chunk({'role': 'assistant', 'content': ''}))
+            for piece in pieces:
+                time.sleep(self.chunk_delay)
+                self._send_event(chunk({'content': piece}))
+                with StubHandler.lock:
+                    StubHandler.chunks_sent += 1
+            self._send_event(chunk({}, finish_reason='stop'))
+            if include_usage:
+                self._send_event(chunk(None, usage={'prompt_tokens': 50, 'completion_tokens': len(pieces),
+                                                    'total_tokens': 50 + len(pieces)}))
+            self.wfile.write(b'data: [DONE]\n\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            with StubHandler.lock:
+                StubHandler.closed_early += 1
+    
+    def _send_event(self, payload: dict):
+        self.wfile.write(b'data: ' + json.dumps(payload).encode() + b'\n\n')
+        self.wfile.flush()
+    
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+@click.command()
+@click.option('--port', default=8765, show_default=True)
+@click.option('--latency', default=0.0, show_default=True, help='Seconds to wait per request')
+@click.option('--error-rate', default=0.0, show_default=True, help='Fraction of requests answered with 429')
+@click.option('--art-height', default=12, show_default=True, help='Lines of canned art per response')
+@click.option('--chatty', is_flag=True, help='Wrap art in a preamble, fences and a closing remark')
+@click.option('--chunk-delay', default=0.0, show_default=True, help='Seconds between streamed chunks')
+def main(port, latency, error_rate, art_height, chatty, chunk_delay):
+    """Run the stub OpenAI server until interrupted"""
+    StubHandler.latency = latency
+    StubHandler.error_rate = error_rate
+    StubHandler.art_height = art_height
+    StubHandler.chatty = chatty
+    StubHandler.chunk_delay = chunk_delay
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    click.echo(f"Stub OpenAI API on http://127.0.0.1:{port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        click.echo(f"Served {StubHandler.requests} requests, sent {StubHandler.chunks_sent} of "
+                   f"{StubHandler.chunks_planned} streamed chunks")
+
+if __name__ == '__main__':
+    main()
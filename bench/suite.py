@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""Benchmark suite for the login path, cache operations and display
+
+Builds synthetic caches of each size and backend in a temporary directory,
+times login end to end, the ArtCache operations and the display renderers,
+and writes the results as JSON. Nothing talks to the API: the refill worker
+is disabled and ArtFetcher is replaced by a stub. Given a baseline, any
+operation whose best time grew by more than the threshold is flagged and
+the exit status is 1:
+
+    python bench/suite.py --save-baseline
+    python bench/suite.py
+    python bench/suite.py --sizes 10,1000 --only cache --threshold 0.5
+"""
+
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import click
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from importtime import measure_imports
+from lib.cache import index_entry, open_cache
+from lib.display import ArtDisplay
+from lib.width import metrics
+
+SECTIONS = ('login', 'cache', 'display')
+BACKENDS = ('files', 'pack')
+
+# Fixed settings so results don't depend on the local .env
+BENCH_ENV = {
+    'AUTO_FETCH': 'false',
+    'THEME': 'cyberpunk',
+    'DISPLAY_COLOR': 'true',
+    'RANDOM_COLOR': 'false',
+    'DISPLAY_GRADIENT': 'off',
+    'DEDUP_MODE': 'reject',
+    'ROTATION': 'shuffle',
+}
+
+# Runs a script against a synthetic cache. main.py still imports the
+# OpenAI SDK as it would on a real login, but gets a stub ArtFetcher.
+DRIVER = '''
+import functools, runpy, sys
+sys.path.insert(0, {root!r})
+sys.argv = [{script!r}, *{args!r}]
+import lib, lib.cache
+lib.open_cache = lib.cache.open_cache = functools.partial(lib.cache.open_cache, {cache_dir!r})
+if {stub_fetcher!r}:
+    import lib.fetch
+    class StubFetcher:
+        def __init__(self, *args, **kwargs):
+            raise RuntimeError("benchmarks never fetch art")
+    lib.ArtFetcher = lib.fetch.ArtFetcher = StubFetcher
+try:
+    runpy.run_path({script!r}, run_name='__main__')
+except SystemExit as e:
+    if e.code:
+        raise
+'''
+
+CHARSETS = {
+    'ascii': '  ..::--==++**##%%@@',
+    'unicode': '  日本語の線画★☆♪♫🌙🌟🚀🐉',
+    'braille': ''.join(chr(0x2800 + i) for i in range(256)),
+}
+DISPLAY_SIZES = ('40x12', '80x24', '200x60')
+
+def size_label(count: int) -> str:
+    """Format an item count as 10, 1k, 100k"""
+    return f"{count // 1000}k" if count >= 1000 and count % 1000 == 0 else str(count)
+
+def random_art(rng: random.Random, chars: str, cols: int, rows: int) -> str:
+    """Return art with ragged lines, like generated pieces"""
+    return '\n'.join(''.join(rng.choice(chars) for _ in range(rng.randint(cols * 3 // 4, cols)))
+                     for _ in range(rows))
+
+def measure(func: Callable[[], object], min_runs: int = 5, max_runs: int = 1000,
+            budget: float = 0.5) -> Dict:
+    """Time func until both min_runs and the time budget are used up"""
+    times: List[float] = []
+    started = time.perf_counter()
+    while len(times) < max_runs and (len(times) < min_runs or time.perf_counter() - started < budget):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {
+        'runs': len(times),
+        'median_us': round(statistics.median(times) * 1e6, 1),
+        'min_us': round(min(times) * 1e6, 1)
+    }
+
+def build_cache(directory: Path, count: int, backend: str, seed: int = 0):
+    """Write a synthetic cache of count pieces
+    
+    Art comes from a small pool measured once and fingerprints are random,
+    so building 100k pieces takes seconds; the cache files have the same
+    layout as saved ones. Pack caches are migrated from the per-file layout.
+    """
+    rng = random.Random(seed)
+    pool = []
+    for _ in range(min(count, 64)):
+        art = random_art(rng, CHARSETS['ascii'], 60, 16)
+        pool.append((art, metrics(art)))
+    
+    base = datetime.now() - timedelta(seconds=count)
+    items = []
+    for i in range(count):
+        art, art_metrics = pool[i % len(pool)]
+        metadata = {
+            'id': f"{i:08x}",
+            'created': (base + timedelta(seconds=i)).isoformat(),
+            'prompt': f"Synthetic piece {i} for benchmarks",
+            'theme': ('cyberpunk', 'nature', 'space', 'retro')[i % 4],
+            'style': 'ASCII art',
+            'metrics': art_metrics
+        }
+        with open(directory / f"{metadata['id']}.txt", 'w') as f:
+            f.write(art)
+        with open(directory / f"{metadata['id']}.json", 'w') as f:
+            json.dump(metadata, f, indent=2)
+        items.append(index_entry(metadata, f"{rng.getrandbits(64):016x}"))
+    with open(directory / 'metadata.json', 'w') as f:
+        json.dump({'items': items, 'last_updated': datetime.now().isoformat()}, f, indent=2)
+    
+    if backend == 'pack':
+        from lib.pack import migrate_to_pack
+        migrate_to_pack(str(directory))
+
+def run_script(script: str, args: List[str], cache_dir: Path, backend: str):
+    """Run a CLI script to completion against a cache directory"""
+    code = DRIVER.format(root=str(ROOT), script=str(ROOT / script), args=args, cache_dir=str(cache_dir),
+                         stub_fetcher=script == 'main.py')
+    env = {**os.environ, **BENCH_ENV, 'CACHE_BACKEND': backend}
+    subprocess.run([sys.executable, '-c', code], env=env, check=True, stdout=subprocess.DEVNULL)
+
+def bench_login(results: Dict, cache_dir: Path, backend: str, label: str, runs: int):
+    """Wall time of a login from interpreter start to exit"""
+    for name, script, args in (('login.py', 'login.py', []), ('main.py login', 'main.py', ['login'])):
+        results[f"login/{backend}/{label}/{name}"] = measure(
+            lambda: run_script(script, args, cache_dir, backend), min_runs=runs, max_runs=runs)
+
+def bench_cache(results: Dict, cache_dir: Path, backend: str, label: str, seed: int = 1):
+    """Time the ArtCache operations on an open cache"""
+    rng = random.Random(seed)
+    cache = open_cache(str(cache_dir))
+    prefix = f"cache/{backend}/{label}"
+    
+    results[f"{prefix}/open_cache"] = measure(lambda: open_cache(str(cache_dir)), max_runs=200)
+    results[f"{prefix}/get_random_art"] = measure(cache.get_random_art)
+    results[f"{prefix}/list_cached_art"] = measure(cache.list_cached_art, min_runs=3, max_runs=50)
+    
+    # Saves add fresh pieces that the deletes then remove again
+    saved = []
+    save = lambda: saved.append(cache.save_art({
+        'art': random_art(rng, CHARSETS['ascii'], 60, 16),
+        'prompt': 'Benchmark piece', 'theme': 'space', 'style': 'ASCII art'
+    }))
+    save()
+    results[f"{prefix}/save_art"] = measure(save, max_runs=100)
+    results[f"{prefix}/delete_art_by_id"] = measure(lambda: cache.delete_art_by_id(saved.pop()),
+                                                    min_runs=1, max_runs=len(saved))
+
+class NullOutput:
+    """Stand-in for sys.stdout that discards output"""
+    encoding = 'utf-8'
+    errors = 'strict'
+    
+    def __init__(self):
+        self.buffer = io.BytesIO()
+    
+    def write(self, data):
+        return len(data)
+    
+    def flush(self):
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+def bench_display(results: Dict, seed: int = 2):
+    """Time rendering and writing pieces of each character set and size"""
+    rng = random.Random(seed)
+    display = ArtDisplay()
+    stdout = sys.stdout
+    sys.stdout = NullOutput()
+    try:
+        for charset, chars in CHARSETS.items():
+            for size in DISPLAY_SIZES:
+                cols, rows = (int(n) for n in size.split('x'))
+                art = random_art(rng, chars, cols, rows)
+                prefix = f"display/{charset}/{size}"
+                for name, func in (('display', lambda: display.display(art, theme='cyberpunk')),
+                                   ('_apply_theme_colors', lambda: display._apply_theme_colors(art, 'cyberpunk'))):
+                    result = measure(func)
+                    result['mchars_per_s'] = round(len(art) / result['min_us'], 2)
+                    results[f"{prefix}/{name}"] = result
+    finally:
+        sys.stdout = stdout
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Print the change per benchmark, return names that regressed"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            click.echo(f"  {name:<52}{result['min_us']:>12.1f} us  (new)")
+            continue
+        ratio = result['min_us'] / before['min_us'] if before['min_us'] else 1.0
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        click.echo(f"  {name:<52}{result['min_us']:>12.1f} us  {ratio - 1:>+7.0%}{flag}")
+    return regressions
+
+@click.command()
+@click.option('--sizes', default='10,1000,10000,100000', show_default=True,
+              help='Comma-separated cache sizes')
+@click.option('--backend', 'backends', multiple=True, type=click.Choice(BACKENDS),
+              help='Cache backend to benchmark, repeatable (default: both)')
+@click.option('--only', 'sections', multiple=True, type=click.Choice(SECTIONS),
+              help='Run only these sections, repeatable')
+@click.option('--login-runs', default=10, show_default=True, help='Login runs per cache')
+@click.option('--output', default=str(ROOT / 'bench' / 'results.json'), show_default=True,
+              type=click.Path(dir_okay=False), help='Where to write the results')
+@click.option('--baseline', default=str(ROOT / 'bench' / 'baseline.json'), show_default=True,
+              type=click.Path(dir_okay=False), help='Results to compare against')
+@click.option('--save-baseline', is_flag=True, help='Store these results as the new baseline')
+@click.option('--threshold', default=0.25, show_default=True,
+              help='Slowdown of the best time that counts as a regression')
+def main(sizes, backends, sections, login_runs, output, baseline, save_baseline, threshold):
+    """Run the benchmarks, write JSON results and compare with the baseline"""
+    os.environ.update(BENCH_ENV)
+    counts = [int(n) for n in sizes.split(',') if n.strip()]
+    backends = backends or BACKENDS
+    sections = sections or SECTIONS
+    results: Dict[str, Dict] = {}
+    
+    if 'login' in sections:
+        click.echo("Measuring login import time...")
+        best = min(measure_imports('login')[1] for _ in range(5))
+        results['login/import_time'] = {'runs': 5, 'median_us': float(best), 'min_us': float(best)}
+    
+    if 'login' in sections or 'cache' in sections:
+        for backend in backends:
+            for count in counts:
+                label = size_label(count)
+                directory = Path(tempfile.mkdtemp(prefix=f"motd-bench-{backend}-{label}-"))
+                # Saves must not evict the synthetic pieces
+                os.environ['CACHE_SIZE'] = str(count + 1000)
+                try:
+                    click.echo(f"Building {backend} cache with {count} pieces...")
+                    build_cache(directory, count, backend)
+                    if 'login' in sections:
+                        bench_login(results, directory, backend, label, login_runs)
+                    if 'cache' in sections:
+                        bench_cache(results, directory, backend, label)
+                finally:
+                    shutil.rmtree(directory, ignore_errors=True)
+    
+    if 'display' in sections:
+        click.echo("Measuring display...")
+        bench_display(results)
+    
+    report = {
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+    Path(output).write_text(json.dumps(report, indent=2))
+    click.echo(f"Results written to {output}")
+    
+    regressions = []
+    if save_baseline:
+        Path(baseline).write_text(json.dumps(report, indent=2))
+        click.echo(f"Baseline saved to {baseline}")
+    elif Path(baseline).exists():
+        click.echo(f"Compared with {baseline} (threshold +{threshold:.0%}):")
+        regressions = compare(results, json.loads(Path(baseline).read_text())['results'], threshold)
+    else:
+        click.echo("No baseline yet; rerun with --save-baseline to store one")
+        for name, result in results.items():
+            click.echo(f"  {name:<52}{result['min_us']:>12.1f} us")
+    
+    if regressions:
+        click.echo(f"{len(regressions)} benchmark(s) regressed", err=True)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
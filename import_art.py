@@ -3,92 +3,131 @@
 
 import sys
 import json
-import hashlib
 from pathlib import Path
-from datetime import datetime
 import click
 
+# Add lib to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from lib.cache import open_cache
+from lib.config import load_env
+
+# Examples of failed or skipped pieces listed in the summary
+REPORT_EXAMPLES = 5
+
 @click.command()
-@click.argument('file_path', type=click.Path(exists=True))
-@click.option('--id', '-i', help='Custom ID for the art (default: auto-generated)')
+@click.argument('sources', nargs=-1, required=True)
+@click.option('--id', '-i', help='Custom ID for the art (single file only, default: content hash)')
 @click.option('--description', '-d', default='Manually imported art', help='Description of the art')
 @click.option('--theme', '-t', default='custom', help='Theme category')
 @click.option('--style', '-s', default='ASCII art', help='Art style')
-def import_art(file_path, id, description, theme, style):
-    """Import a custom ASCII art file into the MOTD Artisan cache.
+@click.option('--pin', is_flag=True, help='Never evict the imported pieces (see motd-pin)')
+@click.option('--pattern', default='*.txt', show_default=True,
+              help='Files to import from directories and archives')
+@click.option('--jobs', '-j', type=click.IntRange(min=1), help='Worker processes (default: CPU count)')
+@click.option('--format', 'output_format', type=click.Choice(['text', 'json']), default='text',
+              help='Summary format')
+@click.option('--system', is_flag=True, help='Import into the shared SYSTEM_STORE instead of your own cache')
+def import_art(sources, id, description, theme, style, pin, pattern, jobs, output_format, system):
+    """Import ASCII art files into the MOTD Artisan cache.
+    
+    SOURCES are files, directories, globs, .tar/.zip archives or - for
+    stdin. Theme, style and description come from a sidecar <name>.json
+    next to each file when present, and from the options otherwise.
     
     Example:
         python import_art.py myart.txt --id mylogo --description "Company logo"
+        python import_art.py ~/art/ 'more/**/*.txt' curated.tar.gz -t retro
+        sudo python import_art.py --system /usr/share/motd-art/
     """
-    # Setup paths
-    script_dir = Path(__file__).parent
-    cache_dir = script_dir / 'cache'
-    cache_dir.mkdir(exist_ok=True)
-    
-    # Read the art file
-    with open(file_path, 'r') as f:
-        art_content = f.read()
+    from lib.bulk import import_sources
+    from lib.cache import system_store
     
-    # Generate ID if not provided
-    if not id:
-        # Use first 8 chars of MD5 hash
-        id = hashlib.md5(art_content.encode()).hexdigest()[:8]
+    load_env(Path(__file__).parent / '.env')
+    store = system_store() if system else None
+    if system and store is None:
+        raise click.UsageError("--system needs SYSTEM_STORE to be set")
     
     # Validate ID (alphanumeric and underscores only)
-    if not id.replace('_', '').isalnum():
+    if id and not id.replace('_', '').isalnum():
         click.echo("Error: ID must be alphanumeric (underscores allowed)", err=True)
         sys.exit(1)
-    
-    # Check if ID already exists
-    art_file = cache_dir / f"{id}.txt"
-    if art_file.exists():
-        click.echo(f"Error: Art with ID '{id}' already exists", err=True)
+    if id and len(id.encode('utf-8')) > 16:
+        # The pack index and eviction statistics store IDs in 16 bytes
+        click.echo("Error: ID must be at most 16 bytes", err=True)
         sys.exit(1)
     
-    # Save art file
-    with open(art_file, 'w') as f:
-        f.write(art_content)
+    defaults = {'prompt': description, 'theme': theme, 'style': style}
+    if id:
+        defaults['id'] = id
+    if pin:
+        defaults['pinned'] = True
+    
+    bar = None
     
-    # Create metadata JSON
-    metadata = {
-        'id': id,
-        'created': datetime.now().isoformat(),
-        'prompt': description,
-        'theme': theme,
-        'style': style
-    }
+    def collected(count):
+        nonlocal bar
+        if id and count != 1:
+            raise click.UsageError(f"--id needs a single piece to import, found {count}")
+        if id and id in cache.ids():
+            raise click.UsageError(f"Art with ID '{id}' already exists")
+        if output_format == 'text' and count > 1:
+            bar = click.progressbar(length=count, label=f"Preparing {count} pieces", file=sys.stderr)
     
-    meta_file = cache_dir / f"{id}.json"
-    with open(meta_file, 'w') as f:
-        json.dump(metadata, f, indent=2)
+    try:
+        cache = open_cache(store)
+        report = import_sources(cache, list(sources), defaults, pattern=pattern, jobs=jobs,
+                                on_done=lambda result: bar and bar.update(1), on_collected=collected)
+    except click.UsageError:
+        raise
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    finally:
+        if bar is not None:
+            bar.render_finish()
     
-    # Update main metadata file
-    metadata_file = cache_dir / 'metadata.json'
-    if metadata_file.exists():
-        with open(metadata_file, 'r') as f:
-            main_metadata = json.load(f)
+    if output_format == 'json':
+        click.echo(json.dumps(report, indent=2))
     else:
-        main_metadata = {'items': [], 'last_updated': None}
+        print_summary(report)
+    if not report['imported'] and report['failed']:
+        sys.exit(1)
+
+def print_summary(report):
+    """Print the import report as text"""
+    imported = report['imported']
+    seconds = report['seconds']
+    total = sum(seconds.values())
+    rate = f", {len(imported) / total:.0f} pieces/s" if imported and total else ''
+    click.echo(f"Imported {len(imported)} of {report['found']} pieces in {total:.2f}s{rate} "
+               f"(collect {seconds['collect']:.2f}s, prepare {seconds['prepare']:.2f}s, "
+               f"save {seconds['save']:.2f}s)")
     
-    # Add new entry
-    main_metadata['items'].append({
-        'id': id,
-        'created': metadata['created']
-    })
-    main_metadata['last_updated'] = datetime.now().isoformat()
+    for key, label in (('duplicates', 'exact duplicates skipped'),
+                       ('near_duplicates', 'near-duplicates of cached art skipped'),
+                       ('failed', 'failed')):
+        entries = report[key]
+        if not entries:
+            continue
+        click.echo(f"  {len(entries)} {label}")
+        for entry in entries[:REPORT_EXAMPLES]:
+            detail = entry.get('error') or f"same as {entry['id']}"
+            click.echo(f"    {entry['name']}: {detail}")
+        if len(entries) > REPORT_EXAMPLES:
+            click.echo(f"    ... and {len(entries) - REPORT_EXAMPLES} more")
     
-    # Save updated metadata
-    with open(metadata_file, 'w') as f:
-        json.dump(main_metadata, f, indent=2)
+    if report['evicted']:
+        click.echo(f"  {report['evicted']} older pieces evicted to stay within CACHE_SIZE/CACHE_BYTES")
+    if report['not_kept']:
+        click.echo(f"  {report['not_kept']} imported pieces did not fit CACHE_SIZE/CACHE_BYTES; "
+                   f"raise them or use --pin to keep them all")
     
-    click.echo(f"✓ Successfully imported art with ID: {id}")
-    click.echo(f"  File: {art_file}")
-    click.echo(f"  Theme: {theme}")
-    click.echo(f"  Style: {style}")
-    click.echo(f"  Description: {description}")
-    click.echo(f"\nYou can now use:")
-    click.echo(f"  motd-show -i {id}")
-    click.echo(f"  motd-delete {id}")
+    if len(imported) == 1 and not report['not_kept']:
+        art_id = imported[0]['id']
+        click.echo(f"\nYou can now use:")
+        click.echo(f"  motd-show -i {art_id}")
+        click.echo(f"  motd-delete {art_id}")
 
 if __name__ == '__main__':
-    import_art()
\ No newline at end of file
+    import_art()
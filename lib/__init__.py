@@ -1,7 +1,20 @@
 """ASCII Login Art Library"""
 
-from .fetch import ArtFetcher
-from .cache import ArtCache
-from .display import ArtDisplay
+from importlib import import_module
 
-__all__ = ['ArtFetcher', 'ArtCache', 'ArtDisplay']
\ No newline at end of file
+__all__ = ['ArtFetcher', 'ArtCache', 'ArtDisplay', 'PackedArtCache', 'open_cache']
+
+# Classes are imported on first access so that the login path, which only
+# needs the cache and display modules, never pulls in the OpenAI SDK.
+_lazy_classes = {
+    'ArtFetcher': '.fetch',
+    'ArtCache': '.cache',
+    'ArtDisplay': '.display',
+    'PackedArtCache': '.pack',
+    'open_cache': '.cache',
+}
+
+def __getattr__(name):
+    if name in _lazy_classes:
+        return getattr(import_module(_lazy_classes[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
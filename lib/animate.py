@@ -0,0 +1,405 @@
+"""Animated display: frames drawn by redrawing only the cells that change
+
+A frame is a grid of cells, one per terminal column, each holding the
+character drawn there and the SGR escapes it is drawn with. The player
+reserves the art's rows below the cursor, then for every frame moves the
+cursor (relative CUU/CUD/CUF/CUB escapes, so the art can sit anywhere on
+the screen) to each run of changed cells and rewrites only that run.
+"""
+
+import os
+import re
+import sys
+import time
+import random
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import trace
+from .width import TOKEN_RE, VARIATION_EMOJI, char_width, line_width
+
+# A cell: the character (or '' for the second column of a wide one) and the
+# SGR escapes active when it is drawn
+Cell = Tuple[str, str]
+Grid = List[List[Cell]]
+BLANK: Cell = (' ', '')
+
+# Multi-frame art: frames separated by a line holding only a form feed
+FRAME_BREAK = '\n\f\n'
+
+EFFECTS = ('frames', 'rain', 'typewriter', 'scroll')
+
+# Unchanged cells between two changes that are rewritten rather than
+# skipped; a cursor move costs about this many bytes
+MERGE_GAP = 4
+
+HIDE_CURSOR = '\033[?25l'
+SHOW_CURSOR = '\033[?25h'
+RESET = '\033[0m'
+
+FOREGROUND_RE = re.compile(r'\033\[(?:3[0-7]|9[0-7]|38;5;\d+|38;2;\d+;\d+;\d+)m')
+
+# Digital rain glyphs: half-width katakana, digits and a few symbols
+RAIN_GLYPHS = [chr(code) for code in range(0xff66, 0xff9e)] + list('0123456789:.=*+-<>')
+RAIN_HEAD = '\033[97m'
+RAIN_TRAIL = ('\033[92m', '\033[32m', '\033[2;32m')
+
+def split_frames(art: str) -> List[str]:
+    """Split multi-frame art into its frames; single-frame art is one frame"""
+    return art.split(FRAME_BREAK)
+
+def last_frame(art: str) -> str:
+    """Get the frame still art shows: the last one"""
+    return art.rsplit(FRAME_BREAK, 1)[-1]
+
+def _apply_sgr(style: str, escape: str) -> str:
+    """Update the active escapes; a reset clears them, a new colour replaces the old"""
+    if escape in ('\033[0m', '\033[m'):
+        return ''
+    if FOREGROUND_RE.fullmatch(escape):
+        style = FOREGROUND_RE.sub('', style)
+    return style + escape
+
+def to_grid(text: str, rows: int, cols: int) -> Grid:
+    """Lay rendered text (colour escapes included) out as rows x cols cells
+    
+    Lines are cut at cols; wide characters take their cell and a ''
+    continuation cell, zero-width ones join the cell before them. Colours
+    carry across line breaks as they do on a terminal.
+    """
+    grid = []
+    style = ''
+    for line in text.split('\n')[:rows]:
+        row: List[Cell] = []
+        for token in TOKEN_RE.findall(line):
+            if token[0] == '\033':
+                if token[-1] == 'm':
+                    style = _apply_sgr(style, token)
+                continue
+            width = char_width(token)
+            if width == 0:
+                lead = len(row) - 1
+                if lead > 0 and not row[lead][0]:
+                    lead -= 1
+                if lead >= 0:
+                    char, cell_style = row[lead]
+                    row[lead] = (char + token, cell_style)
+                    if token == VARIATION_EMOJI and lead == len(row) - 1 and len(row) < cols \
+                            and char_width(char[0]) == 1:
+                        # Emoji presentation widens a narrow symbol
+                        row.append(('', cell_style))
+                continue
+            if len(row) + width > cols:
+                break
+            row.append((token, style))
+            if width == 2:
+                row.append(('', style))
+        row.extend([BLANK] * (cols - len(row)))
+        grid.append(row)
+    grid.extend([[BLANK] * cols for _ in range(rows - len(grid))])
+    return grid
+
+class Screen:
+    """The terminal area the art occupies, as last drawn
+    
+    update() returns the escapes that turn it into a new frame. The cursor
+    position is tracked relative to the area's top left cell.
+    """
+    
+    def __init__(self, rows: int, cols: int):
+        """Initialize a blank Screen of rows x cols cells"""
+        self.rows = rows
+        self.cols = cols
+        self.grid: Grid = [[BLANK] * cols for _ in range(rows)]
+        self.row = 0
+        self.col = 0
+        self.style = ''
+    
+    def reserve(self) -> str:
+        """Make room for the area below the cursor and return to its top left"""
+        self.row = self.col = 0
+        return '\r' + '\n' * self.rows + (f"\033[{self.rows}A" if self.rows else '')
+    
+    def _move(self, out: List[str], row: int, col: int):
+        """Move the cursor to a cell of the area"""
+        if row > self.row:
+            out.append(f"\033[{row - self.row}B" if row - self.row > 1 else '\033[B')
+        elif row < self.row:
+            out.append(f"\033[{self.row - row}A" if self.row - row > 1 else '\033[A')
+        if col != self.col:
+            if col == 0:
+                out.append('\r')
+            elif col > self.col:
+                out.append(f"\033[{col - self.col}C" if col - self.col > 1 else '\033[C')
+            else:
+                out.append(f"\033[{self.col - col}D" if self.col - col > 1 else '\033[D')
+        self.row, self.col = row, col
+    
+    def _write(self, out: List[str], cells: List[Cell]):
+        """Draw cells from the cursor on, switching colour only where it changes"""
+        for char, style in cells:
+            if not char:
+                # Covered by the wide character before it
+                continue
+            if style != self.style:
+                out.append(RESET + style if self.style else style)
+                self.style = style
+            out.append(char)
+        self.col += len(cells)
+    
+    def update(self, grid: Grid) -> str:
+        """Return the escapes redrawing the cells that differ from grid"""
+        out: List[str] = []
+        cols = self.cols
+        for r, (old, new) in enumerate(zip(self.grid, grid)):
+            if old == new:
+                continue
+            c = 0
+            while c < cols:
+                if old[c] == new[c]:
+                    c += 1
+                    continue
+                start = c - 1 if not new[c][0] and c else c
+                end = c + 1
+                gap = 0
+                for j in range(c + 1, cols):
+                    if old[j] != new[j]:
+                        end = j + 1
+                        gap = 0
+                    else:
+                        gap += 1
+                        if gap > MERGE_GAP:
+                            break
+                if end < cols and not new[end][0]:
+                    end += 1
+                self._move(out, r, start)
+                self._write(out, new[start:end])
+                c = end
+        self.grid = [list(row) for row in grid]
+        return ''.join(out)
+    
+    def finish(self) -> str:
+        """Reset the colour and leave the cursor on the line below the area"""
+        out = [RESET] if self.style else []
+        self.style = ''
+        self._move(out, self.rows, 0)
+        return ''.join(out)
+
+# Effects: each yields frames ending on the art as it is finally shown
+
+def play_frames(grids: List[Grid], count: int) -> Iterator[Grid]:
+    """Cycle the frames of multi-frame art, ending on the last"""
+    for i in range(count - 1):
+        yield grids[i % len(grids)]
+    yield grids[-1]
+
+def typewriter(final: Grid, count: int) -> Iterator[Grid]:
+    """Reveal the art character by character in reading order"""
+    rows, cols = len(final), len(final[0]) if final else 0
+    cells = [(r, c) for r in range(rows) for c in range(cols) if final[r][c] != BLANK and final[r][c][0]]
+    grid = [[BLANK] * cols for _ in range(rows)]
+    shown = 0
+    for step in range(1, count + 1):
+        upto = len(cells) * step // count
+        for r, c in cells[shown:upto]:
+            grid[r][c] = final[r][c]
+            if c + 1 < cols and not final[r][c + 1][0]:
+                grid[r][c + 1] = final[r][c + 1]
+        shown = upto
+        yield grid
+
+def scroll(final: Grid, count: int) -> Iterator[Grid]:
+    """Slide the art in from the right edge"""
+    rows, cols = len(final), len(final[0]) if final else 0
+    for step in range(1, count + 1):
+        cut = cols * step // count
+        grid = []
+        for row in final:
+            shifted = [BLANK] * (cols - cut) + row[:cut]
+            if cut < cols and cut and not row[cut][0]:
+                # Never leave half of a wide character at the edge
+                shifted[-1] = BLANK
+            grid.append(shifted)
+        yield grid
+
+def rain(final: Grid, count: int, rng: Optional[random.Random] = None) -> Iterator[Grid]:
+    """Digital rain: falling glyph streams that leave the art behind them"""
+    rng = rng or random.Random()
+    rows, cols = len(final), len(final[0]) if final else 0
+    trail = len(RAIN_TRAIL)
+    # Every stream must pass the bottom row by the last frame
+    speed = (rows + trail + rows) / max(1, count - 1)
+    starts = [rng.uniform(-rows, 0) for _ in range(cols)]
+    for step in range(count):
+        grid = []
+        heads = [int(start + speed * step) for start in starts]
+        for r in range(rows):
+            row = []
+            for c in range(cols):
+                distance = heads[c] - r
+                if distance < 0:
+                    row.append(BLANK)
+                elif distance == 0:
+                    row.append((rng.choice(RAIN_GLYPHS), RAIN_HEAD))
+                elif distance <= trail and final[r][c] == BLANK:
+                    row.append((rng.choice(RAIN_GLYPHS), RAIN_TRAIL[distance - 1]))
+                else:
+                    row.append(final[r][c])
+            grid.append(row)
+        yield _mend_wide(grid, final)
+    yield final
+
+def _mend_wide(grid: Grid, final: Grid) -> Grid:
+    """Blank wide characters of the art that a glyph covers half of"""
+    for row, final_row in zip(grid, final):
+        for c in range(len(row) - 1):
+            if final_row[c + 1][0] or not final_row[c][0]:
+                continue
+            lead, rest = row[c] == final_row[c], row[c + 1] == final_row[c + 1]
+            if lead and not rest:
+                row[c] = BLANK
+            elif rest and not lead:
+                row[c + 1] = BLANK
+    return grid
+
+class AnimationPlayer:
+    """Plays frames on the terminal within a time budget
+    
+    Frames are paced on the monotonic clock at ANIMATION_FPS (default 20).
+    Frames that are already late are dropped, and once the next frame would
+    end past ANIMATION_BUDGET seconds (default 1.5) the final frame is
+    drawn and play stops, so a slow terminal shortens the animation rather
+    than the login. Per-frame render time and bytes are kept in
+    frame_stats and traced as animate.frame spans.
+    """
+    
+    def __init__(self, out=None, fps: Optional[float] = None, budget: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        """Initialize the AnimationPlayer writing to out (default stdout)"""
+        self.out = out or sys.stdout
+        self.fps = fps or float(os.getenv('ANIMATION_FPS', '20'))
+        self.budget = float(os.getenv('ANIMATION_BUDGET', '1.5')) if budget is None else budget
+        self.clock = clock
+        self.sleep = sleep
+        self.frame_stats: List[Tuple[float, int]] = []
+        self.dropped = 0
+        self.elapsed = 0.0
+    
+    def frame_count(self) -> int:
+        """Frames that fit in the budget"""
+        return max(1, int(self.budget * self.fps))
+    
+    def _write(self, text: str) -> int:
+        """Write escapes to the terminal at once, return the bytes written"""
+        encoding = getattr(self.out, 'encoding', None) or 'utf-8'
+        data = text.encode(encoding, 'replace')
+        buffer = getattr(self.out, 'buffer', None)
+        if buffer is None:
+            self.out.write(data.decode(encoding))
+            self.out.flush()
+        else:
+            self.out.flush()
+            buffer.write(data)
+            buffer.flush()
+        return len(data)
+    
+    def _draw(self, screen: Screen, grid: Grid, started: float, last: bool = False):
+        """Draw one frame and record how long it took to render and its size
+        
+        The last frame also leaves the cursor below the art, in the same write.
+        """
+        with trace.span('animate.frame') as span:
+            text = screen.update(grid)
+            if last:
+                text += screen.finish() + SHOW_CURSOR
+            rendered = time.perf_counter() - started
+            size = self._write(text) if text else 0
+            span.set(bytes=size)
+        self.frame_stats.append((rendered, size))
+    
+    def play(self, frames: Iterable[Grid], final: Grid):
+        """Play frames, then make sure final is on screen"""
+        rows, cols = len(final), len(final[0]) if final else 0
+        screen = Screen(rows, cols)
+        interval = 1 / self.fps
+        start = self.clock()
+        deadline = start + self.budget
+        self._write(HIDE_CURSOR + screen.reserve())
+        # Time the last frame took to draw; the final one needs as long
+        cost = 0.0
+        try:
+            frames = iter(frames)
+            index = 0
+            while True:
+                due = start + index * interval
+                index += 1
+                if due + max(interval, 2 * cost) > deadline:
+                    break
+                now = self.clock()
+                if due > now:
+                    self.sleep(due - now)
+                began = self.clock()
+                started = time.perf_counter()
+                grid = next(frames, None)
+                if grid is None:
+                    break
+                if self.clock() > due + interval:
+                    # Late already; catch up rather than fall further behind
+                    self.dropped += 1
+                    continue
+                self._draw(screen, grid, started)
+                cost = self.clock() - began
+        finally:
+            self._draw(screen, final, time.perf_counter(), last=True)
+            self.elapsed = self.clock() - start
+    
+    def report(self) -> Dict:
+        """Summarise frame render times (microseconds) and bytes per frame"""
+        renders = sorted(rendered * 1e6 for rendered, _ in self.frame_stats)
+        sizes = [size for _, size in self.frame_stats]
+        return {
+            'frames': len(self.frame_stats),
+            'dropped': self.dropped,
+            'seconds': round(self.elapsed, 3),
+            'render_us': {
+                'p50': renders[len(renders) // 2] if renders else 0,
+                'max': renders[-1] if renders else 0
+            },
+            'bytes': {
+                'total': sum(sizes),
+                'mean': sum(sizes) / len(sizes) if sizes else 0,
+                'max': max(sizes, default=0)
+            }
+        }
+
+def animate(display, art: str, effect: str, theme: Optional[str] = None,
+            player: Optional[AnimationPlayer] = None) -> AnimationPlayer:
+    """Play art on the terminal with an effect, coloured as display would
+    
+    Returns the player, whose report() describes the frames drawn.
+    """
+    if effect not in EFFECTS:
+        raise ValueError(f"Unknown animation '{effect}' (expected {', '.join(EFFECTS)})")
+    player = player or AnimationPlayer()
+    try:
+        columns, lines = os.get_terminal_size(player.out.fileno())
+    except (AttributeError, OSError, ValueError):
+        columns, lines = 80, 24
+    
+    texts = split_frames(art)
+    rows = min(max(text.count('\n') + 1 for text in texts), max(1, lines - 1))
+    # The last column is never written: a cursor there is left pending a wrap
+    cols = min(max(line_width(line) for text in texts for line in text.split('\n')), max(1, columns - 1))
+    grids = [to_grid(display.render(text, theme=theme), rows, cols) for text in texts]
+    final = grids[-1]
+    
+    count = player.frame_count()
+    if effect == 'frames':
+        frames = play_frames(grids, count)
+    elif effect == 'rain':
+        frames = rain(final, count)
+    elif effect == 'typewriter':
+        frames = typewriter(final, count)
+    else:
+        frames = scroll(final, count)
+    player.play(frames, final)
+    return player
@@ -0,0 +1,142 @@
+"""Atomic file replacement and the cache writer lock"""
+
+import os
+import fcntl
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Union
+
+# Batches at least this large are flushed with one syncfs() of the cache's
+# filesystem rather than an fsync per file
+SYNC_BATCH = 256
+
+# New file permissions, read from the umask on first use
+_file_mode = None
+
+def file_mode() -> int:
+    """Permissions for new cache files: 0o666 less the umask
+    
+    Temporary files start out private (0600); a system store shared with
+    other users needs them readable once renamed into place.
+    """
+    global _file_mode
+    if _file_mode is None:
+        umask = os.umask(0o022)
+        os.umask(umask)
+        _file_mode = 0o666 & ~umask
+    return _file_mode
+
+def atomic_write(path: Union[str, Path], data: Union[str, bytes]):
+    """Replace a file so that readers see either the old or the new content
+    
+    The data goes to a temporary file in the same directory, which is fsynced
+    and renamed over the target; the directory is fsynced afterwards so the
+    rename survives a crash.
+    """
+    path = Path(path)
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        os.fchmod(fd, file_mode())
+        with os.fdopen(fd, mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+    fsync_dir(path.parent)
+
+def atomic_write_many(files: Dict[Path, Union[str, bytes]], workers: int = 16):
+    """Replace many files in one directory, as atomic_write does for one
+    
+    Temporary files are written, made durable, renamed into place and the
+    directory fsynced once. Where the C library has syncfs() (Linux), a
+    batch of SYNC_BATCH files or more is flushed with one syncfs() on the
+    directory, which covers only the filesystem the cache lives on; other
+    batches are fsynced from a thread pool so the filesystem can batch the
+    flushes. Nothing is renamed before every file is durable, so a failed
+    write leaves all targets unchanged.
+    """
+    if not files:
+        return
+    directory = next(iter(files)).parent
+    # One random tag per batch; O_EXCL still refuses a name in use
+    tag = os.urandom(4).hex()
+    mode = file_mode()
+    temporaries = []
+    try:
+        for path, data in files.items():
+            tmp_name = f"{path.parent}/.{path.name}.{tag}.tmp"
+            fd = os.open(tmp_name, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            temporaries.append(tmp_name)
+            try:
+                os.fchmod(fd, mode)
+                view = memoryview(data.encode() if isinstance(data, str) else data)
+                while view:
+                    view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
+        if len(temporaries) < SYNC_BATCH or not _syncfs(directory):
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(_fsync_path, temporaries))
+        for tmp_name, path in zip(temporaries, files):
+            os.replace(tmp_name, path)
+        temporaries = []
+    finally:
+        for tmp_name in temporaries:
+            try:
+                os.unlink(tmp_name)
+            except FileNotFoundError:
+                pass
+    fsync_dir(directory)
+
+def _syncfs(directory: Path) -> bool:
+    """Flush the filesystem holding directory, False if syncfs() isn't available"""
+    import ctypes
+    
+    try:
+        syncfs = ctypes.CDLL(None, use_errno=True).syncfs
+    except (OSError, AttributeError):
+        return False
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        return syncfs(fd) == 0
+    finally:
+        os.close(fd)
+
+def _fsync_path(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def fsync_dir(directory: Union[str, Path]):
+    """Flush a directory entry update (rename, unlink) to disk"""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def cache_lock(cache_dir: Union[str, Path]):
+    """Hold the exclusive writer lock for a cache directory
+    
+    Every cache mutation runs under this advisory lock. Readers never take
+    it; they rely on writers only publishing complete files via rename.
+    """
+    fd = os.open(Path(cache_dir) / '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
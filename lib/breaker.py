@@ -0,0 +1,139 @@
+"""Circuit breaker and latency budget for fetching while art is displayed"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Weight of the newest fetch time in the moving average
+LATENCY_WEIGHT = 0.3
+
+class CircuitBreaker:
+    """Remember recent fetch failures across processes
+    
+    State lives in breaker.json in the cache directory, so one login that
+    waited on a dead network spares the next ones. After BREAKER_FAILURES
+    failures in a row the breaker opens for BREAKER_COOLDOWN seconds: no
+    foreground fetch is tried and no refill worker is started. After the
+    cooldown one caller gets a trial fetch, which reopens the breaker at
+    once so others keep skipping the network until it succeeds.
+    
+    It also keeps a moving average of how long fetches take, which tells a
+    display command whether a fetch can finish within its budget.
+    Concurrent updates may lose one record, which only delays opening.
+    """
+    
+    def __init__(self, cache_dir: Path):
+        """Initialize the CircuitBreaker for a cache directory"""
+        self.state_file = Path(cache_dir) / 'breaker.json'
+        self.threshold = int(os.getenv('BREAKER_FAILURES', '3'))
+        self.cooldown = float(os.getenv('BREAKER_COOLDOWN', '300'))
+    
+    def _load(self) -> Dict:
+        """Read the shared state"""
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'failures': 0, 'opened': None, 'latency': None}
+    
+    def _save(self, state: Dict):
+        """Write the shared state; a failure only costs the record"""
+        from .atomic import atomic_write
+        try:
+            atomic_write(self.state_file, json.dumps(state))
+        except OSError:
+            pass
+    
+    def is_open(self) -> bool:
+        """Check if fetches are being skipped"""
+        opened = self._load()['opened']
+        return opened is not None and time.time() - opened < self.cooldown
+    
+    def allow(self) -> bool:
+        """Check if a fetch may start, claiming the trial after a cooldown"""
+        state = self._load()
+        if state['opened'] is None:
+            return True
+        if time.time() - state['opened'] < self.cooldown:
+            return False
+        state['opened'] = time.time()
+        self._save(state)
+        return True
+    
+    def expected_seconds(self) -> Optional[float]:
+        """Average time of recent successful fetches, None before the first"""
+        return self._load()['latency']
+    
+    def record_success(self, seconds: float):
+        """Close the breaker and fold a fetch time into the average"""
+        state = self._load()
+        latency = state['latency']
+        state.update(failures=0, opened=None,
+                     latency=seconds if latency is None else latency + LATENCY_WEIGHT * (seconds - latency))
+        self._save(state)
+    
+    def record_failure(self):
+        """Count a failed fetch, opening the breaker at the threshold"""
+        state = self._load()
+        state['failures'] += 1
+        if state['failures'] >= self.threshold:
+            state['opened'] = time.time()
+        self._save(state)
+    
+    def status(self) -> Dict:
+        """Return the state, failures in a row and seconds until a retry"""
+        state = self._load()
+        remaining = 0.0
+        if state['opened'] is not None:
+            remaining = max(0.0, state['opened'] + self.cooldown - time.time())
+        return {'state': 'open' if remaining else 'closed', 'failures': state['failures'],
+                'retry_in': remaining, 'latency': state['latency']}
+
+def fetch_within_budget(cache, budget: float) -> Optional[Tuple[str, str]]:
+    """Fetch and save a piece for a display command that found none cached
+    
+    Returns (ID, art), or None without touching the network when budget is
+    not positive, the breaker is open or fetches have recently taken longer
+    than the budget. The fetch itself is abandoned at the deadline.
+    
+    The deadline starts before the source is built: a display process
+    always starts cold, so importing the SDK and building its client are
+    part of what the budget, the breaker and the latency average cover.
+    """
+    if budget <= 0:
+        return None
+    start = time.monotonic()
+    breaker = CircuitBreaker(cache.cache_dir)
+    expected = breaker.expected_seconds()
+    if expected is not None and expected > budget:
+        return None
+    if not breaker.allow():
+        return None
+    
+    from .refill import art_source
+    from . import trace
+    
+    with trace.span('fetch.budget', budget=budget) as span:
+        try:
+            source = art_source()
+        except ValueError:
+            # Not configured (no API key, no IMAGE_DIR): not the network's fault
+            span.set(outcome='unconfigured')
+            return None
+        try:
+            fetch = getattr(source, 'fetch_within', None)
+            # fetch_within builds the client in its worker, inside the deadline
+            art_data = fetch(budget - (time.monotonic() - start)) if fetch else source.fetch_art()
+        except ImportError:
+            # No SDK installed: not the network's fault either
+            span.set(outcome='unconfigured')
+            return None
+        except Exception as e:
+            breaker.record_failure()
+            span.set(outcome='timeout' if isinstance(e, TimeoutError) else 'failed')
+            return None
+        breaker.record_success(time.monotonic() - start)
+        span.set(outcome='fetched')
+    return cache.save_art(art_data), art_data['art']
@@ -0,0 +1,275 @@
+"""Bulk import of art from directories, globs, archives and stdin"""
+
+import fnmatch
+import functools
+import glob
+import io
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ARCHIVE_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz', '.zip')
+
+# Fewer pieces than this are prepared in-process; starting workers costs more
+PARALLEL_MIN = 64
+
+# Sidecar metadata keys and the art_data field each one sets; a sidecar
+# may also pin its piece with "pinned": true
+SIDECAR_FIELDS = (('prompt', 'prompt'), ('description', 'prompt'), ('theme', 'theme'), ('style', 'style'))
+
+# (name, content or None to read the file at name, sidecar content or None)
+Source = Tuple[str, Optional[bytes], Optional[bytes]]
+
+def is_archive(path: Path) -> bool:
+    """Check if a path names a tar or zip archive by its suffix"""
+    return path.name.lower().endswith(ARCHIVE_SUFFIXES)
+
+def _matches(name: str, pattern: str) -> bool:
+    """Check a file name against a pattern or comma-separated patterns"""
+    return any(fnmatch.fnmatch(name, part) for part in pattern.split(','))
+
+def collect(sources: List[str], pattern: str = '*.txt') -> List[Source]:
+    """Expand import sources into the pieces to import, in a stable order
+    
+    A source is a file, a directory (searched recursively for files matching
+    pattern, skipping hidden ones), a glob, a .tar/.zip archive (members
+    matching pattern) or '-' for stdin, which holds an archive or one piece.
+    pattern may list several patterns separated by commas.
+    """
+    pieces: List[Source] = []
+    for source in sources:
+        if source == '-':
+            data = sys.stdin.buffer.read()
+            archive = _open_archive(io.BytesIO(data))
+            if archive is None:
+                pieces.append(('<stdin>', data, None))
+            else:
+                pieces.extend(_archive_pieces(archive, '<stdin>', pattern))
+            continue
+        
+        path = Path(source)
+        if path.is_dir():
+            for file in sorted(path.rglob('*')):
+                hidden = any(part.startswith('.') for part in file.relative_to(path).parts)
+                if file.is_file() and not hidden and _matches(file.name, pattern):
+                    pieces.append((str(file), None, None))
+            continue
+        
+        matches = [path] if path.exists() else [Path(match) for match in sorted(glob.glob(source, recursive=True))]
+        if not matches:
+            raise FileNotFoundError(f"No such file, directory or match: '{source}'")
+        for match in matches:
+            if not match.is_file():
+                continue
+            if is_archive(match):
+                with open(match, 'rb') as f:
+                    archive = _open_archive(f)
+                    if archive is None:
+                        raise ValueError(f"Not a readable archive: '{match}'")
+                    pieces.extend(_archive_pieces(archive, str(match), pattern))
+            else:
+                pieces.append((str(match), None, None))
+    return pieces
+
+def _open_archive(f):
+    """Open a binary file object as a zip or tar archive, None if it's neither"""
+    if zipfile.is_zipfile(f):
+        f.seek(0)
+        return zipfile.ZipFile(f)
+    f.seek(0)
+    try:
+        return tarfile.open(fileobj=f, mode='r:*')
+    except tarfile.ReadError:
+        return None
+
+def _archive_pieces(archive, label: str, pattern: str) -> List[Source]:
+    """Read the members of an archive that match pattern, with their sidecars
+    
+    Members are only read into memory, never extracted, so paths inside the
+    archive can't point anywhere on disk.
+    """
+    contents = {}
+    with archive:
+        if isinstance(archive, zipfile.ZipFile):
+            for info in archive.infolist():
+                if not info.is_dir():
+                    contents[info.filename] = archive.read(info)
+        else:
+            for member in archive:
+                if member.isfile():
+                    contents[member.name] = archive.extractfile(member).read()
+    
+    pieces = []
+    for name in sorted(contents):
+        base = os.path.basename(name)
+        if base.startswith('.') or not _matches(base, pattern):
+            continue
+        sidecar = contents.get(os.path.splitext(name)[0] + '.json')
+        pieces.append((f"{label}:{name}", contents[name], sidecar))
+    return pieces
+
+def normalise_art(text: str) -> str:
+    """Clean up art text for storage
+    
+    Line endings become \\n, tabs are expanded, trailing whitespace and
+    blank lines before and after the art are dropped. Leading spaces are
+    kept, they are part of the picture.
+    """
+    text = text.lstrip('\ufeff').replace('\r\n', '\n').replace('\r', '\n')
+    # A lone form feed separates the frames of animated art (see lib.animate)
+    lines = [line if line == '\f' else line.expandtabs(8).rstrip() for line in text.split('\n')]
+    while lines and not lines[0]:
+        lines.pop(0)
+    while lines and not lines[-1]:
+        lines.pop()
+    return '\n'.join(lines)
+
+def read_source(source: Source, defaults: Dict[str, str]) -> Tuple[str, bytes, Dict]:
+    """Read a source's content and the art_data fields its sidecar sets"""
+    name, data, sidecar = source
+    if data is None:
+        data = Path(name).read_bytes()
+        sidecar_file = Path(name).with_suffix('.json')
+        if sidecar_file != Path(name) and sidecar_file.is_file():
+            sidecar = sidecar_file.read_bytes()
+    
+    fields = dict(defaults)
+    if sidecar is not None:
+        meta = json.loads(sidecar)
+        for key, field in SIDECAR_FIELDS:
+            if isinstance(meta.get(key), str) and meta[key]:
+                fields[field] = meta[key]
+        if meta.get('pinned') is True:
+            fields['pinned'] = True
+    return name, data, fields
+
+def prepared_piece(name: str, art: str, fields: Dict) -> Dict:
+    """Build art_data for save_many with the ID, fingerprint and metrics"""
+    from .cache import content_id
+    from .similarity import fingerprint
+    from .width import metrics
+    
+    piece_id = content_id(art)
+    return {
+        'name': name,
+        'content_id': piece_id,
+        'art': art,
+        **fields,
+        'id': fields.get('id') or piece_id,
+        'fingerprint': fingerprint(art),
+        'metrics': metrics(art)
+    }
+
+def prepare(source: Source, defaults: Dict[str, str]) -> Dict:
+    """Read, normalise, hash and measure one piece (runs in worker processes)
+    
+    Returns art_data for ArtCache.save_many with the ID, fingerprint and
+    metrics already computed, plus 'name' and 'content_id'; or 'name' and
+    'error' if the piece can't be imported.
+    """
+    name = source[0]
+    try:
+        name, data, fields = read_source(source, defaults)
+        art = normalise_art(data.decode('utf-8'))
+        if not art:
+            return {'name': name, 'error': 'no art in file'}
+        return prepared_piece(name, art, fields)
+    except UnicodeDecodeError:
+        return {'name': name, 'error': 'not UTF-8 text'}
+    except (OSError, ValueError) as e:
+        return {'name': name, 'error': str(e)}
+
+def prepare_all(sources: List[Source], defaults: Dict[str, str], jobs: Optional[int] = None,
+                on_done: Optional[Callable[[Dict], None]] = None,
+                prepare_piece: Callable[[Source, Dict[str, str]], Dict] = prepare) -> List[Dict]:
+    """Prepare pieces in parallel, results in source order
+    
+    jobs defaults to the CPU count; small batches are prepared in-process.
+    on_done is called with each result as it comes in. prepare_piece turns
+    a source into a result like prepare() does, and must be picklable.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    work = functools.partial(prepare_piece, defaults=defaults)
+    results = []
+    if jobs == 1 or len(sources) < PARALLEL_MIN:
+        for source in sources:
+            results.append(work(source))
+            if on_done:
+                on_done(results[-1])
+        return results
+    
+    # A few chunks per worker amortise pickling and keep the workers busy
+    # until the end
+    chunksize = max(1, len(sources) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for result in pool.map(work, sources, chunksize=chunksize):
+            results.append(result)
+            if on_done:
+                on_done(result)
+    return results
+
+def commit(cache, prepared: List[Dict]) -> Dict:
+    """Save prepared pieces through the cache in one write, return a report
+    
+    Exact duplicates, of cached art or of an earlier piece in the batch, are
+    skipped before saving; near-duplicates are handled by the cache per
+    DEDUP_MODE. The report lists what was imported, skipped and failed, and
+    what the cache budgets evicted.
+    """
+    cached = set(cache.ids())
+    seen = set()
+    pieces = []
+    report = {'imported': [], 'duplicates': [], 'near_duplicates': [], 'failed': [],
+              'evicted': 0, 'not_kept': 0}
+    for item in prepared:
+        if 'error' in item:
+            report['failed'].append({'name': item['name'], 'error': item['error']})
+        elif item['content_id'] in seen or item['id'] in cached:
+            report['duplicates'].append({'name': item['name'], 'id': item['content_id']})
+        else:
+            seen.add(item['content_id'])
+            pieces.append(item)
+    if not pieces:
+        return report
+    
+    art_ids = cache.save_many([{key: value for key, value in piece.items() if key not in ('name', 'content_id')}
+                               for piece in pieces])
+    evicted = set(cache.last_evicted)
+    for piece, art_id in zip(pieces, art_ids):
+        if art_id != piece['id']:
+            report['near_duplicates'].append({'name': piece['name'], 'id': art_id})
+        else:
+            report['imported'].append({'name': piece['name'], 'id': art_id})
+    report['not_kept'] = sum(1 for item in report['imported'] if item['id'] in evicted)
+    report['evicted'] = len(evicted) - report['not_kept']
+    return report
+
+def import_sources(cache, sources: List[str], defaults: Dict[str, str], pattern: str = '*.txt',
+                   jobs: Optional[int] = None, on_done: Optional[Callable[[Dict], None]] = None,
+                   on_collected: Optional[Callable[[int], None]] = None,
+                   prepare_piece: Callable[[Source, Dict[str, str]], Dict] = prepare) -> Dict:
+    """Collect, prepare and commit pieces; the report includes timings
+    
+    on_collected gets the number of pieces found before preparing starts.
+    prepare_piece replaces prepare(), e.g. to convert images (lib.convert).
+    """
+    start = time.perf_counter()
+    pieces = collect(sources, pattern)
+    if on_collected:
+        on_collected(len(pieces))
+    collected = time.perf_counter()
+    prepared = prepare_all(pieces, defaults, jobs, on_done, prepare_piece)
+    ready = time.perf_counter()
+    report = commit(cache, prepared)
+    report.update(found=len(pieces), seconds={
+        'collect': round(collected - start, 3),
+        'prepare': round(ready - collected, 3),
+        'save': round(time.perf_counter() - ready, 3)
+    })
+    return report
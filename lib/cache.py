@@ -3,24 +3,100 @@
 import os
 import json
 import random
-import hashlib
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, List
+from itertools import islice
+from typing import Optional, Dict, Iterable, Iterator, List, Tuple
+
+from . import trace
+from .config import default_cache_dir
+
+# Metrics kept in the cache index for listings; per-line widths stay per piece
+LISTED_METRICS = ('lines', 'max_width', 'classes', 'bytes')
+
+# Art file suffix per CACHE_COMPRESS mode (see lib.compress)
+ART_SUFFIXES = {'off': '.txt', 'zlib': '.txtz'}
+
+def index_entry(metadata: Dict, simhash: Optional[str] = None) -> Dict:
+    """Build the metadata.json entry for a piece from its <id>.json metadata
+    
+    Entries carry everything `list` shows so listings never open per-piece
+    files.
+    """
+    entry = {
+        'id': metadata['id'],
+        'created': metadata['created'],
+        'theme': metadata.get('theme', ''),
+        'style': metadata.get('style', ''),
+        'prompt': metadata.get('prompt', '')
+    }
+    if metadata.get('metrics'):
+        entry['metrics'] = {name: metadata['metrics'][name] for name in LISTED_METRICS
+                            if name in metadata['metrics']}
+    if metadata.get('pinned'):
+        entry['pinned'] = True
+    if simhash is not None:
+        entry['simhash'] = simhash
+    return entry
+
+def system_store() -> Optional[Path]:
+    """Get the shared read-only store from SYSTEM_STORE, None if unset"""
+    value = os.getenv('SYSTEM_STORE')
+    return Path(os.path.expanduser(value)) if value else None
+
+def _cache_bytes() -> int:
+    """Read the CACHE_BYTES budget, 0 if unset"""
+    value = os.getenv('CACHE_BYTES', '')
+    if not value:
+        return 0
+    from .eviction import parse_size
+    return parse_size(value)
+
+def content_id(art: str) -> str:
+    """Derive a piece's ID from its art, so identical art shares one ID"""
+    # hashlib is only needed on save, keep it off the login import path
+    import hashlib
+    return hashlib.md5(art.encode()).hexdigest()[:8]
+
+def piece_keys(art_data: Dict) -> Tuple[str, int, Dict]:
+    """Return the ID, fingerprint and metrics to save a piece under
+    
+    Bulk imports compute these in worker processes and pass them along as
+    'id', 'fingerprint' and 'metrics' (see lib.bulk); anything missing is
+    computed here.
+    """
+    from .similarity import fingerprint
+    from .width import metrics
+    
+    art = art_data['art']
+    art_id = art_data.get('id') or content_id(art)
+    value = art_data.get('fingerprint')
+    if value is None:
+        value = fingerprint(art)
+    return art_id, value, art_data.get('metrics') or metrics(art)
 
 class ArtCache:
+    LIST_SORTS = ('created', 'theme')
+    
     def __init__(self, cache_dir: str = None):
         """Initialize the ArtCache with a cache directory"""
-        if cache_dir:
-            self.cache_dir = Path(cache_dir)
-        else:
-            self.cache_dir = Path(__file__).parent.parent / 'cache'
-        
-        self.cache_dir.mkdir(exist_ok=True)
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
         self.cache_size = int(os.getenv('CACHE_SIZE', '10'))
+        self.cache_bytes = _cache_bytes()
+        self.compression = os.getenv('CACHE_COMPRESS', 'off').lower()
+        if self.compression not in ART_SUFFIXES:
+            raise ValueError(f"Unknown CACHE_COMPRESS '{self.compression}' (expected {', '.join(ART_SUFFIXES)})")
         self.metadata_file = self.cache_dir / 'metadata.json'
+        self.dedup_mode = os.getenv('DEDUP_MODE', 'reject').lower()
+        self.last_rejected = []
+        self.last_evicted = []
+        self._sim_index = None
+        self._sim_stamp = None
+        self._codec = None
         self._load_metadata()
     
+    @trace.traced('cache.load_metadata')
     def _load_metadata(self):
         """Load cache metadata"""
         if self.metadata_file.exists():
@@ -33,112 +109,545 @@ class ArtCache:
             }
     
     def _save_metadata(self):
-        """Save cache metadata"""
+        """Save cache metadata (call with the writer lock held)"""
         self.metadata['last_updated'] = datetime.now().isoformat()
-        with open(self.metadata_file, 'w') as f:
-            json.dump(self.metadata, f, indent=2)
+        self._write_file(self.metadata_file, json.dumps(self.metadata, indent=2))
+        if self._sim_index is not None:
+            # The index was updated alongside the metadata, keep using it
+            self._sim_stamp = self._index_stamp()
+    
+    def _writer_lock(self):
+        """Get the cache writer lock, see lib.atomic.cache_lock"""
+        # Imported lazily, readers never need it
+        from .atomic import cache_lock
+        return cache_lock(self.cache_dir)
+    
+    def _write_file(self, path: Path, data: str):
+        """Atomically replace a file in the cache directory"""
+        from .atomic import atomic_write
+        atomic_write(path, data)
+    
+    def _write_files(self, files: Dict[Path, str]):
+        """Atomically replace several files in the cache directory"""
+        from .atomic import atomic_write_many
+        atomic_write_many(files)
+    
+    def _art_codec(self):
+        """Get the codec for compressed art (see lib.compress)"""
+        if self._codec is None:
+            from .compress import ArtCodec
+            self._codec = ArtCodec(self.cache_dir)
+        return self._codec
+    
+    def _art_files(self, art_id: str) -> List[Path]:
+        """Paths a piece's art may be stored at, the CACHE_COMPRESS one first"""
+        primary = ART_SUFFIXES[self.compression]
+        return [self.cache_dir / f"{art_id}{suffix}"
+                for suffix in (primary, *(suffix for suffix in ART_SUFFIXES.values() if suffix != primary))]
+    
+    def _evictor(self):
+        """Get the eviction policy for this cache's budgets (see lib.eviction)"""
+        from .eviction import Evictor
+        return Evictor(self.cache_dir, self.cache_size, self.cache_bytes)
+    
+    def _entry_size(self, item: Dict) -> int:
+        """Bytes of a piece's art, for CACHE_BYTES"""
+        size = (item.get('metrics') or {}).get('bytes')
+        if size is None:
+            # Saved before metrics recorded sizes
+            try:
+                size = (self.cache_dir / f"{item['id']}.txt").stat().st_size
+            except FileNotFoundError:
+                size = 0
+        return size
+    
+    def _eviction_entries(self, items: Iterable[Dict]) -> Iterator[Tuple[str, float, int, bool]]:
+        """Yield (ID, created epoch, bytes, pinned) for index entries"""
+        for item in items:
+            yield (item['id'], datetime.fromisoformat(item['created']).timestamp(),
+                   self._entry_size(item), bool(item.get('pinned')))
+    
+    def eviction_status(self) -> Dict:
+        """Return the eviction policy, budgets and their current use"""
+        return self._evictor().status(self._eviction_entries(self.metadata['items']))
+    
+    def _refresh_compiled(self, before, saved: Iterable[str] = ()):
+        """Apply a write to the pre-rendered login files, if compiled mode is enabled
+        
+        saved are the IDs the write saved; before=None rebuilds them all.
+        """
+        if (self.cache_dir / 'compiled').is_dir():
+            from .compiled import MotdCompiler
+            compiler = MotdCompiler(self)
+            if before is None:
+                compiler.build()
+            else:
+                compiler.update(before, saved)
+    
+    def _refresh_search(self, before, items: List[Dict] = (), removed: List[str] = ()):
+        """Apply a write to the search index, if one was created (see lib.search)"""
+        if (self.cache_dir / 'index.db').exists():
+            from .search import SearchIndex
+            index = SearchIndex(self)
+            index.update(before, items, removed)
+            index.close()
+    
+    def _discard_rendered(self, art_id: Optional[str] = None):
+        """Drop render cache entries of deleted art, or all of them"""
+        from .render_cache import RenderCache
+        
+        render_cache = RenderCache(self.cache_dir / 'render')
+        if art_id is None:
+            render_cache.clear()
+        else:
+            render_cache.discard(art_id)
     
     def save_art(self, art_data: Dict[str, str]) -> str:
         """Save ASCII art to cache"""
-        # Generate unique ID for the art
-        art_id = hashlib.md5(art_data['art'].encode()).hexdigest()[:8]
+        return self.save_many([art_data])[0]
+    
+    def _fingerprints(self):
+        """Yield (art ID, fingerprint) for cached pieces, oldest first
         
-        # Save art file
-        art_file = self.cache_dir / f"{art_id}.txt"
-        with open(art_file, 'w') as f:
-            f.write(art_data['art'])
+        Items saved before fingerprints existed are fingerprinted from their
+        art once; the value is stored with the metadata on the next save.
+        """
+        from .similarity import fingerprint
         
-        # Save art metadata
-        meta_file = self.cache_dir / f"{art_id}.json"
-        metadata = {
-            'id': art_id,
-            'created': datetime.now().isoformat(),
-            'prompt': art_data.get('prompt', ''),
-            'theme': art_data.get('theme', ''),
-            'style': art_data.get('style', '')
-        }
-        with open(meta_file, 'w') as f:
-            json.dump(metadata, f, indent=2)
-        
-        # Update cache metadata
-        self.metadata['items'].append({
-            'id': art_id,
-            'created': metadata['created']
-        })
-        
-        # Maintain cache size limit
-        while len(self.metadata['items']) > self.cache_size:
-            oldest = self.metadata['items'].pop(0)
-            self._remove_art(oldest['id'])
-        
-        self._save_metadata()
-        return art_id
+        for item in self.metadata['items']:
+            if 'simhash' not in item:
+                art = self.get_art_by_id(item['id'])
+                if art is None:
+                    continue
+                item['simhash'] = f"{fingerprint(art):016x}"
+            yield item['id'], int(item['simhash'], 16)
     
-    def get_random_art(self) -> Optional[str]:
-        """Get a random ASCII art from cache"""
-        if not self.metadata['items']:
+    def _index_stamp(self):
+        """Identify the cache state the similarity index was built from"""
+        return self.metadata.get('last_updated')
+    
+    def _similarity_index(self):
+        """Get the near-duplicate index, rebuilt only if the cache changed"""
+        from .similarity import SimilarityIndex
+        
+        if self._sim_index is None or self._sim_stamp != self._index_stamp():
+            index = SimilarityIndex()
+            for art_id, value in self._fingerprints():
+                index.add(art_id, value)
+            self._sim_index = index
+            self._sim_stamp = self._index_stamp()
+        return self._sim_index
+    
+    def find_duplicates(self) -> List[Tuple[str, str, int]]:
+        """Find near-duplicates among cached pieces
+        
+        Returns (art ID, ID of the older piece it duplicates, Hamming distance)
+        for every piece that is a near-duplicate of an older one.
+        """
+        from .similarity import SimilarityIndex
+        
+        index = SimilarityIndex()
+        duplicates = []
+        for art_id, value in self._fingerprints():
+            match = index.find(value)
+            if match:
+                duplicates.append((art_id, match[0], match[1]))
+            else:
+                index.add(art_id, value)
+        return duplicates
+    
+    def _find_duplicate(self, index, value: int) -> Optional[str]:
+        """Get the ID of a cached near-duplicate of a fingerprint, per DEDUP_MODE"""
+        if self.dedup_mode not in ('reject', 'replace', 'off'):
+            raise ValueError(f"Unknown DEDUP_MODE '{self.dedup_mode}' (expected reject, replace or off)")
+        if self.dedup_mode == 'off':
             return None
+        match = index.find(value)
+        return match[0] if match else None
+    
+    @trace.traced('cache.save')
+    def save_many(self, art_items: List[Dict[str, str]]) -> List[str]:
+        """Save several pieces of ASCII art with a single metadata write
         
-        item = random.choice(self.metadata['items'])
-        art_file = self.cache_dir / f"{item['id']}.txt"
+        With DEDUP_MODE=reject a near-duplicate of a cached piece is not saved
+        and the cached piece's ID is returned in its place (and recorded in
+        last_rejected); with DEDUP_MODE=replace it takes the cached piece's slot.
+        """
+        with self._writer_lock():
+            # Another process may have changed the cache since we loaded it
+            self._load_metadata()
+            before = self._index_stamp()
+            index = self._similarity_index()
+            self.last_rejected = []
+            
+            # Keyed by ID in index order, so replacing an entry is O(1)
+            items = {item['id']: item for item in self.metadata['items']}
+            art_ids = []
+            saved = []
+            evicted = []
+            replaced = []
+            files = {}
+            for art_data in art_items:
+                art_id, value, art_metrics = piece_keys(art_data)
+                duplicate = self._find_duplicate(index, value)
+                if duplicate and self.dedup_mode == 'reject':
+                    self.last_rejected.append(duplicate)
+                    art_ids.append(duplicate)
+                    continue
+                
+                # A replaced near-duplicate, or an identical earlier save,
+                # gives up its slot instead of leaving a second entry
+                if items.pop(art_id, None) is not None:
+                    replaced.append(art_id)
+                if duplicate and duplicate != art_id:
+                    items.pop(duplicate, None)
+                    index.remove(duplicate)
+                    evicted.append(duplicate)
+                
+                metadata = {
+                    'id': art_id,
+                    'created': datetime.now().isoformat(),
+                    'prompt': art_data.get('prompt', ''),
+                    'theme': art_data.get('theme', ''),
+                    'style': art_data.get('style', ''),
+                    'metrics': art_metrics
+                }
+                if art_data.get('pinned'):
+                    metadata['pinned'] = True
+                files[art_id] = (art_data['art'], json.dumps(metadata, indent=2))
+                
+                # Update cache metadata
+                items[art_id] = index_entry(metadata, f"{value:016x}")
+                saved.append(index_entry(metadata))
+                index.add(art_id, value)
+                art_ids.append(art_id)
+            
+            # Evict per EVICTION until the cache fits CACHE_SIZE and CACHE_BYTES
+            unpinned = [item for item in items.values() if not item.get('pinned')]
+            totals = (len(unpinned), sum(map(self._entry_size, unpinned)) if self.cache_bytes else 0)
+            
+            def lookup(art_id):
+                return next(self._eviction_entries([items[art_id]])) if art_id in items else None
+            
+            evictor = self._evictor()
+            for art_id in evictor.select(self._eviction_entries(items.values()), protected=files.keys(),
+                                         totals=totals, lookup=lookup, stamp=before):
+                del items[art_id]
+                index.remove(art_id)
+                evicted.append(art_id)
+            self.metadata['items'] = list(items.values())
+            
+            # Write the art and metadata files of pieces that survived
+            # eviction, all durable before the index that lists them
+            version = self._art_codec().current() if self.compression != 'off' else None
+            writes = {}
+            for art_id, (art, metadata) in files.items():
+                if art_id in items:
+                    art_file = self._art_files(art_id)[0]
+                    writes[art_file] = self._art_codec().encode(art, version) if version is not None else art
+                    writes[self.cache_dir / f"{art_id}.json"] = metadata
+            self._write_files(writes)
+            for art_id in replaced:
+                # Stored before CACHE_COMPRESS changed
+                for stale in self._art_files(art_id)[1:]:
+                    stale.unlink(missing_ok=True)
+            
+            # Publish the index before removing files so readers never pick
+            # an entry whose files are already gone
+            self._save_metadata()
+            evictor.saved(self._index_stamp())
+            evicted = [art_id for art_id in evicted if art_id not in items]
+            for art_id in evicted:
+                self._remove_art(art_id)
+            self.last_evicted = evicted
+            self._refresh_compiled(before, [item['id'] for item in saved])
+            self._refresh_search(before, saved, evicted)
+        return art_ids
+    
+    def set_pinned(self, art_id: str, pinned: bool = True) -> bool:
+        """Pin a piece so eviction never removes it, or unpin it; False if not cached"""
+        with self._writer_lock():
+            self._load_metadata()
+            before = self._index_stamp()
+            item = next((item for item in self.metadata['items'] if item['id'] == art_id), None)
+            if item is None:
+                return False
+            metadata = self._read_item(art_id) or dict(item)
+            for entry in (item, metadata):
+                if pinned:
+                    entry['pinned'] = True
+                else:
+                    entry.pop('pinned', None)
+            self._write_file(self.cache_dir / f"{art_id}.json", json.dumps(metadata, indent=2))
+            self._save_metadata()
+            self._refresh_compiled(before)
+            self._refresh_search(before)
+        return True
+    
+    @trace.traced('cache.recompress')
+    def recompress(self, dict_size: int = 0) -> Dict:
+        """Rewrite every piece per CACHE_COMPRESS, with a newly trained dictionary for zlib
         
-        if art_file.exists():
-            with open(art_file, 'r') as f:
-                return f.read()
+        Returns the pieces rewritten, their bytes as text, as stored before
+        and as stored now; for zlib also the dictionary and decode times.
+        """
+        import time
+        from .compress import ArtCodec, DICT_SIZE, TRAIN_BYTES, train
+        
+        with self._writer_lock():
+            self._load_metadata()
+            arts = {}
+            stored_before = 0
+            for item in self.metadata['items']:
+                art = self.get_art_by_id(item['id'])
+                if art is None:
+                    continue
+                arts[item['id']] = art
+                for art_file in self._art_files(item['id']):
+                    if art_file.exists():
+                        stored_before += art_file.stat().st_size
+            report = {'compression': self.compression, 'pieces': len(arts),
+                      'text_bytes': sum(len(art.encode('utf-8')) for art in arts.values()),
+                      'stored_before': stored_before}
+            
+            codec = self._art_codec()
+            version = None
+            if self.compression != 'off' and arts:
+                samples = [art.encode('utf-8') for art in arts.values()]
+                # An even sample across the cache, oldest to newest
+                step = max(1, round(report['text_bytes'] / TRAIN_BYTES))
+                start = time.perf_counter()
+                dictionary = train(samples[::step], min(dict_size or DICT_SIZE, DICT_SIZE))
+                version = codec.install(dictionary)
+                report.update(dictionary=version, dictionary_bytes=len(dictionary),
+                              train_seconds=round(time.perf_counter() - start, 3))
+            
+            writes = {self._art_files(art_id)[0]: codec.encode(art, version) if version is not None else art
+                      for art_id, art in arts.items()}
+            self._write_files(writes)
+            for art_id in arts:
+                for stale in self._art_files(art_id)[1:]:
+                    stale.unlink(missing_ok=True)
+            report['stored_bytes'] = sum(len(data) if isinstance(data, bytes) else len(data.encode('utf-8'))
+                                         for data in writes.values())
+            
+            if version is not None:
+                # Readers that opened a piece before the rewrite may still
+                # need the previous dictionary
+                codec.prune(keep=2)
+                
+                # Login decodes one piece per process: the dictionary read
+                # is paid once, then the decode itself
+                start = time.perf_counter()
+                fresh = ArtCodec(self.cache_dir)
+                fresh.dictionary(version)
+                report['dictionary_load_us'] = round((time.perf_counter() - start) * 1e6, 1)
+                timings = []
+                for data in writes.values():
+                    start = time.perf_counter()
+                    fresh.decode(data)
+                    timings.append(time.perf_counter() - start)
+                timings.sort()
+                report['decode_us'] = {
+                    'p50': round(timings[len(timings) // 2] * 1e6, 1),
+                    'p99': round(timings[min(len(timings) - 1, len(timings) * 99 // 100)] * 1e6, 1),
+                    'max': round(timings[-1] * 1e6, 1)
+                }
+        return report
+    
+    def compression_status(self) -> Dict:
+        """Return the CACHE_COMPRESS mode and the current dictionary version"""
+        return {'mode': self.compression, 'dictionary': self._art_codec().current()}
+    
+    def get_random_art(self) -> Optional[str]:
+        """Get a random ASCII art from cache"""
+        entry = self.get_random_entry()
+        return entry[1] if entry else None
+    
+    def get_random_entry(self) -> Optional[Tuple[str, str]]:
+        """Get the ID and art of a random cached piece"""
+        for _ in range(3):
+            if not self.metadata['items']:
+                return None
+            
+            item = random.choice(self.metadata['items'])
+            art = self.get_art_by_id(item['id'])
+            if art is not None:
+                return item['id'], art
+            
+            # Deleted by a concurrent writer after we loaded the index
+            self._load_metadata()
         return None
     
+    @trace.traced('cache.read_art')
     def get_art_by_id(self, art_id: str) -> Optional[str]:
         """Get specific ASCII art by ID"""
-        art_file = self.cache_dir / f"{art_id}.txt"
-        if art_file.exists():
-            with open(art_file, 'r') as f:
-                return f.read()
+        # Either suffix is read whatever CACHE_COMPRESS says, so changing
+        # it doesn't hide pieces stored before `recompress` converts them
+        for art_file in self._art_files(art_id):
+            try:
+                if art_file.suffix == '.txt':
+                    with open(art_file, 'r') as f:
+                        return f.read()
+                with open(art_file, 'rb') as f:
+                    return self._art_codec().decode(f.read())
+            except FileNotFoundError:
+                continue
         return None
     
+    def get_metrics(self, art_id: str) -> Optional[Dict]:
+        """Get the display metrics stored with a piece (see lib.width.metrics)
+        
+        Pieces saved before metrics existed are measured on the fly.
+        """
+        item = self._read_item(art_id)
+        if item is None:
+            return None
+        if item.get('metrics') is not None:
+            return item['metrics']
+        
+        from .width import metrics
+        art = self.get_art_by_id(art_id)
+        return metrics(art) if art is not None else None
+    
+    def ids(self) -> List[str]:
+        """Get IDs of all cached art, oldest first"""
+        return [item['id'] for item in self.metadata['items']]
+    
+    def _contains(self, art_id: str) -> bool:
+        """Check if a piece is stored, without loading the index"""
+        return any(art_file.exists() for art_file in self._art_files(art_id))
+    
+    def _reload(self):
+        """Re-read the index after a concurrent writer changed it"""
+        self._load_metadata()
+    
+    # Positions walked by the rotation scheduler (see lib.rotation), in
+    # creation order; each lookup is O(1)
+    
+    def _rotation_size(self) -> int:
+        """Number of rotation positions"""
+        return len(self.metadata['items'])
+    
+    def _rotation_entry(self, position: int) -> Tuple[str, float, bool]:
+        """Return (ID, created epoch, live) for a rotation position"""
+        item = self.metadata['items'][position]
+        return item['id'], datetime.fromisoformat(item['created']).timestamp(), True
+    
+    def _rotation_theme(self, position: int) -> str:
+        """Return the theme of the piece at a rotation position"""
+        item = self.metadata['items'][position]
+        if 'theme' not in item:
+            # Indexed before entries carried listing fields
+            item = self._read_item(item['id']) or item
+        return item.get('theme', '')
+    
     def list_cached_art(self) -> List[Dict]:
         """List all cached art with metadata"""
-        result = []
-        for item in self.metadata['items']:
-            meta_file = self.cache_dir / f"{item['id']}.json"
-            if meta_file.exists():
-                with open(meta_file, 'r') as f:
-                    result.append(json.load(f))
-        return result
+        return list(self.iter_cached_art())
+    
+    def iter_cached_art(self, offset: int = 0, limit: Optional[int] = None, sort: str = 'created',
+                        descending: bool = False) -> Iterator[Dict]:
+        """Yield metadata of cached art from the cache index
+        
+        Sorting by creation date streams in index order. Sorting by theme
+        holds only the sort keys, and only offset + limit of them when a
+        limit is given.
+        """
+        import heapq
+        
+        if sort not in self.LIST_SORTS:
+            raise ValueError(f"Unknown sort '{sort}' (expected {', '.join(self.LIST_SORTS)})")
+        stop = None if limit is None else offset + limit
+        if sort == 'created':
+            entries = islice(self._index_entries(reverse=descending), offset, stop)
+        else:
+            key = lambda entry: (entry[1], entry[0])
+            if stop is None:
+                entries = sorted(self._index_entries(), key=key, reverse=descending)[offset:]
+            else:
+                pick = heapq.nlargest if descending else heapq.nsmallest
+                entries = pick(stop, self._index_entries(), key=key)[offset:]
+        
+        for _, _, handle in entries:
+            item = self._entry_item(handle)
+            if item is not None:
+                yield item
+    
+    def _index_entries(self, reverse: bool = False) -> Iterator[Tuple[str, str, Dict]]:
+        """Yield (created, theme, handle) per piece in index order"""
+        items = self.metadata['items']
+        for item in (reversed(items) if reverse else items):
+            if 'theme' not in item:
+                # Indexed before entries carried listing fields
+                item = self._read_item(item['id']) or item
+            yield item['created'], item.get('theme', ''), item
+    
+    def _entry_item(self, item: Dict) -> Optional[Dict]:
+        """Get the listing for an index entry"""
+        if 'theme' not in item:
+            item = self._read_item(item['id'])
+        return index_entry(item) if item is not None else None
+    
+    def _read_item(self, art_id: str) -> Optional[Dict]:
+        """Read a piece's <id>.json metadata"""
+        try:
+            with open(self.cache_dir / f"{art_id}.json", 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
     
     def _remove_art(self, art_id: str):
         """Remove art from cache"""
-        art_file = self.cache_dir / f"{art_id}.txt"
         meta_file = self.cache_dir / f"{art_id}.json"
         
-        if art_file.exists():
-            art_file.unlink()
-        if meta_file.exists():
-            meta_file.unlink()
+        for art_file in self._art_files(art_id):
+            art_file.unlink(missing_ok=True)
+        meta_file.unlink(missing_ok=True)
     
+    @trace.traced('cache.delete')
     def delete_art_by_id(self, art_id: str) -> bool:
         """Delete specific art by ID from cache"""
-        # Find the item in metadata
-        for i, item in enumerate(self.metadata['items']):
-            if item['id'] == art_id:
-                # Remove from metadata
-                self.metadata['items'].pop(i)
-                # Remove files
-                self._remove_art(art_id)
-                # Save updated metadata
-                self._save_metadata()
-                return True
+        with self._writer_lock():
+            self._load_metadata()
+            before = self._index_stamp()
+            
+            # Find the item in metadata
+            for i, item in enumerate(self.metadata['items']):
+                if item['id'] == art_id:
+                    # Remove from metadata and save it before removing files
+                    self.metadata['items'].pop(i)
+                    if self._sim_index is not None and self._sim_stamp == self._index_stamp():
+                        self._sim_index.remove(art_id)
+                    else:
+                        self._sim_index = None
+                    self._save_metadata()
+                    self._remove_art(art_id)
+                    self._discard_rendered(art_id)
+                    self._refresh_compiled(before)
+                    self._refresh_search(before, removed=[art_id])
+                    return True
         return False
     
+    @trace.traced('cache.clear')
     def clear_cache(self):
         """Clear all cached art"""
-        for item in self.metadata['items']:
-            self._remove_art(item['id'])
-        
-        self.metadata = {
-            'items': [],
-            'last_updated': None
-        }
-        self._save_metadata()
+        with self._writer_lock():
+            self._load_metadata()
+            before = self._index_stamp()
+            removed = self.metadata['items']
+            
+            self.metadata = {
+                'items': [],
+                'last_updated': None
+            }
+            self._sim_index = None
+            self._save_metadata()
+            for item in removed:
+                self._remove_art(item['id'])
+            self._discard_rendered()
+            self._refresh_compiled(before)
+            self._refresh_search(before, removed=[item['id'] for item in removed])
     
     def is_empty(self) -> bool:
         """Check if cache is empty"""
@@ -146,4 +655,53 @@ class ArtCache:
     
     def size(self) -> int:
         """Get number of items in cache"""
-        return len(self.metadata['items'])
\ No newline at end of file
+        return len(self.metadata['items'])
+
+def bundled_entry() -> Optional[Tuple[str, str]]:
+    """Get the ID and art of a random piece from the bundled saved/ corpus
+    
+    saved/ is a cache directory of its own, opened read-only like a system
+    store, so its pieces render and land in the render cache like any other.
+    Used as a fallback while the cache is empty and no fetch fits the budget.
+    """
+    store = open_store(Path(__file__).parent.parent / 'saved')
+    return store.get_random_entry() if store is not None else None
+
+def open_cache(cache_dir: str = None) -> ArtCache:
+    """Open the cache with the storage backend selected by CACHE_BACKEND
+    
+    'files' keeps one .txt/.json pair per piece, 'pack' uses PackedArtCache.
+    When CACHE_BACKEND is unset, a directory that already holds a pack index
+    is opened as a pack.
+    
+    The default cache (CACHE_DIR) is layered over SYSTEM_STORE when that
+    holds a cache index, see lib.layers.
+    """
+    directory = Path(cache_dir) if cache_dir else default_cache_dir()
+    backend = os.getenv('CACHE_BACKEND', '').lower()
+    if not backend:
+        backend = 'pack' if (directory / 'art.idx').exists() else 'files'
+    if backend not in ('files', 'pack'):
+        raise ValueError(f"Unknown CACHE_BACKEND '{backend}' (expected 'files' or 'pack')")
+    
+    store = system_store() if cache_dir is None else None
+    base = None
+    if store is not None and store.resolve() != directory.resolve():
+        base = open_store(store)
+    
+    if backend == 'pack':
+        from .pack import PackedArtCache, LayeredPackedArtCache
+        return LayeredPackedArtCache(directory, base) if base else PackedArtCache(directory)
+    if base is not None:
+        from .layers import LayeredArtCache
+        return LayeredArtCache(directory, base)
+    return ArtCache(directory)
+
+def open_store(store: Path) -> Optional[ArtCache]:
+    """Open a system store read-only by its layout, None if it holds no index"""
+    if (store / 'art.idx').exists():
+        from .pack import PackedArtCache
+        return PackedArtCache(store)
+    if (store / 'metadata.json').exists():
+        return ArtCache(store)
+    return None
\ No newline at end of file
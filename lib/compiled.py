@@ -0,0 +1,151 @@
+"""Pre-rendered MOTD files that the shell wrapper can print without Python"""
+
+import os
+import json
+import shutil
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from .display import ArtDisplay
+
+class MotdCompiler:
+    """Render every cached piece to a ready-to-print file plus a small index
+    
+    Layout under the compiled directory:
+        
+        index            "<count> <generation>" on a single line
+        <generation>/    0.ans ... <count-1>.ans, one rendered piece each,
+                         and slots.json: the ID in each file, the cache index
+                         stamp and the display settings they were rendered at
+    
+    Each build goes to a fresh generation directory and only then is the index
+    replaced, so a shell reading the index never sees a half-written set.
+    Cache writes update the current generation in place (see update()), so
+    a save renders only the pieces it saved.
+    """
+    
+    def __init__(self, cache, compiled_dir: Optional[Path] = None):
+        """Initialize the compiler for an ArtCache"""
+        self.cache = cache
+        self.compiled_dir = Path(compiled_dir) if compiled_dir else cache.cache_dir / 'compiled'
+        self.index_file = self.compiled_dir / 'index'
+    
+    def is_enabled(self) -> bool:
+        """Compiled mode is on once the compiled directory exists"""
+        return self.compiled_dir.is_dir()
+    
+    def build(self) -> int:
+        """Render all cached art and publish a new generation, return its size"""
+        self.compiled_dir.mkdir(exist_ok=True)
+        display = ArtDisplay()
+        theme = os.getenv('THEME', 'cyberpunk')
+        
+        generation = f"g{time.time_ns()}"
+        gen_dir = self.compiled_dir / generation
+        gen_dir.mkdir()
+        
+        slots = []
+        for art_id in self.cache.ids():
+            art = self.cache.get_art_by_id(art_id)
+            if art is None:
+                continue
+            with open(gen_dir / f"{len(slots)}.ans", 'w') as f:
+                f.write(display.render(art, theme=theme) + '\n')
+            slots.append(art_id)
+        
+        self._publish(gen_dir, slots, self._settings(display, theme))
+        self._remove_old_generations(keep=generation)
+        return len(slots)
+    
+    def update(self, before, saved: Iterable[str] = ()):
+        """Apply a cache write made under the writer lock to the current generation
+        
+        before is the cache's index stamp from before the write and saved the
+        IDs it saved, whose files are rendered again. Pieces new to the cache
+        are rendered into new slots; a deleted piece's slot takes the last
+        slot's file. If the compiled set was behind the cache or rendered
+        with other settings, a full build follows.
+        """
+        display = ArtDisplay()
+        theme = os.getenv('THEME', 'cyberpunk')
+        gen_dir, state = self._current()
+        if (state is None or state['stamp'] != json.dumps(before)
+                or state['settings'] != self._settings(display, theme)):
+            self.build()
+            return
+        
+        slots = state['ids']
+        cached = set(self.cache.ids())
+        index = {art_id: slot for slot, art_id in enumerate(slots)}
+        # Fill deleted pieces' slots from the end, highest first, so no
+        # slot a shell may still pick is left without a file
+        for slot in sorted((index[art_id] for art_id in index if art_id not in cached), reverse=True):
+            last = len(slots) - 1
+            if slot != last:
+                self._write_slot(gen_dir, slot, (gen_dir / f"{last}.ans").read_text())
+                slots[slot] = slots[last]
+            slots.pop()
+        index = {art_id: slot for slot, art_id in enumerate(slots)}
+        
+        for art_id in dict.fromkeys([*saved, *(art_id for art_id in cached if art_id not in index)]):
+            art = self.cache.get_art_by_id(art_id) if art_id in cached else None
+            if art is None:
+                continue
+            slot = index.setdefault(art_id, len(slots))
+            if slot == len(slots):
+                slots.append(art_id)
+            self._write_slot(gen_dir, slot, display.render(art, theme=theme) + '\n')
+        
+        count = state['count']
+        self._publish(gen_dir, slots, state['settings'])
+        for slot in range(len(slots), count):
+            (gen_dir / f"{slot}.ans").unlink(missing_ok=True)
+    
+    def remove(self):
+        """Disable compiled mode by deleting all compiled output"""
+        if self.compiled_dir.exists():
+            shutil.rmtree(self.compiled_dir)
+    
+    @staticmethod
+    def _settings(display: ArtDisplay, theme: str) -> List:
+        """Display settings rendered output depends on"""
+        return [theme, display.use_color, display.random_color, display._color_mode()]
+    
+    def _current(self):
+        """Return the current generation directory and its slots.json, or (None, None)"""
+        try:
+            count, generation = self.index_file.read_text().split()
+            gen_dir = self.compiled_dir / generation
+            state = json.loads((gen_dir / 'slots.json').read_text())
+        except (OSError, ValueError):
+            return None, None
+        state['count'] = int(count)
+        return gen_dir, state
+    
+    @staticmethod
+    def _write_slot(gen_dir: Path, slot: int, text: str):
+        """Replace one rendered file; a shell printing the old one keeps it"""
+        tmp_file = gen_dir / f".{slot}.ans.{os.getpid()}"
+        with open(tmp_file, 'w') as f:
+            f.write(text)
+        os.replace(tmp_file, gen_dir / f"{slot}.ans")
+    
+    def _publish(self, gen_dir: Path, slots: List[str], settings: List):
+        """Record the slots of a generation, then point the index at it"""
+        state = {'stamp': json.dumps(self.cache._index_stamp()), 'settings': settings, 'ids': slots}
+        tmp_slots = gen_dir / f".slots.json.{os.getpid()}"
+        with open(tmp_slots, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_slots, gen_dir / 'slots.json')
+        
+        tmp_index = self.compiled_dir / f".index.{os.getpid()}"
+        with open(tmp_index, 'w') as f:
+            f.write(f"{len(slots)} {gen_dir.name}\n")
+        os.replace(tmp_index, self.index_file)
+    
+    def _remove_old_generations(self, keep: str):
+        """Delete generation directories no longer referenced by the index"""
+        for path in self.compiled_dir.iterdir():
+            if path.is_dir() and path.name != keep:
+                shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,134 @@
+"""Dictionary compression of stored art (CACHE_COMPRESS=zlib)
+
+Art in one cache shares a lot: borders, shading runs and the motifs of a
+style. Each piece is deflated on its own, primed with a dictionary trained
+on the whole cache, so any piece still decodes independently with one
+small read.
+"""
+
+import os
+import struct
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Compressed pieces are <id>.txtz: this header, then a raw deflate stream
+# primed with the numbered dictionary (0: no dictionary)
+HEADER = struct.Struct('<4sI')
+MAGIC = b'MAZ1'
+
+DICT_DIR = 'zdict'
+
+# Deflate only looks back 32 KiB, a larger dictionary is never used
+DICT_SIZE = 32 * 1024
+
+# Training reads at most this much art, sampled evenly across the cache
+TRAIN_BYTES = 1024 * 1024
+
+def train(samples: List[bytes], size: int = DICT_SIZE, k: int = 8, segment: int = 256) -> bytes:
+    """Build a dictionary from sample pieces
+    
+    A simplified COVER: k-byte substrings are scored by how many samples
+    contain them, the corpus is split into size / segment epochs and each
+    epoch contributes the segment whose not-yet-covered substrings score
+    highest. The best segments go last, where deflate finds them at the
+    shortest distances.
+    """
+    frequency = Counter()
+    for sample in samples:
+        frequency.update({sample[i:i + k] for i in range(len(sample) - k + 1)})
+    
+    corpus = b'\0'.join(samples)
+    epochs = max(1, size // segment)
+    epoch_length = max(segment, len(corpus) // epochs)
+    chosen = []
+    for start in range(0, len(corpus), epoch_length):
+        epoch = corpus[start:start + epoch_length]
+        # Substrings found in a single sample don't help other pieces
+        scores = [max(frequency[epoch[i:i + k]] - 1, 0) for i in range(len(epoch) - k + 1)]
+        window = min(segment - k + 1, len(scores))
+        if window <= 0:
+            continue
+        best = score = sum(scores[:window])
+        best_at = 0
+        for i in range(window, len(scores)):
+            score += scores[i] - scores[i - window]
+            if score > best:
+                best, best_at = score, i - window + 1
+        if not best:
+            continue
+        piece = epoch[best_at:best_at + segment]
+        chosen.append((best, piece))
+        for i in range(len(piece) - k + 1):
+            frequency[piece[i:i + k]] = 0
+    
+    chosen.sort(key=lambda pair: pair[0])
+    return b''.join(piece for _, piece in chosen)[-size:]
+
+class ArtCodec:
+    """Encodes and decodes compressed pieces of one cache
+    
+    Dictionaries live in <cache>/zdict/<version>.zdict and never change once
+    written, so they are read at most once per process.
+    """
+    
+    def __init__(self, cache_dir: Path):
+        """Initialize the ArtCodec for a cache directory"""
+        self.dict_dir = Path(cache_dir) / DICT_DIR
+        self._dictionaries: Dict[int, bytes] = {0: b''}
+    
+    def versions(self) -> List[int]:
+        """Installed dictionary versions, oldest first"""
+        try:
+            names = os.listdir(self.dict_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-6]) for name in names if name.endswith('.zdict') and name[:-6].isdigit())
+    
+    def current(self) -> int:
+        """Version new pieces are compressed with, 0 before any training"""
+        versions = self.versions()
+        return versions[-1] if versions else 0
+    
+    def dictionary(self, version: int) -> bytes:
+        """Read a dictionary by version"""
+        if version not in self._dictionaries:
+            with open(self.dict_dir / f"{version}.zdict", 'rb') as f:
+                self._dictionaries[version] = f.read()
+        return self._dictionaries[version]
+    
+    def encode(self, art: str, version: Optional[int] = None) -> bytes:
+        """Compress a piece, with the current dictionary unless given one"""
+        version = self.current() if version is None else version
+        dictionary = self.dictionary(version)
+        options = {'zdict': dictionary} if dictionary else {}
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15, 9, **options)
+        return HEADER.pack(MAGIC, version) + compressor.compress(art.encode('utf-8')) + compressor.flush()
+    
+    def decode(self, data: bytes) -> str:
+        """Decompress a piece stored by encode()"""
+        magic, version = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not a compressed art file")
+        dictionary = self.dictionary(version)
+        options = {'zdict': dictionary} if dictionary else {}
+        decompressor = zlib.decompressobj(-15, **options)
+        return (decompressor.decompress(data[HEADER.size:]) + decompressor.flush()).decode('utf-8')
+    
+    def install(self, dictionary: bytes) -> int:
+        """Store a new dictionary and return its version (call with the writer lock held)"""
+        from .atomic import atomic_write
+        
+        version = self.current() + 1
+        self.dict_dir.mkdir(exist_ok=True)
+        atomic_write(self.dict_dir / f"{version}.zdict", dictionary)
+        self._dictionaries[version] = dictionary
+        return version
+    
+    def prune(self, keep: int):
+        """Remove all dictionaries but the newest keep ones"""
+        versions = self.versions()
+        for version in versions[:max(0, len(versions) - keep)]:
+            (self.dict_dir / f"{version}.zdict").unlink(missing_ok=True)
+            self._dictionaries.pop(version, None)
@@ -0,0 +1,42 @@
+"""Minimal .env loader for the login fast path"""
+
+import os
+from pathlib import Path
+
+def default_cache_dir() -> Path:
+    """Get the user's cache directory, CACHE_DIR or cache/ in the install directory"""
+    value = os.getenv('CACHE_DIR')
+    if value:
+        return Path(os.path.expanduser(value))
+    return Path(__file__).parent.parent / 'cache'
+
+def load_env(env_file: Path):
+    """Load KEY=VALUE pairs from a .env file without overriding the environment
+
+    This covers the subset of the python-dotenv format used by config.example,
+    so login does not have to import python-dotenv on every shell start.
+    """
+    try:
+        with open(env_file, 'r') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return
+    
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        if line.startswith('export '):
+            line = line[len('export '):]
+        
+        key, value = line.split('=', 1)
+        key = key.strip()
+        value = value.strip()
+        if value[:1] in ('"', "'") and value[-1:] == value[:1] and len(value) > 1:
+            value = value[1:-1]
+        elif ' #' in value:
+            # Unquoted values may carry a trailing comment
+            value = value.split(' #', 1)[0].rstrip()
+        
+        if key and key not in os.environ:
+            os.environ[key] = value
@@ -0,0 +1,365 @@
+"""Local art source: images converted to ASCII, block or Braille art with NumPy"""
+
+import io
+import os
+import random
+import struct
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from .bulk import Source, prepared_piece, read_source
+from .gradient import CELL_ASPECT
+
+MODES = ('ascii', 'blocks', 'braille')
+
+# Dots sampled per character cell, (columns, rows)
+CELL_DOTS = {'ascii': (1, 1), 'blocks': (2, 2), 'braille': (2, 4)}
+
+# Style recorded with converted pieces
+MODE_STYLES = {'ascii': 'ASCII art', 'blocks': 'Block characters', 'braille': 'Braille patterns'}
+
+# Luminance ramp, darkest first
+RAMP = np.array(list(' .:-=+*#%@'))
+
+# Quadrant blocks indexed by lit dots: 1 top left, 2 top right, 4 bottom
+# left, 8 bottom right
+QUADRANTS = np.array(list(' ▘▝▀▖▌▞▛▗▚▐▜▄▙▟█'))
+
+# Bit of each dot in a Braille cell (U+2800 + bits), by row and column
+BRAILLE_BITS = np.array([[0x01, 0x08], [0x02, 0x10], [0x04, 0x20], [0x40, 0x80]])
+
+# Ordered dithering thresholds, tiled over the dot grid
+BAYER = (np.array([[0, 8, 2, 10], [12, 4, 14, 6], [3, 11, 1, 9], [15, 7, 13, 5]]) + 0.5) / 16
+
+# Files the converter picks up from directories and archives
+IMAGE_PATTERN = '*.png,*.ppm,*.pgm,*.pnm,*.jpg,*.jpeg,*.gif,*.bmp,*.webp'
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# PNG colour type -> samples per pixel
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# Formats only Pillow reads, by signature
+PILLOW_FORMATS = ((b'\xff\xd8', 'JPEG'), (b'GIF8', 'GIF'), (b'BM', 'BMP'), (b'RIFF', 'WebP'))
+
+def read_image(data: bytes) -> np.ndarray:
+    """Decode an image into an array of height x width (x channels) samples
+    
+    Pillow reads any format it knows when installed. Without it, PNG and
+    Netpbm (PGM/PPM) images are decoded here, so converting works on hosts
+    with nothing but NumPy.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+    if Image is not None:
+        with Image.open(io.BytesIO(data)) as image:
+            return np.asarray(image.convert('RGBA' if 'A' in image.getbands() else 'RGB'))
+    
+    if data.startswith(PNG_SIGNATURE):
+        return _read_png(data)
+    if data[:1] == b'P' and data[1:2] in (b'2', b'3', b'5', b'6'):
+        return _read_netpbm(data)
+    for signature, name in PILLOW_FORMATS:
+        if data.startswith(signature):
+            raise ValueError(f"Reading {name} images needs Pillow (pip install pillow)")
+    raise ValueError("not a supported image")
+
+def _read_netpbm(data: bytes) -> np.ndarray:
+    """Decode a PGM or PPM image, ASCII or binary"""
+    fields = []
+    pos = 0
+    while len(fields) < 4:
+        while pos < len(data) and data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b'#':
+            pos = data.index(b'\n', pos)
+            continue
+        end = pos
+        while end < len(data) and not data[end:end + 1].isspace():
+            end += 1
+        fields.append(data[pos:end])
+        pos = end
+    magic, width, height, maxval = fields[0], int(fields[1]), int(fields[2]), int(fields[3])
+    channels = 3 if magic in (b'P3', b'P6') else 1
+    count = width * height * channels
+    if magic in (b'P2', b'P3'):
+        samples = np.array(data[pos:].split()[:count], dtype=np.uint32)
+    else:
+        # Exactly one whitespace byte separates the header from the samples
+        samples = np.frombuffer(data, dtype='>u2' if maxval > 255 else np.uint8, count=count, offset=pos + 1)
+    if samples.size != count:
+        raise ValueError("truncated image")
+    samples = samples.reshape(height, width, channels)
+    scale = 255 / maxval
+    return (samples * scale).astype(np.uint8) if maxval != 255 else samples.astype(np.uint8)
+
+def _read_png(data: bytes) -> np.ndarray:
+    """Decode a non-interlaced PNG of any colour type and bit depth"""
+    pos = len(PNG_SIGNATURE)
+    idat = []
+    palette = None
+    header = None
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack_from('>I4s', data, pos)
+        body = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if kind == b'IHDR':
+            header = struct.unpack('>IIBBBBB', body)
+        elif kind == b'PLTE':
+            palette = np.frombuffer(body, dtype=np.uint8).reshape(-1, 3)
+        elif kind == b'IDAT':
+            idat.append(body)
+        elif kind == b'IEND':
+            break
+    if header is None:
+        raise ValueError("PNG without a header")
+    width, height, depth, color_type, _, _, interlace = header
+    if interlace:
+        raise ValueError("Reading interlaced PNG images needs Pillow (pip install pillow)")
+    if color_type not in PNG_CHANNELS:
+        raise ValueError(f"unknown PNG colour type {color_type}")
+    
+    channels = PNG_CHANNELS[color_type]
+    bits = depth * channels
+    stride = (width * bits + 7) // 8
+    rows = _unfilter(zlib.decompress(b''.join(idat)), height, stride, max(1, bits // 8))
+    if depth == 16:
+        samples = rows.view('>u2').reshape(height, width, channels) >> 8
+    elif depth == 8:
+        samples = rows.reshape(height, width, channels)
+    else:
+        # Unpack sub-byte samples, most significant bits first
+        shifts = np.arange(8 - depth, -1, -depth, dtype=np.uint8)
+        unpacked = (rows[:, :, None] >> shifts) & ((1 << depth) - 1)
+        samples = unpacked.reshape(height, -1)[:, :width, None]
+        if color_type == 0:
+            samples = samples * (255 // ((1 << depth) - 1))
+    samples = samples.astype(np.uint8)
+    if color_type == 3:
+        if palette is None:
+            raise ValueError("palette PNG without a palette")
+        samples = palette[samples[..., 0]]
+    return samples
+
+def _unfilter(raw: bytes, height: int, stride: int, bpp: int) -> np.ndarray:
+    """Undo PNG row filters
+    
+    None, Sub and Up only need the row above, so they are undone a row at a
+    time. Average and Paeth also need the byte to the left; images that use
+    them are undone along anti-diagonals instead (see _unfilter_diagonals).
+    """
+    data = np.frombuffer(raw, dtype=np.uint8)
+    if data.size < height * (stride + 1):
+        raise ValueError("truncated image")
+    data = data[:height * (stride + 1)].reshape(height, stride + 1)
+    kinds, data = data[:, 0], data[:, 1:]
+    if kinds.max(initial=0) > 4:
+        raise ValueError(f"unknown PNG filter {kinds.max()}")
+    if kinds.max(initial=0) > 2:
+        return _unfilter_diagonals(data, kinds, bpp)
+    
+    out = np.empty((height, stride), dtype=np.uint8)
+    previous = np.zeros(stride, dtype=np.uint8)
+    for y in range(height):
+        if kinds[y] == 0:
+            out[y] = data[y]
+        elif kinds[y] == 1:
+            out[y] = data[y].reshape(-1, bpp).cumsum(axis=0, dtype=np.uint8).reshape(-1)
+        else:
+            out[y] = data[y] + previous
+        previous = out[y]
+    return out
+
+def _unfilter_diagonals(data: np.ndarray, kinds: np.ndarray, bpp: int) -> np.ndarray:
+    """Undo any mix of PNG filters one anti-diagonal of pixels at a time
+    
+    A pixel depends only on its left, upper and upper left neighbours, all
+    on the two diagonals before its own, so each diagonal is one vectorised
+    step: height + width steps instead of a Python loop over every byte.
+    The image is sheared so that each diagonal is a contiguous slice.
+    """
+    height, stride = data.shape
+    pixels = stride // bpp
+    ys, xs = np.mgrid[0:height, 0:pixels]
+    # skewed[d, y] is pixel (y, d - y); padded with a zero diagonal before
+    # the first and a zero row above, which stand in for pixels outside
+    raw = np.zeros((height + pixels, height, bpp), dtype=np.int16)
+    raw[ys + xs, ys] = data.reshape(height, pixels, bpp)
+    skewed = np.zeros((height + pixels + 1, height + 1, bpp), dtype=np.int16)
+    # None, Sub, Up and Average predict (left_weight * left + up_weight * up) // 2
+    left_weight = np.array([0, 2, 0, 1, 0], dtype=np.int16)[kinds][:, None]
+    up_weight = np.array([0, 0, 2, 1, 0], dtype=np.int16)[kinds][:, None]
+    paeth_rows = (kinds == 4)[:, None]
+    any_paeth = paeth_rows.any()
+    for diagonal in range(height + pixels - 1):
+        first, last = max(0, diagonal - pixels + 1), min(height, diagonal + 1)
+        left = skewed[diagonal, first + 1:last + 1]
+        up = skewed[diagonal, first:last]
+        predictor = (left_weight[first:last] * left + up_weight[first:last] * up) >> 1
+        if any_paeth:
+            corner = skewed[diagonal - 1, first:last] if diagonal else up * 0
+            pa, pb, pc = np.abs(up - corner), np.abs(left - corner), np.abs(left + up - 2 * corner)
+            paeth = np.where(pa <= np.minimum(pb, pc), left, np.where(pb <= pc, up, corner))
+            predictor = np.where(paeth_rows[first:last], paeth, predictor)
+        skewed[diagonal + 1, first + 1:last + 1] = (raw[diagonal, first:last] + predictor) & 0xff
+    return skewed[ys + xs + 1, ys + 1].astype(np.uint8).reshape(height, stride)
+
+def luminance(pixels: np.ndarray) -> np.ndarray:
+    """Grey level from 0 to 1 per pixel; transparent pixels fade to black"""
+    pixels = pixels.astype(np.float32) / 255
+    if pixels.ndim == 2:
+        return pixels
+    channels = pixels.shape[2]
+    if channels >= 3:
+        grey = pixels[..., :3] @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+    else:
+        grey = pixels[..., 0]
+    if channels in (2, 4):
+        grey = grey * pixels[..., -1]
+    return grey
+
+def fit(width: int, height: int, columns: int, lines: int) -> Tuple[int, int]:
+    """Cells (columns, lines) that show an image of width x height pixels
+    in at most columns x lines, keeping its proportions"""
+    rows = max(1, round(columns * height / (width * CELL_ASPECT)))
+    if rows <= lines:
+        return columns, rows
+    return max(1, min(columns, round(lines * CELL_ASPECT * width / height))), lines
+
+def resample(grey: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """Average the image over a rows x cols grid of boxes (area resampling)"""
+    height, width = grey.shape
+    integral = np.zeros((height + 1, width + 1), dtype=np.float64)
+    integral[1:, 1:] = grey.cumsum(axis=0, dtype=np.float64).cumsum(axis=1)
+    
+    def bounds(size: int, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        edges = np.linspace(0, size, count + 1)
+        start = np.minimum(edges[:-1].astype(np.int64), size - 1)
+        end = np.clip(edges[1:].astype(np.int64), start + 1, size)
+        return start, end
+    
+    y0, y1 = bounds(height, rows)
+    x0, x1 = bounds(width, cols)
+    sums = (integral[y1][:, x1] - integral[y0][:, x1] - integral[y1][:, x0] + integral[y0][:, x0])
+    return (sums / ((y1 - y0)[:, None] * (x1 - x0)[None, :])).astype(np.float32)
+
+def stretch(grey: np.ndarray) -> np.ndarray:
+    """Spread the 2nd to 98th percentile grey levels over the full range"""
+    low, high = np.percentile(grey, (2, 98))
+    if high - low < 1e-3:
+        return grey
+    return np.clip((grey - low) / (high - low), 0, 1)
+
+def image_to_art(pixels: np.ndarray, mode: str = 'braille', columns: int = 80, lines: int = 24,
+                 dither: bool = True, invert: bool = False) -> str:
+    """Convert decoded image samples into art of at most columns x lines
+    
+    Bright parts of the image become dense characters or lit dots, as they
+    would on a dark terminal; invert swaps that.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown conversion mode '{mode}' (expected {', '.join(MODES)})")
+    grey = luminance(pixels)
+    dot_cols, dot_rows = CELL_DOTS[mode]
+    cols, rows = fit(grey.shape[1], grey.shape[0], columns, lines)
+    dots = stretch(resample(grey, rows * dot_rows, cols * dot_cols))
+    if invert:
+        dots = 1 - dots
+    threshold = np.tile(BAYER, (dots.shape[0] // 4 + 1, dots.shape[1] // 4 + 1))[:dots.shape[0], :dots.shape[1]]
+    
+    if mode == 'ascii':
+        levels = dots * (len(RAMP) - 1) + ((threshold - 0.5) if dither else 0)
+        chars = RAMP[np.clip(np.rint(levels), 0, len(RAMP) - 1).astype(np.int64)]
+    else:
+        lit = dots > (threshold if dither else 0.5)
+        # rows x dot_rows x cols x dot_cols, one cell per (row, col)
+        cells = lit.reshape(rows, dot_rows, cols, dot_cols)
+        if mode == 'blocks':
+            codes = (cells * np.array([[1, 2], [4, 8]])[None, :, None, :]).sum(axis=(1, 3))
+            chars = QUADRANTS[codes]
+        else:
+            codes = (cells * BRAILLE_BITS[None, :, None, :]).sum(axis=(1, 3))
+            chars = np.vectorize(chr, otypes=[str])(0x2800 + codes)
+            # A blank Braille cell still shows as a glyph in some fonts
+            chars[codes == 0] = ' '
+    lines_out = [''.join(row).rstrip() for row in chars]
+    while lines_out and not lines_out[-1]:
+        lines_out.pop()
+    while lines_out and not lines_out[0]:
+        lines_out.pop(0)
+    return '\n'.join(lines_out)
+
+class ImageConverter:
+    """Art source converting local images instead of asking the API
+    
+    Works offline and in microseconds per piece. fetch_art() matches
+    ArtFetcher.fetch_art and converts a random image from IMAGE_DIR, which
+    is what the refill worker uses with ART_SOURCE=images; prepare() plugs
+    into lib.bulk to convert whole directories and archives in parallel.
+    Settings default to CONVERT_MODE, CONVERT_DITHER, CONVERT_INVERT and
+    ASCII_WIDTH/ASCII_HEIGHT.
+    """
+    
+    def __init__(self, mode: Optional[str] = None, width: Optional[int] = None, height: Optional[int] = None,
+                 dither: Optional[bool] = None, invert: Optional[bool] = None):
+        """Initialize the ImageConverter with configuration"""
+        self.mode = (mode or os.getenv('CONVERT_MODE', 'braille')).lower()
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown CONVERT_MODE '{self.mode}' (expected {', '.join(MODES)})")
+        self.width = width or int(os.getenv('ASCII_WIDTH', '80'))
+        self.height = height or int(os.getenv('ASCII_HEIGHT', '24'))
+        self.dither = os.getenv('CONVERT_DITHER', 'true').lower() == 'true' if dither is None else dither
+        self.invert = os.getenv('CONVERT_INVERT', 'false').lower() == 'true' if invert is None else invert
+        self.theme = os.getenv('THEME', 'cyberpunk')
+        self.image_dir = Path(os.path.expanduser(os.getenv('IMAGE_DIR', ''))) if os.getenv('IMAGE_DIR') else None
+    
+    @property
+    def style(self) -> str:
+        """Style recorded with converted pieces"""
+        return MODE_STYLES[self.mode]
+    
+    def convert(self, data: bytes) -> str:
+        """Convert an encoded image into art"""
+        art = image_to_art(read_image(data), self.mode, self.width, self.height, self.dither, self.invert)
+        if not art:
+            raise ValueError("the image converted to blank art")
+        return art
+    
+    def fetch_art(self, prompt: Optional[str] = None,
+                  on_line: Optional[Callable[[str], None]] = None) -> Dict[str, str]:
+        """Convert a random image from IMAGE_DIR, like ArtFetcher.fetch_art"""
+        import fnmatch
+        
+        if self.image_dir is None:
+            raise ValueError("IMAGE_DIR not set")
+        patterns = IMAGE_PATTERN.split(',')
+        images = [path for path in self.image_dir.rglob('*') if path.is_file()
+                  and any(fnmatch.fnmatch(path.name.lower(), pattern) for pattern in patterns)]
+        if not images:
+            raise ValueError(f"no images in {self.image_dir}")
+        image = random.choice(images)
+        art = self.convert(image.read_bytes())
+        if on_line:
+            for line in art.split('\n'):
+                on_line(line)
+        return {
+            'art': art,
+            'prompt': prompt or f"Converted from {image.name}",
+            'theme': self.theme,
+            'style': self.style
+        }
+    
+    def prepare(self, source: Source, defaults: Dict[str, str]) -> Dict:
+        """Convert one image for lib.bulk (runs in worker processes)"""
+        name = source[0]
+        try:
+            name, data, fields = read_source(source, defaults)
+            fields.setdefault('prompt', f"Converted from {os.path.basename(name)}")
+            fields.setdefault('style', self.style)
+            return prepared_piece(name, self.convert(data), fields)
+        except (OSError, ValueError, struct.error, zlib.error) as e:
+            return {'name': name, 'error': str(e)}
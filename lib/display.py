@@ -3,13 +3,31 @@
 import os
 import sys
 import random
-from typing import Optional
+from typing import Optional, Callable
+
+from . import trace
+
+def detect_depth(colorterm: str, term: str) -> str:
+    """Guess a terminal's colour depth from its COLORTERM and TERM"""
+    if colorterm.lower() in ('truecolor', '24bit'):
+        return 'truecolor'
+    if '256color' in term:
+        return '256'
+    return '16'
 
 class ArtDisplay:
-    def __init__(self):
-        """Initialize the ArtDisplay with configuration"""
+    def __init__(self, render_cache=None):
+        """Initialize the ArtDisplay with configuration
+        
+        render_cache is an optional RenderCache that keeps the final output
+        of previous displays, so repeated pieces skip rendering.
+        """
+        self.render_cache = render_cache
+        self._tables_key = None
         self.use_color = os.getenv('DISPLAY_COLOR', 'true').lower() == 'true'
         self.random_color = os.getenv('RANDOM_COLOR', 'false').lower() == 'true'
+        self.gradient = os.getenv('DISPLAY_GRADIENT', 'off').lower()
+        self.color_depth = os.getenv('COLOR_DEPTH', 'auto').lower()
         
         # ANSI color codes
         self.colors = {
@@ -43,26 +61,110 @@ class ArtDisplay:
             'monochrome': ['white', 'bright_white', 'bright_black']
         }
     
-    def display(self, art: str, theme: Optional[str] = None, clear_screen: bool = False):
-        """Display ASCII art with optional colors"""
+    def display(self, art: str, theme: Optional[str] = None, clear_screen: bool = False,
+                art_id: Optional[str] = None):
+        """Display ASCII art with optional colors
+        
+        art_id identifies cached art for the render cache; without it the
+        art is checksummed instead.
+        """
         if clear_screen:
             self._clear_screen()
         
+        # Random colors differ on every call, there is nothing to reuse
+        cacheable = not (self.use_color and self.random_color)
+        mode = self._color_mode() if self.use_color else 'plain'
+        self._emit(('display', mode, theme), art, lambda: self.render(art, theme=theme) + '\n',
+                   art_id=art_id, cacheable=cacheable)
+    
+    def _emit(self, layout: tuple, art: str, build: Callable[[], str],
+              art_id: Optional[str] = None, cacheable: bool = True):
+        """Write rendered output in one call, reusing the render cache if possible
+        
+        layout identifies everything besides the art that changes the output;
+        build returns the text to write on a cache miss.
+        """
+        encoding = sys.stdout.encoding or 'utf-8'
+        errors = sys.stdout.errors or 'strict'
+        cache = self.render_cache if cacheable else None
+        data = None
+        with trace.span('display.render', layout=layout[0]) as span:
+            if cache is not None:
+                if self._tables_key is None:
+                    # Tables are fixed for the life of an ArtDisplay
+                    self._tables_key = cache.checksum(repr((self.colors, self.themes)))
+                key = cache.key(art, layout + (encoding, errors, self._tables_key), art_id)
+                data = cache.get(key)
+            span.set(cached=data is not None)
+            if data is None:
+                data = build().encode(encoding, errors)
+                if cache is not None:
+                    cache.put(key, data)
+            span.set(bytes=len(data))
+        
+        with trace.span('display.write'):
+            buffer = getattr(sys.stdout, 'buffer', None)
+            if buffer is None:
+                # Text-only streams (e.g. captured output) can't take bytes
+                sys.stdout.write(data.decode(encoding, errors))
+                return
+            sys.stdout.flush()
+            buffer.write(data)
+            buffer.flush()
+    
+    def render(self, art: str, theme: Optional[str] = None) -> str:
+        """Return art with the color escapes display() would print
+        
+        Multi-frame art (see lib.animate) shows its last frame.
+        """
+        if '\f' in art:
+            from .animate import last_frame
+            art = last_frame(art)
         if not self.use_color:
-            print(art)
-            return
+            return art
         
         # Choose color scheme
         if self.random_color:
             color = random.choice(list(self.colors.keys())[:-1])  # Exclude 'reset'
-            colored_art = f"{self.colors[color]}{art}{self.colors['reset']}"
+            return f"{self.colors[color]}{art}{self.colors['reset']}"
         elif theme and theme in self.themes:
-            colored_art = self._apply_theme_colors(art, theme)
+            if self._color_mode() != 'theme':
+                colored = self._apply_gradient(art, theme)
+                if colored is not None:
+                    return colored
+            return self._apply_theme_colors(art, theme)
         else:
             # Default cyan color for terminal aesthetic
-            colored_art = f"{self.colors['cyan']}{art}{self.colors['reset']}"
+            return f"{self.colors['cyan']}{art}{self.colors['reset']}"
+    
+    def _depth(self) -> str:
+        """Get the configured or detected colour depth: truecolor, 256 or 16"""
+        if self.color_depth != 'auto':
+            return self.color_depth
+        return detect_depth(os.getenv('COLORTERM', ''), os.getenv('TERM', ''))
+    
+    def _color_mode(self) -> str:
+        """Describe how themed art is colored, e.g. 'theme' or 'radial/256'"""
+        depth = self._depth()
+        if self.gradient == 'off' or depth == '16':
+            return 'theme'
+        return f"{self.gradient}/{depth}"
+    
+    def _apply_gradient(self, art: str, theme: str) -> Optional[str]:
+        """Apply a per-cell gradient of the theme colors
         
-        print(colored_art)
+        Returns None when NumPy is missing or the art carries its own color
+        escapes, which a per-cell gradient would break up.
+        """
+        if '\033[' in art:
+            return None
+        try:
+            # NumPy is optional and slow to import; only load it on a render
+            from . import gradient
+        except ImportError:
+            return None
+        return gradient.render(art, gradient.theme_stops(self.themes[theme]),
+                               direction=self.gradient, depth=self._depth())
     
     def _apply_theme_colors(self, art: str, theme: str) -> str:
         """Apply theme-based gradient colors to art"""
@@ -83,32 +185,74 @@ class ArtDisplay:
         
         return '\n'.join(colored_lines)
     
-    def display_with_border(self, art: str, border_char: str = '='):
-        """Display ASCII art with a border"""
+    def display_with_border(self, art: str, border_char: str = '=', art_id: Optional[str] = None,
+                            metrics: Optional[dict] = None):
+        """Display ASCII art with a border
+        
+        metrics are the display metrics saved with the art; they are
+        measured from the text when not given.
+        """
+        self._emit(('border', border_char), art, lambda: self._border(art, border_char, metrics),
+                   art_id=art_id)
+    
+    def _border(self, art: str, border_char: str, metrics: Optional[dict] = None) -> str:
+        """Return art framed by a border, padded by display width"""
+        if metrics is None:
+            from .width import metrics as measure
+            metrics = measure(art)
         lines = art.split('\n')
-        max_width = max(len(line) for line in lines) if lines else 0
+        max_width = metrics['max_width']
         
         border = border_char * (max_width + 4)
         
-        print(border)
-        for line in lines:
-            print(f"{border_char} {line.ljust(max_width)} {border_char}")
-        print(border)
+        framed = [border]
+        for line, width in zip(lines, metrics['widths']):
+            framed.append(f"{border_char} {line}{' ' * (max_width - width)} {border_char}")
+        framed.append(border)
+        return '\n'.join(framed) + '\n'
     
     def _clear_screen(self):
-        """Clear the terminal screen"""
-        os.system('clear' if os.name != 'nt' else 'cls')
+        """Clear the terminal screen and home the cursor"""
+        sys.stdout.write('\033[H\033[2J')
+        sys.stdout.flush()
+    
+    def animate(self, art: str, effect: str, theme: Optional[str] = None, art_id: Optional[str] = None,
+                clear_screen: bool = False):
+        """Play art with an animation effect (see lib.animate)
+        
+        Returns the AnimationPlayer, or None when stdout isn't a terminal
+        and the art was displayed still instead.
+        """
+        if not sys.stdout.isatty():
+            self.display(art, theme=theme, clear_screen=clear_screen, art_id=art_id)
+            return None
+        from .animate import animate
+        
+        if clear_screen:
+            self._clear_screen()
+        return animate(self, art, effect, theme=theme)
     
-    def print_centered(self, art: str):
+    def print_centered(self, art: str, art_id: Optional[str] = None, metrics: Optional[dict] = None):
         """Print ASCII art centered in terminal"""
         try:
             # Get terminal size
             columns = os.get_terminal_size().columns
-            
-            lines = art.split('\n')
-            for line in lines:
-                padding = (columns - len(line)) // 2
-                print(' ' * padding + line)
         except:
             # Fallback to normal print if terminal size can't be determined
-            print(art)
\ No newline at end of file
+            self._emit(('plain',), art, lambda: art + '\n', art_id=art_id)
+            return
+        
+        self._emit(('center', columns), art, lambda: self._center(art, columns, metrics), art_id=art_id)
+    
+    def _center(self, art: str, columns: int, metrics: Optional[dict] = None) -> str:
+        """Return art with each line padded to the middle of the terminal"""
+        if metrics is None:
+            from .width import metrics as measure
+            metrics = measure(art)
+        lines = art.split('\n')
+        widths = metrics['widths']
+        centered = []
+        for line, width in zip(lines, widths):
+            padding = (columns - width) // 2
+            centered.append(' ' * padding + line)
+        return '\n'.join(centered) + '\n'
@@ -0,0 +1,474 @@
+"""Eviction policies and show statistics for cache budgets"""
+
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+POLICIES = ('fifo', 'lru', 'lfu')
+
+# shows.log: one record appended per piece shown; folded into usage.heap by
+# writers, so displaying art never takes the writer lock
+SHOW = struct.Struct('<16sd')      # id, time shown
+
+# usage.heap: a header, a table from ID to heap position and the heap of
+# per-piece statistics, rewritten whole only when rebuilt or grown
+HEAP_HEADER = struct.Struct('<8sBB2xIII')    # magic, policy, clean, entries, table slots, stamp checksum
+HEAP_MAGIC = b'MOTDUSE1'
+HEAP_CLEAN_OFFSET = 9                        # after magic and policy
+HEAP_SLOT = struct.Struct('<I')              # heap position + 1, 0 if empty
+HEAP_ENTRY = struct.Struct('<16sB3xIdd')     # id, pinned, shows, last shown, created
+
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+def parse_size(value: str) -> int:
+    """Parse a byte budget such as "512k" or "20M"; 0 or empty means no budget"""
+    text = value.strip().lower().rstrip('b')
+    unit = text[-1:] if text[-1:] in SIZE_UNITS else ''
+    number = text[:-1] if unit else text
+    try:
+        return int(float(number or 0) * SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Invalid byte size '{value}' (expected e.g. 500k, 20M)") from None
+
+def encode_id(art_id: str) -> Optional[bytes]:
+    """Encode an ID as shows.log and usage.heap store it, None if it doesn't fit"""
+    encoded = art_id.encode('utf-8')
+    return encoded.ljust(16, b'\0') if len(encoded) <= 16 else None
+
+def stamp_checksum(stamp) -> int:
+    """Checksum of a cache index stamp, 0 for none"""
+    return zlib.crc32(repr(stamp).encode()) if stamp is not None else 0
+
+def heap_file_size(slots: int) -> int:
+    """Bytes of a usage.heap with a table of slots, holding up to half as many entries"""
+    return HEAP_HEADER.size + slots * HEAP_SLOT.size + slots // 2 * HEAP_ENTRY.size
+
+def record_show(cache_dir: Path, art_id: str):
+    """Note that a piece was shown, if EVICTION ranks pieces by their shows
+    
+    One O_APPEND write, which keeps concurrent records whole; a failure only
+    costs statistics.
+    """
+    if os.getenv('EVICTION', 'fifo').lower() not in ('lru', 'lfu'):
+        return
+    try:
+        fd = os.open(Path(cache_dir) / 'shows.log', os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, SHOW.pack(art_id.encode('utf-8')[:16], time.time()))
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+class Usage:
+    """Show counts and last-shown times per piece, in eviction order
+    
+    Kept in usage.heap as a binary min-heap ordered by the lru or lfu rank,
+    with a table from ID to heap position, and updated in place under the
+    cache writer lock: a show, a saved piece and an eviction each move
+    O(log n) entries. open() maps it for the index stamp the cache is at,
+    rebuilding it from the cache's entries if the last writer to update it
+    left another stamp (the cache changed other than through a save, or a
+    save was cut short) or ranked by another policy; close() records the
+    stamp the save leaves. IDs longer than 16 bytes, which only an old
+    import --id could give the files backend, are left out, so those
+    pieces are never evicted under lru or lfu.
+    """
+    
+    def __init__(self, cache_dir: Path, policy: str = 'lru'):
+        """Initialize Usage for a cache directory and the policy ranking it"""
+        self.cache_dir = Path(cache_dir)
+        self.policy = policy
+        self.heap_file = self.cache_dir / 'usage.heap'
+        self.log_file = self.cache_dir / 'shows.log'
+        # Folded statistics before usage.heap
+        self.usage_file = self.cache_dir / 'usage.json'
+        self.map = None
+    
+    def open(self, stamp, entries: Iterable[Tuple[str, float, int, bool]]):
+        """Map usage.heap for updates, rebuilt from entries unless it was closed at stamp"""
+        checksum = stamp_checksum(stamp)
+        self.map = self._map()
+        if self.map is not None:
+            _, policy, clean, _, _, closed = HEAP_HEADER.unpack_from(self.map, 0)
+            if stamp is None or not clean or policy != POLICIES.index(self.policy) or closed != checksum:
+                self.map.close()
+                self.map = None
+        if self.map is None:
+            usage = self._load()
+            records = {}
+            for art_id, created, _, pinned in entries:
+                id_bytes = encode_id(art_id)
+                if id_bytes is not None:
+                    records[id_bytes] = (id_bytes, pinned, *usage.get(id_bytes, (0, 0.0)), created)
+            self._write(list(records.values()))
+            self.usage_file.unlink(missing_ok=True)
+            self.map = self._map()
+        self._set_header(clean=0)
+    
+    def close(self, stamp):
+        """Record the index stamp the cache was left at and unmap usage.heap"""
+        if self.map is None:
+            return
+        self._set_header(clean=1, stamp=stamp)
+        self.map.close()
+        self.map = None
+    
+    def invalidate(self):
+        """Have the next writer rebuild usage.heap, after a change that keeps the index stamp"""
+        try:
+            fd = os.open(self.heap_file, os.O_WRONLY)
+        except FileNotFoundError:
+            return
+        try:
+            os.pwrite(fd, b'\0', HEAP_CLEAN_OFFSET)
+        finally:
+            os.close(fd)
+    
+    def fold(self):
+        """Add the show records logged since the last fold"""
+        folding = self.cache_dir / 'shows.log.folding'
+        if not folding.exists():
+            try:
+                # Displays that open the log after this start a new one
+                os.replace(self.log_file, folding)
+            except FileNotFoundError:
+                pass
+        try:
+            with open(folding, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b''
+        
+        for offset in range(0, len(data) - SHOW.size + 1, SHOW.size):
+            id_bytes, shown = SHOW.unpack_from(data, offset)
+            slot = self._find_slot(id_bytes)
+            position = self._slot_value(slot) - 1
+            if position >= 0:
+                _, pinned, shows, last_shown, created = self._entry(position)
+                self._sift(position, (id_bytes, pinned, shows + 1, max(last_shown, shown), created), slot)
+        folding.unlink(missing_ok=True)
+    
+    def push(self, art_id: str, created: float, pinned: bool, shows: int = 0, last_shown: float = 0.0):
+        """Add a piece, or update one saved again or pinned since, keeping its shows"""
+        id_bytes = encode_id(art_id)
+        if id_bytes is None:
+            return
+        slot = self._find_slot(id_bytes)
+        position = self._slot_value(slot) - 1
+        if position >= 0:
+            _, _, shows, last_shown, _ = self._entry(position)
+            self._sift(position, (id_bytes, pinned, shows, last_shown, created), slot)
+            return
+        if self.count == self.slots // 2:
+            self._write([self._entry(position) for position in range(self.count)])
+            self.map.close()
+            self.map = self._map()
+            slot = self._find_slot(id_bytes)
+        self.count += 1
+        self._sift(self.count - 1, (id_bytes, pinned, shows, last_shown, created), slot)
+        self._set_header()
+    
+    def top(self) -> Optional[Tuple[str, bool]]:
+        """Return the ID of the piece to evict first and whether it was pinned, None if empty"""
+        if not self.count:
+            return None
+        id_bytes, pinned, _, _, _ = self._entry(0)
+        return id_bytes.rstrip(b'\0').decode('utf-8', 'replace'), bool(pinned)
+    
+    def pop(self) -> Tuple[int, float]:
+        """Remove the piece to evict first, return its shows and last-shown time"""
+        _, _, shows, last_shown, _ = first = self._entry(0)
+        self._clear_slot(self._find_slot(first[0]))
+        self.count -= 1
+        if self.count:
+            last = self._entry(self.count)
+            self._sift(0, last, self._find_slot(last[0]))
+        self._set_header()
+        return shows, last_shown
+    
+    # usage.heap layout
+    
+    def _map(self):
+        """Map usage.heap read-write, None if it's missing or not a whole heap file"""
+        import mmap
+        
+        try:
+            fd = os.open(self.heap_file, os.O_RDWR)
+        except FileNotFoundError:
+            return None
+        try:
+            size = os.fstat(fd).st_size
+            header = os.pread(fd, HEAP_HEADER.size, 0)
+            if len(header) != HEAP_HEADER.size:
+                return None
+            magic, _, _, count, slots, _ = HEAP_HEADER.unpack(header)
+            if magic != HEAP_MAGIC or size != heap_file_size(slots) or count > slots // 2:
+                return None
+            self.count, self.slots = count, slots
+            self.base = HEAP_HEADER.size + slots * HEAP_SLOT.size
+            return mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+    
+    def _load(self) -> Dict[bytes, Tuple[int, float]]:
+        """Read shows and last-shown times per ID from usage.heap, or usage.json before it"""
+        import json
+        
+        heap = self._map()
+        if heap is not None:
+            try:
+                return {id_bytes: (shows, last_shown)
+                        for id_bytes, _, shows, last_shown, _ in HEAP_ENTRY.iter_unpack(
+                            heap[self.base:self.base + self.count * HEAP_ENTRY.size])}
+            finally:
+                heap.close()
+        try:
+            with open(self.usage_file, 'r') as f:
+                usage = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        return {encode_id(art_id): tuple(entry) for art_id, entry in usage.items() if encode_id(art_id)}
+    
+    def _write(self, records: List[tuple]):
+        """Write usage.heap from scratch, its table at most a quarter full"""
+        from .atomic import atomic_write
+        
+        # A sorted list is a valid heap
+        records.sort(key=self._rank)
+        slots = 64
+        while slots < 4 * len(records):
+            slots *= 2
+        base = HEAP_HEADER.size + slots * HEAP_SLOT.size
+        data = bytearray(heap_file_size(slots))
+        HEAP_HEADER.pack_into(data, 0, HEAP_MAGIC, POLICIES.index(self.policy), 0, len(records), slots, 0)
+        for position, record in enumerate(records):
+            HEAP_ENTRY.pack_into(data, base + position * HEAP_ENTRY.size, *record)
+            slot = zlib.crc32(record[0]) & (slots - 1)
+            while HEAP_SLOT.unpack_from(data, HEAP_HEADER.size + slot * HEAP_SLOT.size)[0]:
+                slot = (slot + 1) & (slots - 1)
+            HEAP_SLOT.pack_into(data, HEAP_HEADER.size + slot * HEAP_SLOT.size, position + 1)
+        atomic_write(self.heap_file, bytes(data))
+    
+    def _set_header(self, clean: int = 0, stamp=None):
+        HEAP_HEADER.pack_into(self.map, 0, HEAP_MAGIC, POLICIES.index(self.policy), clean, self.count,
+                              self.slots, stamp_checksum(stamp))
+    
+    def _rank(self, entry: tuple) -> tuple:
+        """Eviction order: pinned pieces last, then by policy, then oldest saved"""
+        id_bytes, pinned, shows, last_shown, created = entry
+        recent = max(last_shown, created)
+        if self.policy == 'lfu':
+            return pinned, shows, recent, created, id_bytes
+        return pinned, recent, created, id_bytes
+    
+    def _entry(self, position: int) -> tuple:
+        return HEAP_ENTRY.unpack_from(self.map, self.base + position * HEAP_ENTRY.size)
+    
+    # ID table: open addressing with linear probing, each slot holding a
+    # heap position + 1 or 0 if empty
+    
+    def _slot_value(self, slot: int) -> int:
+        return HEAP_SLOT.unpack_from(self.map, HEAP_HEADER.size + slot * HEAP_SLOT.size)[0]
+    
+    def _find_slot(self, id_bytes: bytes) -> int:
+        """Return the slot holding an ID's position, or the empty slot it would go in"""
+        mask = self.slots - 1
+        slot = zlib.crc32(id_bytes) & mask
+        while True:
+            value = self._slot_value(slot)
+            if not value or self._entry(value - 1)[0] == id_bytes:
+                return slot
+            slot = (slot + 1) & mask
+    
+    def _set_slot(self, slot: int, value: int):
+        HEAP_SLOT.pack_into(self.map, HEAP_HEADER.size + slot * HEAP_SLOT.size, value)
+    
+    def _clear_slot(self, slot: int):
+        """Empty a slot, shifting back the entries probed past it"""
+        mask = self.slots - 1
+        probe = slot
+        while True:
+            probe = (probe + 1) & mask
+            moving = self._slot_value(probe)
+            if not moving:
+                break
+            home = zlib.crc32(self._entry(moving - 1)[0]) & mask
+            # Entries whose home lies after the hole have to stay put
+            if (probe - home) & mask >= (probe - slot) & mask:
+                self._set_slot(slot, moving)
+                slot = probe
+        self._set_slot(slot, 0)
+    
+    def _sift(self, position: int, entry: tuple, slot: int):
+        """Put an entry in the hole at position, moving it up or down into heap order
+        
+        slot is the entry's table slot; each entry moved past it has its
+        slot updated as it moves.
+        """
+        rank = self._rank(entry)
+        while position > 0:
+            parent = (position - 1) // 2
+            above = self._entry(parent)
+            if self._rank(above) <= rank:
+                break
+            self._move(above, position)
+            position = parent
+        while True:
+            child = 2 * position + 1
+            if child >= self.count:
+                break
+            if child + 1 < self.count and self._rank(self._entry(child + 1)) < self._rank(self._entry(child)):
+                child += 1
+            below = self._entry(child)
+            if self._rank(below) >= rank:
+                break
+            self._move(below, position)
+            position = child
+        HEAP_ENTRY.pack_into(self.map, self.base + position * HEAP_ENTRY.size, *entry)
+        self._set_slot(slot, position + 1)
+    
+    def _move(self, entry: tuple, position: int):
+        """Move an entry still at its old position to another"""
+        slot = self._find_slot(entry[0])
+        HEAP_ENTRY.pack_into(self.map, self.base + position * HEAP_ENTRY.size, *entry)
+        self._set_slot(slot, position + 1)
+
+class Evictor:
+    """Chooses pieces to evict so the cache fits its budgets
+    
+    Policies (EVICTION, default fifo):
+        
+        fifo  oldest saved first
+        lru   shown longest ago first; a piece never shown counts as shown
+              when it was saved
+        lfu   shown fewest times first, ties broken like lru
+    
+    Budgets are CACHE_SIZE pieces and, if set, CACHE_BYTES of art. Pinned
+    pieces are never evicted and don't count towards either budget.
+    """
+    
+    def __init__(self, cache_dir: Path, max_items: int, max_bytes: int = 0, policy: Optional[str] = None):
+        """Initialize the Evictor, policy defaults to EVICTION"""
+        self.policy = (policy or os.getenv('EVICTION', 'fifo')).lower()
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown EVICTION '{self.policy}' (expected {', '.join(POLICIES)})")
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.usage = Usage(cache_dir, self.policy)
+    
+    def over_budget(self, count: int, total: int) -> bool:
+        """Check if unpinned pieces and their bytes exceed the budgets"""
+        return count > self.max_items or bool(self.max_bytes and total > self.max_bytes)
+    
+    def select(self, entries: Iterable[Tuple[str, float, int, bool]], protected: Iterable[str] = (),
+               totals: Optional[Tuple[int, int]] = None,
+               lookup: Optional[Callable[[str], Optional[Tuple[str, float, int, bool]]]] = None,
+               stamp=None) -> List[str]:
+        """Return IDs to evict, in eviction order
+        
+        entries are (ID, created epoch, bytes, pinned) per piece, oldest
+        first, and lookup returns a piece's entry or None if it's gone.
+        Protected pieces (those being saved) go only once nothing else is
+        left, so a new piece is never evicted for never having been shown.
+        
+        totals are the count and bytes of unpinned pieces. fifo then reads
+        entries only until the cache fits, so a save costs the pieces it
+        evicts. lru and lfu pop pieces off usage.heap, which costs O(log n)
+        per show folded, piece saved and piece evicted; entries are read
+        only to rebuild it when stamp, the cache index stamp before this
+        save, isn't the one saved() last recorded.
+        """
+        protected = set(protected)
+        if totals is None:
+            entries = list(entries)
+            unpinned = [entry for entry in entries if not entry[3]]
+            totals = (len(unpinned), sum(entry[2] for entry in unpinned))
+        if self.policy == 'fifo':
+            return self._select_oldest(entries, protected, *totals)
+        if lookup is None:
+            entries = list(entries)
+            lookup = {entry[0]: entry for entry in entries}.get
+        return self._select_ranked(entries, protected, *totals, lookup, stamp)
+    
+    def saved(self, stamp):
+        """Record the cache index stamp a save that called select() left"""
+        self.usage.close(stamp)
+    
+    def _select_ranked(self, entries, protected, count: int, total: int, lookup, stamp) -> List[str]:
+        usage = self.usage
+        usage.open(stamp, entries)
+        usage.fold()
+        for art_id in protected:
+            entry = lookup(art_id)
+            if entry is not None:
+                usage.push(art_id, entry[1], entry[3])
+        
+        victims = []
+        deferred = []
+        while self.over_budget(count, total):
+            top = usage.top()
+            if top is None:
+                break
+            art_id, was_pinned = top
+            entry = lookup(art_id)
+            if entry is None:
+                # Deleted since it was pushed
+                usage.pop()
+                continue
+            if entry[3] != was_pinned:
+                usage.push(art_id, entry[1], entry[3])
+                continue
+            if was_pinned:
+                # Pinned pieces rank last, so only they are left
+                break
+            shows = usage.pop()
+            if art_id in protected:
+                deferred.append((entry, shows))
+                continue
+            victims.append(art_id)
+            count -= 1
+            total -= entry[2]
+        for (art_id, created, size, pinned), shows in deferred:
+            if self.over_budget(count, total):
+                victims.append(art_id)
+                count -= 1
+                total -= size
+            else:
+                usage.push(art_id, created, pinned, *shows)
+        return victims
+    
+    def _select_oldest(self, entries, protected, count: int, total: int) -> List[str]:
+        victims = []
+        deferred = []
+        for art_id, _, size, pinned in entries:
+            if not self.over_budget(count, total):
+                return victims
+            if pinned:
+                continue
+            if art_id in protected:
+                deferred.append((art_id, size))
+                continue
+            victims.append(art_id)
+            count -= 1
+            total -= size
+        for art_id, size in deferred:
+            if not self.over_budget(count, total):
+                break
+            victims.append(art_id)
+            count -= 1
+            total -= size
+        return victims
+    
+    def status(self, entries: Iterable[Tuple[str, float, int, bool]]) -> Dict:
+        """Return the policy, budgets and current use of pinned and other pieces"""
+        info = {'policy': self.policy, 'max_items': self.max_items, 'max_bytes': self.max_bytes,
+                'items': 0, 'bytes': 0, 'pinned': 0, 'pinned_bytes': 0}
+        for _, _, size, pinned in entries:
+            prefix = 'pinned_' if pinned else ''
+            info[f"{prefix}bytes"] += size
+            info['pinned' if pinned else 'items'] += 1
+        return info
@@ -1,10 +1,124 @@
 """Fetch ASCII art from OpenAI API"""
 
 import os
-import openai
-from typing import Optional, Dict
+import re
+import math
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Dict, List, Tuple, Callable
 from dotenv import load_dotenv
 
+from . import trace
+
+# Rough UTF-8 bytes per terminal cell of each art style, matched in the
+# order _get_system_prompt checks them: wide CJK characters are 3 bytes
+# over 2 cells, emoji 4 over 2 and Braille 3 over 1; plain ASCII is 1
+STYLE_BYTES_PER_CELL = (('unicode', 1.5), ('japanese', 1.5), ('emoji', 2.0), ('braille', 3.0))
+# Symbols in art merge into tokens less than prose does, about 1.5 bytes
+# per token; the overhead covers a fence or a preamble line around it.
+# Streaming stops at the last line, so a generous budget costs nothing.
+BYTES_PER_TOKEN = 1.5
+TOKEN_OVERHEAD = 64
+
+# Chatty openings such as "Here's your robot:" or "Sure! ..."
+PREAMBLE_RE = re.compile(r"^(here(\s+is|\s+are|'s)|sure|certainly|of course|below|okay)\b|:$", re.IGNORECASE)
+
+def is_preamble(line: str) -> bool:
+    """Check if a line before the art is prose rather than art"""
+    text = line.strip()
+    if not text or not PREAMBLE_RE.search(text):
+        return False
+    wordy = sum(1 for char in text if char.isalpha() or char == ' ')
+    return wordy >= 0.8 * len(text)
+
+class ArtLines:
+    """Assemble streamed completion text into art lines
+    
+    Text is fed as it arrives. Markdown fences, a chatty preamble and blank
+    lines before the art are dropped and lines are trimmed to the width.
+    The art is complete, and the caller can stop reading, once it has
+    `height` lines or its closing fence arrives. on_line(line) is called
+    for each art line as it is accepted.
+    """
+    
+    def __init__(self, width: int, height: int, on_line: Optional[Callable[[str], None]] = None):
+        """Initialize an empty ArtLines"""
+        self.width = width
+        self.height = height
+        self.on_line = on_line
+        self.lines: List[str] = []
+        self.done = False
+        self._partial = ''
+        self._fenced = False
+    
+    def feed(self, text: str) -> bool:
+        """Add streamed text, return True once the art is complete"""
+        if self.done:
+            return True
+        *complete, self._partial = (self._partial + text).split('\n')
+        for line in complete:
+            self._add(line)
+            if self.done:
+                break
+        return self.done
+    
+    def finish(self) -> str:
+        """Take the unterminated last line and return the art"""
+        if not self.done and self._partial:
+            self._add(self._partial)
+        self._partial = ''
+        while self.lines and not self.lines[-1].strip():
+            self.lines.pop()
+        return '\n'.join(self.lines)
+    
+    def _add(self, line: str):
+        from .width import trim
+        
+        line = line.rstrip('\r')
+        if line.lstrip().startswith('```'):
+            if self._fenced:
+                self.done = True
+            else:
+                # Anything before an opening fence was preamble
+                self._fenced = True
+                self.lines = []
+            return
+        if not self.lines and (not line.strip() or (not self._fenced and is_preamble(line))):
+            return
+        
+        line = trim(line, self.width)
+        self.lines.append(line)
+        if self.on_line:
+            self.on_line(line)
+        if len(self.lines) >= self.height:
+            self.done = True
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` requests per second"""
+    
+    def __init__(self, rate: float, burst: int = 1):
+        """Initialize the bucket full, holding up to `burst` tokens"""
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 class ArtFetcher:
     def __init__(self, config_path: Optional[str] = None):
         """Initialize the ArtFetcher with configuration"""
@@ -14,51 +128,211 @@ class ArtFetcher:
             load_dotenv()
         
         self.api_key = os.getenv('OPENAI_API_KEY')
+        self.base_url = os.getenv('OPENAI_BASE_URL') or None
         self.model = os.getenv('OPENAI_MODEL', 'gpt-4')
         self.style = os.getenv('ASCII_STYLE', 'retro computer terminal')
         self.width = int(os.getenv('ASCII_WIDTH', '80'))
         self.height = int(os.getenv('ASCII_HEIGHT', '24'))
         self.theme = os.getenv('THEME', 'cyberpunk')
+        self.max_retries = int(os.getenv('FETCH_RETRIES', '4'))
+        # Seconds the client waits to connect or for the next chunk
+        self.timeout = float(os.getenv('FETCH_TIMEOUT', '60'))
+        self.max_tokens = int(os.getenv('FETCH_MAX_TOKENS', '0')) or self._default_max_tokens()
+        self._client = None
+        self._client_lock = threading.Lock()
         
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY not found in environment")
+    
+    def _get_client(self):
+        """Get the OpenAI client shared by all requests from this fetcher"""
+        with self._client_lock:
+            if self._client is None:
+                with trace.span('fetch.client'):
+                    # Imported here so that loading the library stays cheap
+                    import openai
+                    
+                    # Retries are handled by _request_with_retry
+                    self._client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url,
+                                                 max_retries=0, timeout=self.timeout)
+            return self._client
+    
+    def connect(self):
+        """Import the SDK and build the client ahead of a timed fetch
         
-        openai.api_key = self.api_key
+        On a cold start this takes most of a second, which is setup rather
+        than network time; the refill worker calls it before its first
+        timed fetch.
+        """
+        self._get_client()
     
-    def fetch_art(self, prompt: Optional[str] = None) -> Dict[str, str]:
-        """Fetch ASCII art from OpenAI"""
+    def _default_max_tokens(self) -> int:
+        """Token budget for art filling width x height in the configured style"""
+        style = self.style.lower()
+        per_cell = next((size for name, size in STYLE_BYTES_PER_CELL if name in style), 1.0)
+        return math.ceil(self.width * self.height * per_cell / BYTES_PER_TOKEN) + self.height + TOKEN_OVERHEAD
+    
+    @trace.traced('fetch.art')
+    def fetch_art(self, prompt: Optional[str] = None,
+                  on_line: Optional[Callable[[str], None]] = None) -> Dict[str, str]:
+        """Fetch ASCII art from OpenAI
+        
+        on_line(line) is called with each art line as it streams in; lines
+        of an attempt that fails and is retried are not taken back.
+        """
         if not prompt:
             prompt = self._generate_prompt()
         
         try:
-            client = openai.OpenAI(api_key=self.api_key)
-            response = client.chat.completions.create(
+            art = self._request_with_retry(prompt, on_line)
+            if not art.strip():
+                raise ValueError("the completion contained no art")
+        except Exception as e:
+            raise Exception(f"Failed to fetch art from OpenAI: {str(e)}")
+        
+        return {
+            'art': art,
+            'prompt': prompt,
+            'theme': self.theme,
+            'style': self.style
+        }
+    
+    def fetch_within(self, seconds: float, prompt: Optional[str] = None) -> Dict[str, str]:
+        """Fetch one piece, or raise TimeoutError once `seconds` have passed
+        
+        For display commands with a latency budget: there are no retries,
+        the client times out with the budget, and the caller stops waiting
+        at the deadline even if the request is still going; it is left to
+        finish in a daemon thread. Building the client happens in that
+        thread too, so a cold SDK import counts against the deadline. An
+        ImportError (no SDK installed) is raised as it is.
+        """
+        outcome = {}
+        
+        def work():
+            try:
+                text = prompt or self._generate_prompt()
+                art = self._request(text, timeout=seconds)
+                if not art.strip():
+                    raise ValueError("the completion contained no art")
+                outcome['art_data'] = {'art': art, 'prompt': text, 'theme': self.theme, 'style': self.style}
+            except Exception as e:
+                outcome['error'] = e
+        
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+        worker.join(max(0.0, seconds))
+        if worker.is_alive():
+            raise TimeoutError(f"no art from OpenAI within {seconds:.1f}s")
+        if isinstance(outcome.get('error'), ImportError):
+            raise outcome['error']
+        if 'error' in outcome:
+            raise Exception(f"Failed to fetch art from OpenAI: {outcome['error']}")
+        return outcome['art_data']
+    
+    def fetch_batch(self, count: int, concurrency: int = 4, rate: Optional[float] = None,
+                    prompt: Optional[str] = None,
+                    on_done: Optional[Callable] = None) -> Tuple[List[Dict[str, str]], List[Exception]]:
+        """Fetch `count` pieces in parallel through the shared client
+        
+        At most `concurrency` requests are in flight and, if `rate` is set, no
+        more than `rate` requests start per second. `on_done(art_data, error)`
+        is called from the calling thread as each request finishes. Returns
+        the fetched art and the errors of requests that gave up.
+        """
+        limiter = RateLimiter(rate, burst=concurrency) if rate else None
+        results = []
+        errors = []
+        
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = [pool.submit(self._fetch_limited, prompt, limiter) for _ in range(count)]
+            for future in as_completed(futures):
+                try:
+                    art_data = future.result()
+                    results.append(art_data)
+                    error = None
+                except Exception as e:
+                    art_data = None
+                    errors.append(e)
+                    error = e
+                if on_done:
+                    on_done(art_data, error)
+        
+        return results, errors
+    
+    def _fetch_limited(self, prompt: Optional[str], limiter: Optional[RateLimiter]) -> Dict[str, str]:
+        """Fetch one piece for fetch_batch, waiting on the rate limiter"""
+        if limiter:
+            limiter.acquire()
+        return self.fetch_art(prompt)
+    
+    def _request_with_retry(self, prompt: str, on_line: Optional[Callable[[str], None]] = None) -> str:
+        """Request a completion, backing off exponentially on 429/5xx errors"""
+        import openai
+        
+        attempt = 0
+        while True:
+            try:
+                return self._request(prompt, on_line)
+            except (openai.APIStatusError, openai.APIConnectionError) as e:
+                status = getattr(e, 'status_code', None)
+                retryable = status is None or status == 429 or status >= 500
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                
+                delay = min(30.0, 2 ** attempt) * (0.5 + random.random() / 2)
+                retry_after = e.response.headers.get('retry-after') if status else None
+                if retry_after and retry_after.replace('.', '', 1).isdigit():
+                    delay = max(delay, float(retry_after))
+                time.sleep(delay)
+                attempt += 1
+    
+    def _request(self, prompt: str, on_line: Optional[Callable[[str], None]] = None,
+                 timeout: Optional[float] = None) -> str:
+        """Stream one completion, closing it once the art fills the configured size
+        
+        Lines are trimmed to the width in terminal columns, since wide
+        characters take two; tokens past the last line are never generated.
+        timeout overrides FETCH_TIMEOUT for this request.
+        """
+        # Outside the request span, which would otherwise report the first
+        # request's SDK import as API latency (see fetch.client)
+        client = self._get_client()
+        if timeout is not None:
+            client = client.with_options(timeout=timeout)
+        with trace.span('fetch.request', model=self.model, max_tokens=self.max_tokens) as span:
+            stream = client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": self._get_system_prompt()},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.9,
-                max_tokens=2000
+                max_tokens=self.max_tokens,
+                stream=True,
+                stream_options={'include_usage': True}
             )
-            
-            art = response.choices[0].message.content
-            
-            # Ensure art fits within dimensions
-            lines = art.split('\n')
-            lines = lines[:self.height]
-            lines = [line[:self.width] for line in lines]
-            art = '\n'.join(lines)
-            
-            return {
-                'art': art,
-                'prompt': prompt,
-                'theme': self.theme,
-                'style': self.style
-            }
-            
-        except Exception as e:
-            raise Exception(f"Failed to fetch art from OpenAI: {str(e)}")
+            art_lines = ArtLines(self.width, self.height, on_line)
+            chunks = 0
+            received = 0
+            closed_early = False
+            # Leaving the block closes the connection, which stops generation
+            with stream:
+                for chunk in stream:
+                    if chunk.usage is not None:
+                        span.set(prompt_tokens=chunk.usage.prompt_tokens,
+                                 completion_tokens=chunk.usage.completion_tokens)
+                    text = chunk.choices[0].delta.content if chunk.choices else None
+                    if not text:
+                        continue
+                    chunks += 1
+                    received += len(text.encode('utf-8'))
+                    if art_lines.feed(text):
+                        closed_early = True
+                        break
+            art = art_lines.finish()
+            span.set(chunks=chunks, bytes=received, lines=len(art_lines.lines), closed_early=closed_early)
+        return art
     
     def _get_system_prompt(self) -> str:
         """Get the system prompt based on the style configuration"""
@@ -124,7 +398,6 @@ class ArtFetcher:
             ]
         }
         
-        import random
         theme_prompts = prompts.get(self.theme, prompts['cyberpunk'])
         base_prompt = random.choice(theme_prompts)
         
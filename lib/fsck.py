@@ -0,0 +1,399 @@
+"""Cache integrity check and repair"""
+
+import functools
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .cache import ART_SUFFIXES, ArtCache, content_id, index_entry
+
+# Fewer pieces than this are hashed in-process; starting workers costs more
+PARALLEL_MIN = 4096
+
+# Bytes read at once; art is a few KiB, so almost always one read
+READ_SIZE = 65536
+
+# Files in the cache directory that belong to a piece
+PIECE_SUFFIXES = (*ART_SUFFIXES.values(), '.json')
+
+# IDs derived from the art (see lib.cache.content_id); others were chosen
+# with `import --id` and have no hash to check
+CONTENT_ID = re.compile(r'[0-9a-f]{8}')
+
+# Problem kinds in report order, with what they mean
+PROBLEMS = (
+    ('counts', 'index header that miscounts its records'),
+    ('dangling', 'index entry without art'),
+    ('duplicate', 'ID listed more than once in the index'),
+    ('unreadable', 'art that cannot be read'),
+    ('mismatch', 'art whose content hash is not its ID'),
+    ('missing_metadata', 'indexed art without its .json'),
+    ('unindexed', 'pack record the ID lookup table does not find'),
+    ('orphan', 'art not in the index'),
+    ('orphan_metadata', '.json without art'),
+    ('temporary', 'temporary file left by an interrupted write'),
+)
+
+def scan(cache_dir: str) -> Tuple[Dict[str, set], List[str]]:
+    """Map each piece ID on disk to the suffixes of its files
+    
+    One os.scandir pass, which reads names and types from the directory
+    without a stat per file. Also returns temporary files left behind by
+    atomic writes (see lib.atomic).
+    """
+    pieces = {}
+    temporary = []
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            name = entry.name
+            if name.startswith('.'):
+                if name.endswith('.tmp'):
+                    temporary.append(name)
+                continue
+            stem, dot, suffix = name.rpartition('.')
+            if dot and f".{suffix}" in PIECE_SUFFIXES and entry.is_file():
+                pieces.setdefault(stem, set()).add(f".{suffix}")
+    return pieces, temporary
+
+def _read_file(name: str, directory: int) -> bytes:
+    """Read a whole file in a directory given by descriptor"""
+    fd = os.open(name, os.O_RDONLY, dir_fd=directory)
+    try:
+        chunks = [os.read(fd, READ_SIZE)]
+        # Regular files only return short at the end
+        while len(chunks[-1]) == READ_SIZE:
+            chunks.append(os.read(fd, READ_SIZE))
+    finally:
+        os.close(fd)
+    return b''.join(chunks)
+
+def _verify(cache_dir: str, pieces: List[Tuple[str, str, int, Optional[int]]]) -> List[Tuple[str, str, str]]:
+    """Hash the art of (ID, file name, offset, length) pieces
+    
+    A length of None reads the whole file. Returns (ID, problem, detail)
+    for pieces that cannot be read or whose content hash is not their ID.
+    """
+    codec = None
+    descriptors = {}
+    problems = []
+    # Raw descriptors relative to the directory are over twice as fast as
+    # open() per file
+    directory = os.open(cache_dir, os.O_RDONLY)
+    try:
+        for art_id, name, offset, length in pieces:
+            try:
+                if length is None:
+                    data = _read_file(name, directory)
+                else:
+                    if name not in descriptors:
+                        descriptors[name] = os.open(name, os.O_RDONLY, dir_fd=directory)
+                    data = os.pread(descriptors[name], length, offset)
+                    if len(data) < length:
+                        raise ValueError(f"{name} ends {length - len(data)} bytes early")
+                if name.endswith(ART_SUFFIXES['zlib']):
+                    if codec is None:
+                        from .compress import ArtCodec
+                        codec = ArtCodec(cache_dir)
+                    art = codec.decode(data)
+                else:
+                    art = data.decode('utf-8')
+            except Exception as e:
+                problems.append((art_id, 'unreadable', str(e) or type(e).__name__))
+                continue
+            if CONTENT_ID.fullmatch(art_id) and content_id(art) != art_id:
+                problems.append((art_id, 'mismatch', f"art hashes to {content_id(art)}"))
+    finally:
+        for fd in descriptors.values():
+            os.close(fd)
+        os.close(directory)
+    return problems
+
+def verify_all(cache_dir: str, pieces: List[tuple], jobs: Optional[int] = None) -> List[Tuple[str, str, str]]:
+    """Run _verify over pieces, in a worker pool unless there are only a few"""
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(pieces) < PARALLEL_MIN:
+        return _verify(cache_dir, pieces)
+    
+    # A few chunks per worker, as for bulk imports (lib.bulk)
+    size = -(-len(pieces) // (jobs * 4))
+    chunks = [pieces[start:start + size] for start in range(0, len(pieces), size)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return [problem for problems in pool.map(functools.partial(_verify, cache_dir), chunks)
+                for problem in problems]
+
+def _is_piece_metadata(cache_dir: str, art_id: str) -> bool:
+    """Check if <id>.json is a piece's metadata rather than a state file like usage.json"""
+    try:
+        with open(os.path.join(cache_dir, f"{art_id}.json"), 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return isinstance(data, dict) and data.get('id') == art_id
+
+def _loose_pieces(cache_dir: str, found: Dict[str, set], indexed) -> Tuple[Dict[str, str], List[str]]:
+    """Split per-file pieces not in the index into orphan art (ID -> file name) and orphan .json IDs"""
+    orphans = {}
+    orphan_metadata = []
+    for art_id, suffixes in found.items():
+        if art_id in indexed:
+            continue
+        art_suffix = next((suffix for suffix in ART_SUFFIXES.values() if suffix in suffixes), None)
+        if art_suffix is not None:
+            orphans[art_id] = f"{art_id}{art_suffix}"
+        elif _is_piece_metadata(cache_dir, art_id):
+            orphan_metadata.append(art_id)
+    return orphans, orphan_metadata
+
+def _remove(paths) -> int:
+    """Delete files, return how many existed"""
+    removed = 0
+    for path in paths:
+        try:
+            path.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+def _piece_files(files: ArtCache, art_id: str) -> list:
+    """Paths of a per-file piece's art and metadata"""
+    return [*files._art_files(art_id), files.cache_dir / f"{art_id}.json"]
+
+def _adopted_metadata(files: ArtCache, art_id: str, art: str) -> Dict:
+    """Metadata for orphan art: its own .json, or one made up from the art file"""
+    from .width import metrics
+    
+    metadata = files._read_item(art_id)
+    if metadata is None or metadata.get('id') != art_id:
+        art_file = next(path for path in files._art_files(art_id) if path.exists())
+        metadata = {'id': art_id, 'created': datetime.fromtimestamp(art_file.stat().st_mtime).isoformat(),
+                    'prompt': '', 'theme': '', 'style': ''}
+    if not metadata.get('metrics'):
+        metadata['metrics'] = metrics(art)
+    return metadata
+
+def check(cache: ArtCache, repair: bool = False, jobs: Optional[int] = None) -> Dict:
+    """Check a cache's index against the files on disk, repairing if asked
+    
+    Runs under the writer lock, so a save in progress never shows up as
+    orphans. Returns the backend, the number of pieces hashed, the problems
+    found as {kind: [(ID or file name, detail)]} in PROBLEMS order, the
+    seconds taken and, with repair, what was changed. Only the cache's own
+    directory is checked, not a system store it is layered over.
+    """
+    from .pack import PackedArtCache
+    
+    start = time.perf_counter()
+    with cache._writer_lock():
+        if isinstance(cache, PackedArtCache):
+            report = _check_pack(cache, repair, jobs)
+        else:
+            report = _check_files(cache, repair, jobs)
+    report['seconds'] = round(time.perf_counter() - start, 3)
+    return report
+
+def _report(backend: str, checked: int, problems: Dict[str, list]) -> Dict:
+    """Start a report, problems in PROBLEMS order without empty kinds"""
+    return {'backend': backend, 'checked': checked,
+            'problems': {kind: problems[kind] for kind, _ in PROBLEMS if problems.get(kind)}}
+
+def _check_files(cache: ArtCache, repair: bool, jobs: Optional[int]) -> Dict:
+    """Check the per-file backend, see check()"""
+    cache._load_metadata()
+    cache_dir = str(cache.cache_dir)
+    found, temporary = scan(cache_dir)
+    problems = {kind: [] for kind, _ in PROBLEMS}
+    problems['temporary'] = [(name, '') for name in temporary]
+    
+    # The last entry for an ID wins, as when a save replaces a piece
+    entries = {}
+    for item in cache.metadata['items']:
+        if item['id'] in entries:
+            problems['duplicate'].append((item['id'], ''))
+            del entries[item['id']]
+        entries[item['id']] = item
+    
+    # Suffixes in the order get_art_by_id tries them, without a Path per
+    # piece as _art_files() makes, which adds up over 100k pieces
+    primary = ART_SUFFIXES[cache.compression]
+    order = [primary, *(suffix for suffix in ART_SUFFIXES.values() if suffix != primary)]
+    pieces = []
+    for art_id in entries:
+        suffixes = found.get(art_id, ())
+        art_suffix = next((suffix for suffix in order if suffix in suffixes), None)
+        if art_suffix is None:
+            problems['dangling'].append((art_id, ''))
+            continue
+        if '.json' not in suffixes:
+            problems['missing_metadata'].append((art_id, ''))
+        pieces.append((art_id, f"{art_id}{art_suffix}", 0, None))
+    orphans, orphan_metadata = _loose_pieces(cache_dir, found, entries)
+    problems['orphan_metadata'] = [(art_id, '') for art_id in orphan_metadata]
+    pieces.extend((art_id, name, 0, None) for art_id, name in orphans.items())
+    
+    unreadable = set()
+    for art_id, kind, detail in verify_all(cache_dir, pieces, jobs):
+        problems[kind].append((art_id, detail))
+        if kind == 'unreadable':
+            unreadable.add(art_id)
+    problems['orphan'] = [(art_id, name) for art_id, name in orphans.items() if art_id not in unreadable]
+    
+    report = _report('files', len(pieces), problems)
+    if repair and report['problems']:
+        report['repaired'] = _repair_files(cache, entries, problems, unreadable, temporary)
+    return report
+
+def _repair_files(cache: ArtCache, entries: Dict[str, Dict], problems: Dict[str, list], unreadable: set,
+                  temporary: List[str]) -> Dict:
+    """Rebuild metadata.json from the pieces on disk
+    
+    Dangling and unreadable entries are dropped and duplicates collapsed,
+    orphan art is adopted and indexed art missing its .json gets one. The
+    new index is renamed into place before any file is removed. Adopted
+    pieces count towards CACHE_SIZE from the next save on.
+    """
+    from .width import metrics
+    
+    before = cache._index_stamp()
+    dropped = [art_id for art_id, _ in problems['dangling']] + [art_id for art_id in entries if art_id in unreadable]
+    items = {art_id: item for art_id, item in entries.items() if art_id not in dropped}
+    
+    writes = {}
+    for art_id, _ in problems['missing_metadata']:
+        if art_id in items:
+            metadata = dict(items[art_id], metrics=metrics(cache.get_art_by_id(art_id)))
+            metadata.pop('simhash', None)
+            writes[cache.cache_dir / f"{art_id}.json"] = json.dumps(metadata, indent=2)
+    adopted = []
+    for art_id, _ in problems['orphan']:
+        metadata = _adopted_metadata(cache, art_id, cache.get_art_by_id(art_id))
+        items[art_id] = index_entry(metadata)
+        adopted.append(items[art_id])
+        writes[cache.cache_dir / f"{art_id}.json"] = json.dumps(metadata, indent=2)
+    cache._write_files(writes)
+    
+    entry_count = len(cache.metadata['items'])
+    cache.metadata['items'] = sorted(items.values(), key=lambda item: item['created'])
+    cache._sim_index = None
+    cache._save_metadata()
+    # Repairs can rewrite art under its ID: render everything again
+    cache._refresh_compiled(None)
+    
+    removed = 0
+    for art_id in dropped + [art_id for art_id in unreadable if art_id not in entries]:
+        removed += _remove(_piece_files(cache, art_id))
+        cache._discard_rendered(art_id)
+    removed += _remove(cache.cache_dir / f"{art_id}.json" for art_id, _ in problems['orphan_metadata'])
+    removed += _remove(cache.cache_dir / name for name in temporary)
+    cache._refresh_search(before, adopted, dropped)
+    return {'adopted': len(adopted), 'dropped': entry_count - (len(items) - len(adopted)),
+            'metadata_restored': sum(1 for art_id, _ in problems['missing_metadata'] if art_id in items),
+            'files_removed': removed}
+
+def _check_pack(cache, repair: bool, jobs: Optional[int]) -> Dict:
+    """Check the pack backend, see check()"""
+    from .pack import FLAG_DELETED, INDEX_HEADER, PACK_HEADER, RECORD
+    
+    cache._invalidate()
+    records, live = cache._header()
+    pack_size = os.fstat(cache._pack_fd).st_size
+    cache_dir = str(cache.cache_dir)
+    found, temporary = scan(cache_dir)
+    problems = {kind: [] for kind, _ in PROBLEMS}
+    problems['temporary'] = [(name, '') for name in temporary]
+    
+    # Live records by ID, the last one winning as for the files backend
+    slots = {}
+    live_count = 0
+    data = cache._mapped_index()[INDEX_HEADER.size:INDEX_HEADER.size + records * RECORD.size]
+    for slot, record in enumerate(RECORD.iter_unpack(data)):
+        if record[7] & FLAG_DELETED:
+            continue
+        live_count += 1
+        art_id = record[0].rstrip(b'\0').decode('utf-8', 'replace')
+        offset, art_len, prompt_len, metrics_len = record[1], record[2], record[3], record[9]
+        if offset < PACK_HEADER.size or offset + art_len + prompt_len + metrics_len > pack_size:
+            problems['dangling'].append((art_id, f"record {slot} points past the end of art.pack"))
+            continue
+        if art_id in slots:
+            problems['duplicate'].append((art_id, ''))
+            del slots[art_id]
+        slots[art_id] = (slot, offset, art_len)
+    if live != live_count:
+        # The header count is what size() reports
+        problems['counts'].append(('art.idx', f"header counts {live} live records, the index holds {live_count}"))
+    
+    pieces = []
+    duplicates = {art_id for art_id, _ in problems['duplicate']}
+    for art_id, (slot, offset, art_len) in slots.items():
+        pieces.append((art_id, 'art.pack', offset, art_len))
+        # The table finds one of several records with the same ID
+        if art_id not in duplicates and cache._find_slot(art_id) != slot:
+            problems['unindexed'].append((art_id, f"record {slot}"))
+    # Per-file pieces in a pack directory, e.g. left by an interrupted migrate
+    orphans, orphan_metadata = _loose_pieces(cache_dir, found, ())
+    problems['orphan_metadata'] = [(art_id, '') for art_id in orphan_metadata]
+    pieces.extend((art_id, name, 0, None) for art_id, name in orphans.items() if art_id not in slots)
+    
+    unreadable = set()
+    for art_id, kind, detail in verify_all(cache_dir, pieces, jobs):
+        problems[kind].append((art_id, detail))
+        if kind == 'unreadable':
+            unreadable.add(art_id)
+    problems['orphan'] = [(art_id, f"{name}, already in the pack" if art_id in slots else name)
+                          for art_id, name in orphans.items() if art_id in slots or art_id not in unreadable]
+    
+    report = _report('pack', len(pieces), problems)
+    if repair and report['problems']:
+        report['repaired'] = _repair_pack(cache, slots, live_count, orphans, problems, unreadable, temporary)
+    return report
+
+def _repair_pack(cache, slots: Dict[str, tuple], live_count: int, orphans: Dict[str, str],
+                 problems: Dict[str, list], unreadable: set, temporary: List[str]) -> Dict:
+    """Rewrite the pack from its readable records and adopt loose pieces
+    
+    The pack, lookup table and index are only rewritten, as a new
+    generation, if one of them has a problem. Loose pieces the pack
+    already holds are removed, the others appended to it first.
+    """
+    from .pack import FLAG_PINNED
+    from .similarity import fingerprint
+    
+    before = cache._index_stamp()
+    kept = sorted(slot for art_id, (slot, _, _) in slots.items() if art_id not in unreadable)
+    if any(problems[kind] for kind in ('counts', 'dangling', 'duplicate', 'unindexed')) or len(kept) < len(slots):
+        cache._compact(kept)
+        cache._invalidate()
+    dropped = [art_id for art_id, _ in problems['dangling'] if art_id not in slots]
+    dropped += [art_id for art_id in slots if art_id in unreadable]
+    
+    files = ArtCache(cache.cache_dir)
+    entries = []
+    adopted = []
+    for art_id, _ in problems['orphan']:
+        if art_id in slots:
+            continue
+        art = files.get_art_by_id(art_id)
+        metadata = _adopted_metadata(files, art_id, art)
+        entries.append((art_id, art, metadata.get('prompt', ''), metadata.get('theme', ''),
+                        metadata.get('style', ''), datetime.fromisoformat(metadata['created']).timestamp(),
+                        fingerprint(art), metadata['metrics'], FLAG_PINNED if metadata.get('pinned') else 0))
+        adopted.append(index_entry(metadata))
+    if entries:
+        cache._append_many(entries)
+    cache._sim_index = None
+    cache._refresh_compiled(None)
+    
+    # Everything loose is in the pack now, or unreadable
+    removed = sum(_remove(_piece_files(files, art_id)) for art_id in orphans)
+    removed += _remove(cache.cache_dir / f"{art_id}.json" for art_id, _ in problems['orphan_metadata'])
+    removed += _remove(cache.cache_dir / name for name in temporary)
+    for art_id in dropped:
+        cache._discard_rendered(art_id)
+    cache._refresh_search(before, adopted, dropped)
+    return {'adopted': len(adopted), 'dropped': live_count - len(kept), 'metadata_restored': 0,
+            'files_removed': removed}
@@ -0,0 +1,160 @@
+"""Per-cell colour gradients rendered with NumPy"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+DIRECTIONS = ('vertical', 'horizontal', 'diagonal', 'radial')
+DEPTHS = ('truecolor', '256')
+
+# Terminal cells are roughly twice as tall as they are wide
+CELL_ASPECT = 2.0
+
+# xterm's default RGB values for the 16 ANSI colours used by theme tables
+ANSI_RGB = {
+    'black': (0, 0, 0),
+    'red': (205, 0, 0),
+    'green': (0, 205, 0),
+    'yellow': (205, 205, 0),
+    'blue': (0, 0, 238),
+    'magenta': (205, 0, 205),
+    'cyan': (0, 205, 205),
+    'white': (229, 229, 229),
+    'bright_black': (127, 127, 127),
+    'bright_red': (255, 0, 0),
+    'bright_green': (0, 255, 0),
+    'bright_yellow': (255, 255, 0),
+    'bright_blue': (92, 92, 255),
+    'bright_magenta': (255, 0, 255),
+    'bright_cyan': (0, 255, 255),
+    'bright_white': (255, 255, 255),
+}
+
+# Levels of the 6x6x6 colour cube in the 256-colour palette
+CUBE_LEVELS = np.array([0, 95, 135, 175, 215, 255])
+
+def color_grid(rows: int, cols: int, stops: Sequence[Tuple[int, int, int]],
+               direction: str = 'vertical') -> np.ndarray:
+    """Compute a (rows, cols, 3) RGB grid blending evenly spaced colour stops"""
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Unknown gradient direction '{direction}' (expected {', '.join(DIRECTIONS)})")
+    y = np.linspace(0.0, 1.0, rows)[:, None] if rows > 1 else np.zeros((1, 1))
+    x = np.linspace(0.0, 1.0, cols)[None, :] if cols > 1 else np.zeros((1, 1))
+    
+    if direction == 'vertical':
+        t = np.broadcast_to(y, (rows, cols))
+    elif direction == 'horizontal':
+        t = np.broadcast_to(x, (rows, cols))
+    elif direction == 'diagonal':
+        # Weight rows by the cell aspect so the bands run at 45 degrees on screen
+        height = rows * CELL_ASPECT
+        t = (y * height + x * cols) / (height + cols)
+    else:
+        dy = (y - 0.5) * rows * CELL_ASPECT
+        dx = (x - 0.5) * cols
+        t = np.hypot(dy, dx)
+        t = t / t.max() if t.max() > 0 else t
+    
+    stops = np.asarray(stops, dtype=np.float64)
+    positions = np.linspace(0.0, 1.0, len(stops))
+    grid = np.empty((rows, cols, 3), dtype=np.float64)
+    for channel in range(3):
+        grid[..., channel] = np.interp(t, positions, stops[:, channel])
+    return np.rint(grid).astype(np.uint8)
+
+def quantise_256(grid: np.ndarray) -> np.ndarray:
+    """Map an RGB grid to the nearest 256-colour palette indices
+    
+    Each cell is matched to the closest colour cube entry and the closest
+    grey ramp entry, whichever is nearer wins.
+    """
+    rgb = grid.astype(np.int32)
+    
+    # Nearest cube level per channel
+    levels = np.abs(rgb[..., None] - CUBE_LEVELS).argmin(axis=-1)
+    cube = CUBE_LEVELS[levels]
+    cube_index = 16 + 36 * levels[..., 0] + 6 * levels[..., 1] + levels[..., 2]
+    cube_error = ((rgb - cube) ** 2).sum(axis=-1)
+    
+    # Grey ramp 232-255 covers 8, 18, ..., 238
+    grey_step = np.clip(np.rint((rgb.mean(axis=-1) - 8) / 10), 0, 23).astype(np.int32)
+    grey = (8 + 10 * grey_step)[..., None]
+    grey_error = ((rgb - grey) ** 2).sum(axis=-1)
+    
+    return np.where(grey_error < cube_error, 232 + grey_step, cube_index)
+
+def render(art: str, stops: Sequence[Tuple[int, int, int]], direction: str = 'vertical',
+           depth: str = 'truecolor') -> str:
+    """Colour art with a gradient, emitting one SGR sequence per colour run
+    
+    Whitespace takes the colour of the cell before it, so runs only break
+    where a visible character changes colour. The colour carries across
+    line breaks and is reset once at the end. The grid is laid out in
+    terminal columns (see lib.width), so a wide character takes the colour
+    of its first cell and the characters after it stay in their columns.
+    """
+    if depth not in DEPTHS:
+        raise ValueError(f"Unknown colour depth '{depth}' (expected {', '.join(DEPTHS)})")
+    lines = art.split('\n')
+    rows = len(lines)
+    if art.isascii():
+        starts = [np.arange(len(line)) for line in lines]
+        cols = max((len(line) for line in lines), default=0)
+    else:
+        from .width import char_columns
+        
+        # Column each character starts in
+        starts = []
+        cols = 0
+        for line in lines:
+            widths = np.array(char_columns(line), dtype=np.int64)
+            starts.append(np.cumsum(widths) - widths)
+            cols = max(cols, int(widths.sum()))
+    if cols == 0:
+        return art
+    
+    grid = color_grid(rows, cols, stops, direction)
+    if depth == 'truecolor':
+        rgb = grid.astype(np.uint32)
+        codes = (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+    else:
+        codes = quantise_256(grid)
+    
+    # One code per character of art, newlines included, in reading order;
+    # zero-width characters at the end of the widest line sit past its
+    # last column
+    codes = np.concatenate([np.append(row[np.minimum(start, cols - 1)], 0)
+                            for row, start in zip(codes, starts)])[:-1]
+    chars = np.frombuffer(art.encode('utf-32-le'), dtype=np.uint32)
+    visible = ~np.isin(chars, (0x20, 0x0a, 0x09, 0x3000, 0x2800))
+    if not visible.any():
+        return art
+    
+    # Forward-fill blanks with the colour of the last visible character;
+    # leading blanks take the colour of the first one
+    last_visible = np.maximum.accumulate(np.where(visible, np.arange(len(codes)), -1))
+    first = int(np.argmax(visible))
+    codes = codes[np.where(last_visible >= 0, last_visible, first)]
+    
+    starts = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    bounds = [0, *starts.tolist(), len(codes)]
+    run_codes = codes[bounds[:-1]].tolist()
+    
+    sequences: Dict[int, str] = {}
+    out: List[str] = []
+    for code, start, end in zip(run_codes, bounds, bounds[1:]):
+        sgr = sequences.get(code)
+        if sgr is None:
+            if depth == 'truecolor':
+                sgr = f"\033[38;2;{code >> 16};{(code >> 8) & 0xff};{code & 0xff}m"
+            else:
+                sgr = f"\033[38;5;{code}m"
+            sequences[code] = sgr
+        out.append(sgr)
+        out.append(art[start:end])
+    out.append('\033[0m')
+    return ''.join(out)
+
+def theme_stops(color_names: Sequence[str]) -> List[Tuple[int, int, int]]:
+    """Convert a theme's ANSI colour names into RGB gradient stops"""
+    return [ANSI_RGB[name] for name in color_names if name in ANSI_RGB]
@@ -0,0 +1,211 @@
+"""A user's cache layered over a shared read-only system store"""
+
+import json
+import random
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .cache import ArtCache, content_id
+
+class LayeredStore:
+    """Mixin reading a writable cache (the overlay) over a read-only base
+    
+    The base is a SYSTEM_STORE that an administrator fills with
+    `main.py --system fetch` or `import_art.py --system`; every user's
+    CACHE_DIR is an overlay on it. Nothing is merged when the cache is
+    opened:
+        
+        rotation  positions are the base's followed by the overlay's, so
+                  a pick maps to one layer in O(1)
+        reads     go to the overlay first, then the base
+        writes    go to the overlay; pieces already in the base are not
+                  saved again, so no ID is stored twice
+        deletes   of base pieces hide them for this user (hidden.json in
+                  the overlay), they are never removed from the store
+    
+    Eviction, pinning and recompress only apply to the overlay.
+    """
+    
+    def __init__(self, cache_dir: Path, base: ArtCache):
+        """Initialize the layered cache, overlay in cache_dir"""
+        self.base = base
+        self.hidden_file = Path(cache_dir) / 'hidden.json'
+        self._load_hidden()
+        super().__init__(cache_dir)
+    
+    def _load_hidden(self):
+        """Read the base pieces this user deleted"""
+        try:
+            with open(self.hidden_file, 'r') as f:
+                self.hidden = set(json.load(f))
+        except FileNotFoundError:
+            self.hidden = set()
+        self._hidden_count = None
+    
+    def _hidden_in_base(self) -> int:
+        """Count hidden pieces the store still has, counted once per load"""
+        if self._hidden_count is None:
+            self._hidden_count = sum(1 for art_id in self.hidden if self.base._contains(art_id))
+        return self._hidden_count
+    
+    def _in_base(self, art_id: str) -> bool:
+        """Check if a piece is visible from the base"""
+        return art_id not in self.hidden and self.base._contains(art_id)
+    
+    def _index_stamp(self):
+        """Identify the state of both layers and the hidden set"""
+        return super()._index_stamp(), self.base._index_stamp(), len(self.hidden)
+    
+    def _reload(self):
+        """Re-read both layers after a concurrent writer changed them"""
+        super()._reload()
+        self.base._reload()
+        self._load_hidden()
+    
+    def size(self) -> int:
+        """Get number of visible pieces in both layers"""
+        return self.base.size() - self._hidden_in_base() + super().size()
+    
+    def is_empty(self) -> bool:
+        """Check if neither layer has a visible piece"""
+        return self.size() == 0
+    
+    def ids(self) -> List[str]:
+        """Get IDs of visible pieces, the base's first, each layer oldest first"""
+        return [art_id for art_id in self.base.ids() if art_id not in self.hidden] + super().ids()
+    
+    @staticmethod
+    def _epoch(created) -> float:
+        """Creation time as epoch seconds, from either backend's index"""
+        return created if isinstance(created, float) else datetime.fromisoformat(created).timestamp()
+    
+    # Rotation positions: [0, base size) are the base's, the rest the overlay's
+    
+    def _rotation_size(self) -> int:
+        """Number of rotation positions over both layers"""
+        return self.base._rotation_size() + super()._rotation_size()
+    
+    def _rotation_entry(self, position: int) -> Tuple[str, float, bool]:
+        """Return (ID, created epoch, live) for a position in either layer"""
+        split = self.base._rotation_size()
+        if position >= split:
+            return super()._rotation_entry(position - split)
+        art_id, created, live = self.base._rotation_entry(position)
+        return art_id, created, live and art_id not in self.hidden
+    
+    def _rotation_theme(self, position: int) -> str:
+        """Return the theme of the piece at a position in either layer"""
+        split = self.base._rotation_size()
+        if position >= split:
+            return super()._rotation_theme(position - split)
+        return self.base._rotation_theme(position)
+    
+    def get_random_entry(self) -> Optional[Tuple[str, str]]:
+        """Get the ID and art of a random visible piece from either layer"""
+        for _ in range(16):
+            size = self._rotation_size()
+            if not size:
+                return None
+            art_id, _, live = self._rotation_entry(random.randrange(size))
+            if live:
+                art = self.get_art_by_id(art_id)
+                if art is not None:
+                    return art_id, art
+        return super().get_random_entry()
+    
+    def get_art_by_id(self, art_id: str) -> Optional[str]:
+        """Get art by ID from the overlay, or else the base"""
+        art = super().get_art_by_id(art_id)
+        if art is None and art_id not in self.hidden:
+            art = self.base.get_art_by_id(art_id)
+        return art
+    
+    def get_metrics(self, art_id: str) -> Optional[Dict]:
+        """Get a piece's display metrics from the layer that holds it"""
+        art_metrics = super().get_metrics(art_id)
+        if art_metrics is None and art_id not in self.hidden:
+            art_metrics = self.base.get_metrics(art_id)
+        return art_metrics
+    
+    # Listings merge the layers by creation time as they stream
+    
+    def _index_entries(self, reverse: bool = False) -> Iterator[Tuple[float, str, tuple]]:
+        """Yield (created epoch, theme, (layer, handle)) over both layers"""
+        import heapq
+        
+        def tagged(layer, entries):
+            for created, theme, handle in entries:
+                yield self._epoch(created), theme, (layer, handle)
+        
+        return heapq.merge(tagged(self.base, self.base._index_entries(reverse)),
+                           tagged(None, super()._index_entries(reverse)),
+                           key=lambda entry: entry[0], reverse=reverse)
+    
+    def _entry_item(self, handle: tuple) -> Optional[Dict]:
+        """Get the listing for an entry of either layer; base pieces are marked"""
+        layer, handle = handle
+        if layer is None:
+            return super()._entry_item(handle)
+        item = layer._entry_item(handle)
+        if item is None or item['id'] in self.hidden:
+            return None
+        item['system'] = True
+        return item
+    
+    # Writes
+    
+    def save_many(self, art_items: List[Dict[str, str]]) -> List[str]:
+        """Save pieces to the overlay, skipping those the base already has
+        
+        Skipped pieces are returned under their base ID and recorded in
+        last_rejected like near-duplicates.
+        """
+        art_ids: List[Optional[str]] = []
+        fresh = []
+        for art_data in art_items:
+            art_id = art_data.get('id') or content_id(art_data['art'])
+            if self._in_base(art_id):
+                art_ids.append(art_id)
+            else:
+                art_ids.append(None)
+                fresh.append(art_data)
+        
+        saved = iter(super().save_many(fresh) if fresh else [])
+        if not fresh:
+            self.last_rejected = []
+            self.last_evicted = []
+        in_base = [art_id for art_id in art_ids if art_id is not None]
+        self.last_rejected = self.last_rejected + in_base
+        return [art_id if art_id is not None else next(saved) for art_id in art_ids]
+    
+    def delete_art_by_id(self, art_id: str) -> bool:
+        """Delete a piece from the overlay, or hide a base piece from this user"""
+        if super().delete_art_by_id(art_id):
+            return True
+        if not self._in_base(art_id):
+            return False
+        
+        with self._writer_lock():
+            before = self._index_stamp()
+            self._load_hidden()
+            self.hidden.add(art_id)
+            self._write_file(self.hidden_file, json.dumps(sorted(self.hidden)))
+            self._load_hidden()
+            self._refresh_compiled(before)
+            self._discard_rendered(art_id)
+            self._refresh_search(before, removed=[art_id])
+        return True
+    
+    def set_pinned(self, art_id: str, pinned: bool = True) -> bool:
+        """Pin an overlay piece; base pieces are never evicted and need no pin"""
+        return super().set_pinned(art_id, pinned) or self._in_base(art_id)
+    
+    def layer_status(self) -> Dict:
+        """Return the store location and piece counts per layer"""
+        hidden = self._hidden_in_base()
+        return {'store': str(self.base.cache_dir), 'system': self.base.size() - hidden,
+                'hidden': hidden, 'own': super().size()}
+
+class LayeredArtCache(LayeredStore, ArtCache):
+    """Per-file cache layered over a system store"""
@@ -0,0 +1,803 @@
+"""Packed single-file art store with a memory-mapped offset index"""
+
+import os
+import json
+import mmap
+import time
+import random
+import struct
+import tempfile
+import zlib
+from datetime import datetime
+from itertools import chain
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple, Iterable, Iterator
+
+from . import trace
+from .cache import ArtCache, _cache_bytes, default_cache_dir, index_entry
+from .layers import LayeredStore
+
+# art.idx: header followed by fixed-width records, one per saved piece
+INDEX_HEADER = struct.Struct('<8sIIQ')         # magic, records, live records, generation
+INDEX_MAGIC = b'MOTDIDX4'
+# id, pack offset, art length, prompt length, created (epoch), theme, style, flags,
+# simhash fingerprint (see lib.similarity), display metrics length
+RECORD = struct.Struct('<16sQIIdHHH2xQI')
+FLAG_DELETED = 1
+FLAG_PINNED = 2
+# Columns read across all records for the eviction budgets: the low byte
+# of flags, and the art length
+FLAGS_OFFSET = struct.calcsize('<16sQIIdHH')
+ART_LENGTH = struct.Struct(f"<{struct.calcsize('<16sQ')}xI{RECORD.size - struct.calcsize('<16sQI')}x")
+# Low flags byte -> 1 for a live record eviction may remove
+EVICTABLE = bytes(int(not flags & (FLAG_DELETED | FLAG_PINNED)) for flags in range(256))
+# Older index formats: magic -> (record layout, defaults for the missing fields)
+OLD_INDEX_FORMATS = {
+    b'MOTDIDX2': (struct.Struct('<16sQIIdHHH2x'), (0, 0)),
+    b'MOTDIDX3': (struct.Struct('<16sQIIdHHH2xQ'), (0,)),
+}
+
+# art.pack: header followed by art bodies, each followed by its prompt and
+# its display metrics (compact JSON, see lib.width.metrics)
+PACK_HEADER = struct.Struct('<8sQ')            # magic, generation
+PACK_MAGIC = b'MOTDPAK2'
+
+# art.hash: open-addressed id -> record slot table (slot + 1, 0 means empty)
+HASH_HEADER = struct.Struct('<8sIQ')           # magic, capacity, generation
+HASH_MAGIC = b'MOTDHSH2'
+HASH_SLOT = struct.Struct('<I')
+
+class PackedArtCache(ArtCache):
+    """ArtCache backend storing all pieces in one append-only pack file
+    
+    Files in the cache directory:
+        
+        art.pack   art body followed by its prompt, appended per piece
+        art.idx    fixed-width records (see RECORD) addressed by slot number
+        art.hash   id lookup table into art.idx
+        pack.json  theme and style string tables referenced by record codes
+    
+    Random picks and by-id lookups read one record from the mmapped index
+    and do a single read from the pack, without any JSON parsing. Deletes
+    only flag the record; the pack is compacted once most of it is dead.
+    
+    Writers hold the cache writer lock. Appended records only become visible
+    when the index header count is bumped, and compaction writes a new
+    generation of all three files and renames them into place. Readers open
+    the three files together and retry if their generations don't match.
+    """
+    
+    def __init__(self, cache_dir: str = None):
+        """Initialize the PackedArtCache with a cache directory"""
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_size = int(os.getenv('CACHE_SIZE', '10'))
+        self.cache_bytes = _cache_bytes()
+        self.pack_file = self.cache_dir / 'art.pack'
+        self.index_file = self.cache_dir / 'art.idx'
+        self.hash_file = self.cache_dir / 'art.hash'
+        self.tables_file = self.cache_dir / 'pack.json'
+        self._index = None
+        self._pack_fd = None
+        self._hash_fd = None
+        self._hash_capacity = 0
+        self._tables = None
+        self.dedup_mode = os.getenv('DEDUP_MODE', 'reject').lower()
+        self.last_rejected = []
+        self.last_evicted = []
+        self._sim_index = None
+        self._sim_stamp = None
+        
+        if not self.index_file.exists():
+            with self._writer_lock():
+                if not self.index_file.exists():
+                    self._write_generation([], [], [])
+        self._upgrade_index()
+    
+    def _upgrade_index(self):
+        """Rewrite an index of an older format with the new fields empty
+        
+        Records without a fingerprint are fingerprinted from their art when
+        the similarity index is built; missing metrics are measured on read.
+        """
+        with open(self.index_file, 'rb') as f:
+            if f.read(len(INDEX_MAGIC)) not in OLD_INDEX_FORMATS:
+                return
+        with self._writer_lock():
+            data = self.index_file.read_bytes()
+            magic, records, live, generation = INDEX_HEADER.unpack_from(data, 0)
+            if magic not in OLD_INDEX_FORMATS:
+                return
+            old_record, defaults = OLD_INDEX_FORMATS[magic]
+            upgraded = [INDEX_HEADER.pack(INDEX_MAGIC, records, live, generation)]
+            for slot in range(records):
+                record = old_record.unpack_from(data, INDEX_HEADER.size + slot * old_record.size)
+                upgraded.append(RECORD.pack(*record, *defaults))
+            self._write_file(self.index_file, b''.join(upgraded))
+    
+    # Snapshot of the current generation
+    
+    @trace.traced('cache.open_snapshot')
+    def _open_snapshot(self):
+        """Open index, pack and hash table of the same generation"""
+        for _ in range(20):
+            index_fd = os.open(self.index_file, os.O_RDONLY)
+            pack_fd = os.open(self.pack_file, os.O_RDONLY)
+            hash_fd = os.open(self.hash_file, os.O_RDONLY)
+            index = mmap.mmap(index_fd, 0, access=mmap.ACCESS_READ)
+            os.close(index_fd)
+            
+            magic, _, _, generation = INDEX_HEADER.unpack_from(index, 0)
+            _, pack_generation = PACK_HEADER.unpack(os.pread(pack_fd, PACK_HEADER.size, 0))
+            _, capacity, hash_generation = HASH_HEADER.unpack(os.pread(hash_fd, HASH_HEADER.size, 0))
+            
+            if magic == INDEX_MAGIC and generation == pack_generation == hash_generation:
+                self._index, self._pack_fd, self._hash_fd = index, pack_fd, hash_fd
+                self._hash_capacity = capacity
+                return
+            
+            index.close()
+            os.close(pack_fd)
+            os.close(hash_fd)
+            if magic != INDEX_MAGIC:
+                raise ValueError(f"{self.index_file} is not a MOTD Artisan index")
+            # Caught a compaction between renames, try again
+            time.sleep(0.001)
+        raise RuntimeError(f"Pack files in {self.cache_dir} keep changing")
+    
+    def _mapped_index(self) -> mmap.mmap:
+        """Return the read-only mmap of art.idx, opening a snapshot if needed"""
+        if self._index is None:
+            self._open_snapshot()
+        return self._index
+    
+    def _invalidate(self):
+        """Drop the snapshot so the next read sees the latest generation"""
+        if self._index is not None:
+            self._index.close()
+            os.close(self._pack_fd)
+            os.close(self._hash_fd)
+            self._index = None
+            self._pack_fd = None
+            self._hash_fd = None
+    
+    def _header(self) -> Tuple[int, int]:
+        """Return (record count, live record count)"""
+        index = self._mapped_index()
+        _, records, live, _ = INDEX_HEADER.unpack_from(index, 0)
+        if INDEX_HEADER.size + records * RECORD.size > len(index):
+            # Records were appended after the file was mapped, map it again
+            self._invalidate()
+            index = self._mapped_index()
+            _, records, live, _ = INDEX_HEADER.unpack_from(index, 0)
+            records = min(records, (len(index) - INDEX_HEADER.size) // RECORD.size)
+        return records, live
+    
+    def _generation(self) -> int:
+        return INDEX_HEADER.unpack_from(self._mapped_index(), 0)[3]
+    
+    def _record(self, slot: int):
+        """Unpack the index record at a slot"""
+        return RECORD.unpack_from(self._mapped_index(), INDEX_HEADER.size + slot * RECORD.size)
+    
+    def _read_body(self, record) -> str:
+        """Read the art text for a record with a single pread"""
+        offset, art_len = record[1], record[2]
+        self._mapped_index()
+        return os.pread(self._pack_fd, art_len, offset).decode('utf-8')
+    
+    @staticmethod
+    def _encode_id(art_id: str) -> bytes:
+        """Encode an art ID into the fixed-width record field"""
+        encoded = art_id.encode('utf-8')
+        if len(encoded) > 16:
+            raise ValueError(f"Art ID '{art_id}' is longer than 16 bytes")
+        return encoded
+    
+    # Id hash table
+    
+    @staticmethod
+    def _hash(id_bytes: bytes) -> int:
+        return zlib.crc32(id_bytes)
+    
+    @staticmethod
+    def _hash_capacity_for(count: int) -> int:
+        capacity = 64
+        while capacity < count * 4:
+            capacity *= 2
+        return capacity
+    
+    @classmethod
+    def _build_hash(cls, entries: List[tuple], generation: int) -> bytes:
+        """Build the hash table file for (slot, id bytes) entries"""
+        capacity = cls._hash_capacity_for(len(entries))
+        table = [0] * capacity
+        mask = capacity - 1
+        for slot, id_bytes in entries:
+            pos = cls._hash(id_bytes) & mask
+            while table[pos]:
+                pos = (pos + 1) & mask
+            table[pos] = slot + 1
+        return HASH_HEADER.pack(HASH_MAGIC, capacity, generation) + struct.pack(f'<{capacity}I', *table)
+    
+    def _find_slot(self, art_id: str) -> Optional[int]:
+        """Return the live record slot for an ID, or None"""
+        try:
+            id_bytes = self._encode_id(art_id)
+        except ValueError:
+            return None
+        
+        records, _ = self._header()
+        mask = self._hash_capacity - 1
+        pos = self._hash(id_bytes) & mask
+        while True:
+            position = HASH_HEADER.size + pos * HASH_SLOT.size
+            (entry,) = HASH_SLOT.unpack(os.pread(self._hash_fd, HASH_SLOT.size, position))
+            if not entry:
+                return None
+            # Slots past the record count belong to an append not yet published
+            if entry - 1 < records:
+                record = self._record(entry - 1)
+                if record[0].rstrip(b'\0') == id_bytes and not record[7] & FLAG_DELETED:
+                    return entry - 1
+            pos = (pos + 1) & mask
+    
+    def _hash_insert(self, new_entries: List[tuple], records: int):
+        """Add (slot, id bytes) entries to the hash table of `records` records"""
+        if records * 2 > self._hash_capacity:
+            # Grow: rebuild from the index file, which holds the new records
+            with open(self.index_file, 'rb') as f:
+                data = f.read(INDEX_HEADER.size + records * RECORD.size)
+            entries = [
+                (slot, RECORD.unpack_from(data, INDEX_HEADER.size + slot * RECORD.size)[0].rstrip(b'\0'))
+                for slot in range(records)
+            ]
+            self._write_file(self.hash_file, self._build_hash(entries, self._generation()))
+            return
+        
+        mask = self._hash_capacity - 1
+        fd = os.open(self.hash_file, os.O_RDWR)
+        try:
+            for slot, id_bytes in new_entries:
+                pos = self._hash(id_bytes) & mask
+                while True:
+                    position = HASH_HEADER.size + pos * HASH_SLOT.size
+                    (entry,) = HASH_SLOT.unpack(os.pread(fd, HASH_SLOT.size, position))
+                    if not entry:
+                        os.pwrite(fd, HASH_SLOT.pack(slot + 1), position)
+                        break
+                    pos = (pos + 1) & mask
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    # Theme/style string tables
+    
+    def _load_tables(self) -> Dict[str, List[str]]:
+        if self._tables is None:
+            try:
+                with open(self.tables_file, 'r') as f:
+                    self._tables = json.load(f)
+            except FileNotFoundError:
+                self._tables = {'themes': [], 'styles': []}
+        return self._tables
+    
+    def _table_value(self, table: str, code: int) -> str:
+        """Look up a theme/style code, reloading if it is newer than our copy"""
+        values = self._load_tables()[table]
+        if code >= len(values):
+            self._tables = None
+            values = self._load_tables()[table]
+        return values[code] if code < len(values) else ''
+    
+    def _code_for(self, table: str, value: str) -> int:
+        """Return the code for a theme/style string, adding it if new"""
+        values = self._load_tables()[table]
+        if value not in values:
+            # Codes are only ever appended, so readers of older records stay valid
+            values.append(value)
+            self._write_file(self.tables_file, json.dumps(self._tables, indent=2))
+        return values.index(value)
+    
+    # Writes, all called with the writer lock held
+    
+    def _write_generation(self, bodies: Iterable[bytes], records: List[bytes], entries: List[tuple]):
+        """Publish a new generation of pack, hash table and index
+        
+        `bodies` are written to the new pack first; `records` and `entries`
+        (packed index records and (slot, id bytes) pairs) may be filled while
+        `bodies` is consumed.
+        """
+        generation = time.time_ns()
+        from .atomic import file_mode
+        
+        fd, tmp_pack = tempfile.mkstemp(dir=self.cache_dir, prefix='.art.pack.', suffix='.tmp')
+        os.fchmod(fd, file_mode())
+        with os.fdopen(fd, 'wb') as f:
+            f.write(PACK_HEADER.pack(PACK_MAGIC, generation))
+            for chunk in bodies:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        self._invalidate()
+        os.replace(tmp_pack, self.pack_file)
+        self._write_file(self.hash_file, self._build_hash(entries, generation))
+        self._write_file(self.index_file,
+                         INDEX_HEADER.pack(INDEX_MAGIC, len(records), len(records), generation)
+                         + b''.join(records))
+    
+    def _append_many(self, entries: List[tuple]):
+        """Append (id, art, prompt, theme, style, created, simhash, metrics, flags) entries
+        
+        Bodies and index records are written and synced first; bumping the
+        header count is what publishes them to readers. Records replaced by
+        a new piece with the same ID are flagged deleted afterwards.
+        """
+        self._invalidate()
+        records, live = self._header()
+        
+        replaced = []
+        new_slots = {}
+        index_data = []
+        hash_entries = []
+        with open(self.pack_file, 'ab') as pack:
+            offset = pack.tell()
+            for art_id, art, prompt, theme, style, created, simhash, art_metrics, flags in entries:
+                id_bytes = self._encode_id(art_id)
+                old_slot = new_slots[art_id] if art_id in new_slots else self._find_slot(art_id)
+                if old_slot is not None:
+                    replaced.append(old_slot)
+                
+                art_bytes = art.encode('utf-8')
+                prompt_bytes = prompt.encode('utf-8')
+                metrics_bytes = json.dumps(art_metrics, separators=(',', ':')).encode('utf-8')
+                pack.write(art_bytes + prompt_bytes + metrics_bytes)
+                
+                slot = records + len(index_data)
+                index_data.append(RECORD.pack(id_bytes, offset, len(art_bytes), len(prompt_bytes), created,
+                                              self._code_for('themes', theme),
+                                              self._code_for('styles', style), flags, simhash,
+                                              len(metrics_bytes)))
+                hash_entries.append((slot, id_bytes))
+                new_slots[art_id] = slot
+                offset += len(art_bytes) + len(prompt_bytes) + len(metrics_bytes)
+            pack.flush()
+            os.fsync(pack.fileno())
+        
+        total = records + len(index_data)
+        fd = os.open(self.index_file, os.O_RDWR)
+        try:
+            os.pwrite(fd, b''.join(index_data), INDEX_HEADER.size + records * RECORD.size)
+            os.fsync(fd)
+            self._hash_insert(hash_entries, total)
+            os.pwrite(fd, INDEX_HEADER.pack(INDEX_MAGIC, total, live + len(index_data),
+                                            self._generation()), 0)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._invalidate()
+        self._mark_deleted(replaced)
+    
+    def _mark_deleted(self, slots: List[int]):
+        """Flag records as deleted and decrement the live count"""
+        if not slots:
+            return
+        records, live = self._header()
+        fd = os.open(self.index_file, os.O_RDWR)
+        try:
+            for slot in slots:
+                record = list(self._record(slot))
+                if record[7] & FLAG_DELETED:
+                    continue
+                record[7] |= FLAG_DELETED
+                live -= 1
+                os.pwrite(fd, RECORD.pack(*record), INDEX_HEADER.size + slot * RECORD.size)
+            os.pwrite(fd, INDEX_HEADER.pack(INDEX_MAGIC, records, live, self._generation()), 0)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._invalidate()
+    
+    def _eviction_entries(self, records: Iterable) -> Iterator[Tuple[str, float, int, bool]]:
+        """Yield (ID, created epoch, bytes, pinned) for index records"""
+        for record in records:
+            yield (record[0].rstrip(b'\0').decode('utf-8'), record[4], record[2],
+                   bool(record[7] & FLAG_PINNED))
+    
+    def _budget_totals(self) -> Tuple[int, int]:
+        """Count and art bytes of live unpinned records
+        
+        Slices the flags column out of the mapped index and counts it with
+        translate, so checking the budget doesn't unpack every record; bytes
+        are only summed when CACHE_BYTES is set.
+        """
+        records, _ = self._header()
+        index = self._mapped_index()
+        start, end = INDEX_HEADER.size, INDEX_HEADER.size + records * RECORD.size
+        evictable = index[start + FLAGS_OFFSET:end:RECORD.size].translate(EVICTABLE)
+        total = 0
+        if self.cache_bytes:
+            total = sum(length for (length,), keep in zip(ART_LENGTH.iter_unpack(index[start:end]), evictable)
+                        if keep)
+        return evictable.count(1), total
+    
+    def eviction_status(self) -> Dict:
+        """Return the eviction policy, budgets and their current use"""
+        return self._evictor().status(self._eviction_entries(self._live_records()))
+    
+    def set_pinned(self, art_id: str, pinned: bool = True) -> bool:
+        """Pin a piece so eviction never removes it, or unpin it; False if not cached"""
+        with self._writer_lock():
+            self._invalidate()
+            slot = self._find_slot(art_id)
+            if slot is None:
+                return False
+            before = self._index_stamp()
+            record = list(self._record(slot))
+            record[7] = record[7] | FLAG_PINNED if pinned else record[7] & ~FLAG_PINNED
+            fd = os.open(self.index_file, os.O_RDWR)
+            try:
+                os.pwrite(fd, RECORD.pack(*record), INDEX_HEADER.size + slot * RECORD.size)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._invalidate()
+            # The index stamp doesn't change, so lru/lfu order must be rebuilt
+            self._evictor().usage.invalidate()
+            self._refresh_compiled(before)
+            self._refresh_search(before)
+        return True
+    
+    def recompress(self, dict_size: int = 0) -> Dict:
+        """Not supported, the pack stores art uncompressed"""
+        raise ValueError("recompress needs the per-file backend (CACHE_BACKEND=files); "
+                         "the pack stores art uncompressed")
+    
+    def compression_status(self) -> Dict:
+        """Return the CACHE_COMPRESS mode, always off for a pack"""
+        return {'mode': 'off', 'dictionary': 0}
+    
+    def _maybe_compact(self):
+        """Compact once deleted records outnumber live ones"""
+        records, live = self._header()
+        if records - live > max(live, 32):
+            self._compact()
+    
+    def compact(self):
+        """Rewrite pack and index keeping only live records"""
+        with self._writer_lock():
+            self._invalidate()
+            self._compact()
+    
+    def _compact(self, slots: Optional[Iterable[int]] = None):
+        """Rewrite the pack with the records at slots, by default the live ones"""
+        if slots is None:
+            records, _ = self._header()
+            slots = (slot for slot in range(records) if not self._record(slot)[7] & FLAG_DELETED)
+        pack_fd = self._pack_fd
+        new_records = []
+        entries = []
+        
+        def live_bodies():
+            offset = PACK_HEADER.size
+            for slot in slots:
+                record = list(self._record(slot))
+                data = os.pread(pack_fd, record[2] + record[3] + record[9], record[1])
+                record[1] = offset
+                offset += len(data)
+                entries.append((len(new_records), record[0].rstrip(b'\0')))
+                new_records.append(RECORD.pack(*record))
+                yield data
+        
+        self._write_generation(live_bodies(), new_records, entries)
+    
+    def _fingerprints(self):
+        """Yield (art ID, fingerprint) for live records, oldest first"""
+        from .similarity import fingerprint
+        
+        for record in self._live_records():
+            # Records from before fingerprints existed are computed from their art
+            yield record[0].rstrip(b'\0').decode('utf-8'), record[8] or fingerprint(self._read_body(record))
+    
+    def _index_stamp(self):
+        """Identify the index state, every write changes at least one part"""
+        records, live = self._header()
+        return self._generation(), records, live
+    
+    @trace.traced('cache.save')
+    def save_many(self, art_items: List[Dict[str, str]]) -> List[str]:
+        """Save several pieces of ASCII art to the pack
+        
+        Near-duplicates are rejected or replace the cached piece according to
+        DEDUP_MODE, as for ArtCache.save_many.
+        """
+        from .cache import piece_keys
+        
+        with self._writer_lock():
+            self._invalidate()
+            before = self._index_stamp()
+            index = self._similarity_index()
+            self.last_rejected = []
+            
+            art_ids = []
+            entries = []
+            replaced = []
+            for art_data in art_items:
+                art_id, value, art_metrics = piece_keys(art_data)
+                duplicate = self._find_duplicate(index, value)
+                if duplicate and self.dedup_mode == 'reject':
+                    self.last_rejected.append(duplicate)
+                    art_ids.append(duplicate)
+                    continue
+                
+                if duplicate and duplicate != art_id:
+                    index.remove(duplicate)
+                    replaced.append(duplicate)
+                entries.append((art_id, art_data['art'], art_data.get('prompt', ''),
+                                art_data.get('theme', ''), art_data.get('style', ''),
+                                datetime.now().timestamp(), value, art_metrics,
+                                FLAG_PINNED if art_data.get('pinned') else 0))
+                index.add(art_id, value)
+                art_ids.append(art_id)
+            
+            # Choose what to evict before appending, so new pieces that
+            # don't fit are never written; a new piece supersedes any record
+            # with its ID
+            pending = {art_id: (art_id, created, len(art.encode('utf-8')), bool(flags & FLAG_PINNED))
+                       for art_id, art, _, _, _, created, _, _, flags in entries}
+            superseded = set(pending).union(replaced)
+            count, total = self._budget_totals()
+            for art_id in superseded:
+                slot = self._find_slot(art_id)
+                record = self._record(slot) if slot is not None else None
+                if record is not None and not record[7] & FLAG_PINNED:
+                    count -= 1
+                    total -= record[2]
+            for _, _, size, pinned in pending.values():
+                if not pinned:
+                    count += 1
+                    total += size
+            current = (entry for entry in self._eviction_entries(self._live_records())
+                       if entry[0] not in superseded)
+            
+            def lookup(art_id):
+                if art_id in pending or art_id in superseded:
+                    return pending.get(art_id)
+                slot = self._find_slot(art_id)
+                return next(self._eviction_entries([self._record(slot)])) if slot is not None else None
+            
+            evictor = self._evictor()
+            evicted = evictor.select(chain(current, pending.values()), protected=pending.keys(),
+                                     totals=(count, total), lookup=lookup, stamp=before)
+            gone = set(evicted)
+            entries = [entry for entry in entries if entry[0] not in gone]
+            
+            # Same-ID replacements are flagged by _append_many itself
+            self._append_many(entries)
+            self._mark_deleted([slot for slot in map(self._find_slot, replaced + evicted) if slot is not None])
+            for art_id in evicted:
+                index.remove(art_id)
+            self.last_evicted = replaced + evicted
+            self._maybe_compact()
+            evictor.saved(self._index_stamp())
+            self._sim_stamp = self._index_stamp()
+            self._refresh_compiled(before, [entry[0] for entry in entries])
+            saved = [index_entry({'id': art_id, 'created': datetime.fromtimestamp(created).isoformat(),
+                                  'prompt': prompt, 'theme': theme, 'style': style, 'metrics': art_metrics})
+                     for art_id, _, prompt, theme, style, created, _, art_metrics, _ in entries]
+            self._refresh_search(before, saved, replaced + evicted)
+        return art_ids
+    
+    # Reads
+    
+    def get_random_entry(self) -> Optional[Tuple[str, str]]:
+        """Get the ID and art of a random piece from the pack"""
+        records, live = self._header()
+        if not live or not records:
+            return None
+        
+        # Compaction keeps at least half the records live, so this
+        # succeeds after two tries on average
+        for _ in range(64):
+            record = self._record(random.randrange(records))
+            if not record[7] & FLAG_DELETED:
+                break
+        else:
+            # Deletes raced with us; fall back to a scan
+            live_records = list(self._live_records())
+            if not live_records:
+                return None
+            record = random.choice(live_records)
+        return record[0].rstrip(b'\0').decode('utf-8'), self._read_body(record)
+    
+    @trace.traced('cache.read_art')
+    def get_art_by_id(self, art_id: str) -> Optional[str]:
+        """Get specific ASCII art by ID"""
+        slot = self._find_slot(art_id)
+        if slot is None:
+            return None
+        return self._read_body(self._record(slot))
+    
+    def _read_metrics(self, record) -> Dict:
+        """Read the display metrics stored after a record's prompt"""
+        offset, art_len, prompt_len, metrics_len = record[1], record[2], record[3], record[9]
+        if not metrics_len:
+            # Saved before metrics were stored
+            from .width import metrics
+            return metrics(self._read_body(record))
+        self._mapped_index()
+        return json.loads(os.pread(self._pack_fd, metrics_len, offset + art_len + prompt_len))
+    
+    def get_metrics(self, art_id: str) -> Optional[Dict]:
+        """Get the display metrics stored with a piece (see lib.width.metrics)"""
+        slot = self._find_slot(art_id)
+        if slot is None:
+            return None
+        return self._read_metrics(self._record(slot))
+    
+    def _live_records(self):
+        """Yield live records in insertion order"""
+        records, _ = self._header()
+        for slot in range(records):
+            record = self._record(slot)
+            if not record[7] & FLAG_DELETED:
+                yield record
+    
+    def ids(self) -> List[str]:
+        """Get IDs of all cached art, oldest first"""
+        return [record[0].rstrip(b'\0').decode('utf-8') for record in self._live_records()]
+    
+    def _contains(self, art_id: str) -> bool:
+        """Check if a live record has this ID"""
+        return self._find_slot(art_id) is not None
+    
+    def _reload(self):
+        """Re-read the index after a concurrent writer changed it"""
+        self._invalidate()
+    
+    def _rotation_size(self) -> int:
+        """Number of rotation positions: record slots, deleted ones included"""
+        return self._header()[0]
+    
+    def _rotation_entry(self, slot: int) -> Tuple[str, float, bool]:
+        """Return (ID, created epoch, live) for a record slot"""
+        record = self._record(slot)
+        return record[0].rstrip(b'\0').decode('utf-8'), record[4], not record[7] & FLAG_DELETED
+    
+    def _rotation_theme(self, slot: int) -> str:
+        """Return the theme of the record at a slot"""
+        return self._table_value('themes', self._record(slot)[5])
+    
+    def _index_entries(self, reverse: bool = False):
+        """Yield (created, theme, slot) per live record in index order"""
+        records, _ = self._header()
+        for slot in (range(records - 1, -1, -1) if reverse else range(records)):
+            record = self._record(slot)
+            if not record[7] & FLAG_DELETED:
+                yield record[4], self._table_value('themes', record[5]), slot
+    
+    def _entry_item(self, slot: int) -> Optional[Dict]:
+        """Get the listing for a record, prompt and metrics in one read"""
+        record = self._record(slot)
+        id_bytes, offset, art_len, prompt_len, created, theme, style = record[:7]
+        metrics_len = record[9]
+        data = os.pread(self._pack_fd, prompt_len + metrics_len, offset + art_len)
+        art_metrics = json.loads(data[prompt_len:]) if metrics_len else self._read_metrics(record)
+        return index_entry({
+            'id': id_bytes.rstrip(b'\0').decode('utf-8'),
+            'created': datetime.fromtimestamp(created).isoformat(),
+            'prompt': data[:prompt_len].decode('utf-8'),
+            'theme': self._table_value('themes', theme),
+            'style': self._table_value('styles', style),
+            'metrics': art_metrics,
+            'pinned': bool(record[7] & FLAG_PINNED)
+        })
+    
+    # Deletes
+    
+    @trace.traced('cache.delete')
+    def delete_art_by_id(self, art_id: str) -> bool:
+        """Delete specific art by ID from the pack"""
+        with self._writer_lock():
+            self._invalidate()
+            slot = self._find_slot(art_id)
+            if slot is None:
+                return False
+            before = self._index_stamp()
+            current = self._sim_stamp == before
+            self._mark_deleted([slot])
+            if current:
+                self._sim_index.remove(art_id)
+                self._sim_stamp = self._index_stamp()
+            self._maybe_compact()
+            self._refresh_compiled(before)
+            self._discard_rendered(art_id)
+            self._refresh_search(before, removed=[art_id])
+        return True
+    
+    @trace.traced('cache.clear')
+    def clear_cache(self):
+        """Clear all cached art"""
+        with self._writer_lock():
+            self._invalidate()
+            before = self._index_stamp()
+            removed = self.ids()
+            self._write_generation([], [], [])
+            self._sim_index = None
+            self._refresh_compiled(before)
+            self._discard_rendered()
+            self._refresh_search(before, removed=removed)
+    
+    def is_empty(self) -> bool:
+        """Check if cache is empty"""
+        return self.size() == 0
+    
+    def size(self) -> int:
+        """Get number of items in cache"""
+        return self._header()[1]
+
+class LayeredPackedArtCache(LayeredStore, PackedArtCache):
+    """Pack cache layered over a system store"""
+
+def migrate_to_pack(cache_dir: Optional[str] = None) -> int:
+    """Convert a per-file cache directory into a pack, return items moved"""
+    from .similarity import fingerprint
+    from .width import metrics
+    
+    source = ArtCache(cache_dir)
+    target = PackedArtCache(cache_dir)
+    
+    with source._writer_lock():
+        source._load_metadata()
+        fingerprints = {item['id']: item['simhash'] for item in source.metadata['items'] if 'simhash' in item}
+        entries = []
+        for item in source.list_cached_art():
+            art = source.get_art_by_id(item['id'])
+            if art is None:
+                continue
+            value = int(fingerprints[item['id']], 16) if item['id'] in fingerprints else fingerprint(art)
+            entries.append((item['id'], art, item.get('prompt', ''), item.get('theme', ''),
+                            item.get('style', ''), datetime.fromisoformat(item['created']).timestamp(),
+                            value, source.get_metrics(item['id']) or metrics(art),
+                            FLAG_PINNED if item.get('pinned') else 0))
+        
+        target._write_generation([], [], [])
+        target._append_many(entries)
+        
+        # The pack is complete; drop the per-file copies
+        source.metadata_file.unlink(missing_ok=True)
+        for item in source.metadata['items']:
+            source._remove_art(item['id'])
+        target._refresh_compiled(None)
+    return len(entries)
+
+def migrate_to_files(cache_dir: Optional[str] = None) -> int:
+    """Convert a pack back into per-file cache entries, return items moved"""
+    from .similarity import fingerprint
+    
+    source = PackedArtCache(cache_dir)
+    target = ArtCache(cache_dir)
+    
+    with source._writer_lock():
+        source._invalidate()
+        items = source.list_cached_art()
+        fingerprints = {record[0].rstrip(b'\0').decode('utf-8'): record[8] for record in source._live_records()}
+        target._load_metadata()
+        for item in items:
+            art = source.get_art_by_id(item['id'])
+            metadata = dict(item, metrics=source.get_metrics(item['id']))
+            art_file = target._art_files(item['id'])[0]
+            target._write_file(art_file, target._art_codec().encode(art) if target.compression != 'off' else art)
+            target._write_file(target.cache_dir / f"{item['id']}.json", json.dumps(metadata, indent=2))
+            target.metadata['items'].append(
+                index_entry(metadata, f"{fingerprints.get(item['id']) or fingerprint(art):016x}"))
+        target._save_metadata()
+        target._refresh_compiled(None)
+        
+        # metadata.json is in place; drop the pack, index last so open_cache
+        # detects the per-file layout
+        source._invalidate()
+        for path in (source.pack_file, source.hash_file, source.tables_file, source.index_file):
+            path.unlink(missing_ok=True)
+    return len(items)
@@ -0,0 +1,168 @@
+"""Background cache refill worker"""
+
+import os
+import sys
+import time
+import fcntl
+import logging
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+def art_source():
+    """Create the art source named by ART_SOURCE"""
+    source = os.getenv('ART_SOURCE', 'openai').lower()
+    if source == 'images':
+        from .convert import ImageConverter
+        return ImageConverter()
+    if source != 'openai':
+        raise ValueError(f"Unknown ART_SOURCE '{source}' (expected openai or images)")
+    from .fetch import ArtFetcher
+    return ArtFetcher()
+
+class RefillWorker:
+    """Keep the cache above a low watermark without blocking the caller
+    
+    Display commands call spawn() when the cache holds fewer than
+    REFILL_THRESHOLD pieces. That starts `main.py refill` as a detached
+    process which fetches until REFILL_TARGET pieces are cached. The worker
+    holds an exclusive lock on refill.lock for its lifetime, so concurrent
+    logins can't start a second one, and logs to refill.log.
+    
+    ART_SOURCE=images makes it convert pictures from IMAGE_DIR (see
+    lib.convert) instead of asking the API, for hosts without network access.
+    Fetch outcomes feed the circuit breaker (lib.breaker); while it is open
+    no worker is started.
+    """
+    
+    def __init__(self, cache):
+        """Initialize the RefillWorker for an ArtCache"""
+        self.cache = cache
+        self.threshold = int(os.getenv('REFILL_THRESHOLD', '1'))
+        self.target = int(os.getenv('REFILL_TARGET', str(cache.cache_size)))
+        self.max_failures = int(os.getenv('REFILL_MAX_FAILURES', '3'))
+        self.lock_file = cache.cache_dir / 'refill.lock'
+        self.log_file = cache.cache_dir / 'refill.log'
+    
+    def needs_refill(self) -> bool:
+        """Check if the cache is below the low watermark"""
+        return self.cache.size() < self.threshold
+    
+    def running_pid(self) -> Optional[int]:
+        """Get the PID of the running worker, or None if there is none"""
+        try:
+            fd = os.open(self.lock_file, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Someone holds the exclusive lock: the worker is alive
+            content = os.read(fd, 32).decode().strip()
+            return int(content) if content.isdigit() else -1
+        finally:
+            os.close(fd)
+        return None
+    
+    def spawn(self) -> bool:
+        """Start a detached worker unless one is running or fetches keep failing"""
+        from .breaker import CircuitBreaker
+        
+        if self.running_pid() is not None or not CircuitBreaker(self.cache.cache_dir).allow():
+            return False
+        
+        main_script = Path(__file__).parent.parent / 'main.py'
+        with open(self.log_file, 'a') as log:
+            subprocess.Popen(
+                [sys.executable, str(main_script), 'refill'],
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=log,
+                start_new_session=True,
+                close_fds=True
+            )
+        return True
+    
+    def run(self) -> int:
+        """Fetch art until the cache reaches the target, return pieces saved
+        
+        Returns immediately if another worker holds the lock.
+        """
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return 0
+        
+        try:
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()).encode())
+            return self._refill()
+        finally:
+            os.ftruncate(fd, 0)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+    
+    def _refill(self) -> int:
+        """Fetch and save art while holding the worker lock"""
+        from .breaker import CircuitBreaker
+        
+        log = self._logger()
+        log.info("refill started: %d cached, target %d", self.cache.size(), self.target)
+        
+        saved = 0
+        failures = 0
+        try:
+            fetcher = art_source()
+            # Client setup stays out of the fetch times the breaker averages
+            connect = getattr(fetcher, 'connect', None)
+            if connect:
+                connect()
+        except Exception as e:
+            log.error("cannot create fetcher: %s", e)
+            return 0
+        
+        breaker = CircuitBreaker(self.cache.cache_dir)
+        while self.cache.size() < self.target and failures < self.max_failures:
+            try:
+                start = time.monotonic()
+                try:
+                    art_data = fetcher.fetch_art()
+                except Exception:
+                    breaker.record_failure()
+                    raise
+                breaker.record_success(time.monotonic() - start)
+                art_id = self.cache.save_art(art_data)
+                if self.cache.last_rejected:
+                    # A run of near-duplicates stops the worker like failures do
+                    failures += 1
+                    log.info("skipped near-duplicate of %s (%d/%d)", art_id, failures, self.max_failures)
+                    continue
+                saved += 1
+                failures = 0
+                log.info("saved %s (%d cached)", art_id, self.cache.size())
+            except Exception as e:
+                failures += 1
+                log.warning("fetch failed (%d/%d): %s", failures, self.max_failures, e)
+        
+        log.info("refill finished: saved %d, %d cached", saved, self.cache.size())
+        return saved
+    
+    def _logger(self) -> logging.Logger:
+        """Get a logger writing to refill.log"""
+        log = logging.getLogger('motdartisan.refill')
+        if not log.handlers:
+            handler = logging.FileHandler(self.log_file)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(process)d] %(message)s'))
+            log.addHandler(handler)
+            log.setLevel(logging.INFO)
+        return log
+    
+    def tail_log(self, lines: int = 10):
+        """Get the last lines of refill.log"""
+        if not self.log_file.exists():
+            return []
+        with open(self.log_file, 'r') as f:
+            return f.read().splitlines()[-lines:]
@@ -0,0 +1,106 @@
+"""On-disk cache of rendered art, ready to be written to the terminal"""
+
+import os
+import zlib
+from pathlib import Path
+from typing import Optional, Union
+
+class RenderCache:
+    """LRU cache of final output bytes with a byte budget
+    
+    Each entry is one file named after the art ID, a checksum of the art
+    and a checksum of everything else that affects the output: theme,
+    colour mode, layout, terminal width and the colour tables. Changed art or tables produce new names and the stale entries
+    age out; deleting art discards its entries. A hit touches the file, so
+    file mtimes give the LRU order used when a store pushes the directory
+    over RENDER_CACHE_SIZE bytes.
+    """
+    
+    def __init__(self, cache_dir: Union[str, Path], max_bytes: Optional[int] = None):
+        """Initialize the RenderCache, budget defaults to RENDER_CACHE_SIZE"""
+        self.cache_dir = Path(cache_dir)
+        if max_bytes is None:
+            max_bytes = int(os.getenv('RENDER_CACHE_SIZE', str(4 * 1024 * 1024)))
+        self.max_bytes = max_bytes
+    
+    @staticmethod
+    def checksum(text: str) -> str:
+        """Return a 64-bit checksum of text as hex"""
+        data = text.encode('utf-8', 'surrogateescape')
+        return f"{zlib.crc32(data):08x}{zlib.adler32(data):08x}"
+    
+    def key(self, art: str, params: tuple, art_id: Optional[str] = None) -> str:
+        """Build the entry name for art rendered with the given parameters
+        
+        The art is always checksummed: an ID set with `import --id` can
+        look like a content ID and still be reused for different art. The
+        ID goes in front so deleting a piece can discard its entries.
+        """
+        art_id = self.checksum(art) if art_id is None else f"{art_id}-{self.checksum(art)}"
+        return f"{art_id}-{len(art):x}-{self.checksum(chr(0).join(map(str, params)))}"
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached output for a key, marking it recently used"""
+        if self.max_bytes <= 0:
+            return None
+        path = self.cache_dir / f"{key}.ans"
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+    
+    def put(self, key: str, data: bytes):
+        """Store output for a key, then evict least recently used entries"""
+        if self.max_bytes <= 0 or len(data) > self.max_bytes:
+            return
+        try:
+            self.cache_dir.mkdir(exist_ok=True)
+            # Readers must never see a partial entry; losing one on a crash is fine
+            tmp = self.cache_dir / f".{key}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self.cache_dir / f"{key}.ans")
+            self._evict()
+        except OSError:
+            pass
+    
+    def _evict(self):
+        """Remove least recently used entries until the budget is met"""
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.ans'):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+                    total += st.st_size
+        
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+    
+    def discard(self, art_id: str):
+        """Remove cached output of a deleted piece"""
+        if not self.cache_dir.exists():
+            return
+        for path in self.cache_dir.glob(f"{art_id}-*.ans"):
+            path.unlink(missing_ok=True)
+    
+    def clear(self):
+        """Remove all cached output"""
+        if not self.cache_dir.exists():
+            return
+        for path in self.cache_dir.glob('*.ans'):
+            path.unlink(missing_ok=True)
@@ -0,0 +1,255 @@
+"""Rotation of cached art across logins without repeats"""
+
+import os
+import random
+import struct
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from . import trace
+
+POLICIES = ('shuffle', 'lru', 'theme', 'random')
+
+# rotation.state: a single record, rewritten in place under flock
+# magic, policy, index stamp checksum, round size, checksum of the last
+# shown ID, pieces shown this shuffle round, round seed, round position
+# (lru: position of the last shown piece), creation time of the last shown
+# piece, pieces shown
+STATE = struct.Struct('<8sB3xIIIIQQdQ')
+STATE_MAGIC = b'MOTDROT2'
+FIELDS = ('magic', 'policy', 'stamp', 'size', 'last', 'done', 'seed', 'position', 'cursor', 'shown')
+
+# Random draws per weighted pick before falling back to a uniform one
+WEIGHT_TRIES = 64
+
+def permute(position: int, size: int, seed: int) -> int:
+    """Map a position to its place in a seeded permutation of range(size)
+    
+    A four-round Feistel network permutes the smallest even-bit domain
+    holding size; results outside range(size) are fed through again (cycle
+    walking), which takes fewer than four passes on average.
+    """
+    half = max(1, ((size - 1).bit_length() + 1) // 2)
+    mask = (1 << half) - 1
+    keys = [(seed >> shift) & 0xffffffff for shift in (0, 16, 32, 48)]
+    value = position
+    while True:
+        left, right = value >> half, value & mask
+        for key in keys:
+            mixed = (((right * 0x9e3779b1) ^ key) & 0xffffffff) * 0x85ebca6b
+            left, right = right, left ^ ((mixed >> 15) & mask)
+        value = (left << half) | right
+        if value < size:
+            return value
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse ROTATION_WEIGHTS ("space=3,nature=0.5") into theme -> weight"""
+    weights = {}
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        theme, sep, value = part.partition('=')
+        if not sep:
+            raise ValueError(f"Invalid ROTATION_WEIGHTS entry '{part.strip()}' (expected theme=weight)")
+        weights[theme.strip().lower()] = float(value)
+    return weights
+
+class Rotation:
+    """Picks the next piece to show and remembers what was shown
+    
+    Policies (ROTATION, default shuffle):
+        
+        shuffle  every piece once, in a new random order each round
+        lru      cycle through pieces in the order they were added, so the
+                 next piece is always the one shown longest ago
+        theme    random picks weighted per theme by ROTATION_WEIGHTS
+        random   uniform random picks, nothing recorded
+    
+    A pick holds flock on rotation.state, reads its one record, looks at a
+    constant number of cache positions (see ArtCache._rotation_entry) and
+    rewrites the record in place, so concurrent shells take turns. Writes
+    to the cache change its index stamp and can move pieces to other
+    positions: a shuffle round then goes on in a new order over the pieces
+    now cached and ends once as many picks as there are pieces have been
+    made, so the round keeps its progress (the rest of it may repeat a
+    piece shown before the change, and miss one not yet shown); lru finds
+    its place again by bisecting on creation time. No policy shows the same
+    piece twice in a row while more than one is cached.
+    """
+    
+    def __init__(self, cache, policy: Optional[str] = None, weights: Optional[Dict[str, float]] = None):
+        """Initialize the Rotation, policy and weights default to the environment"""
+        self.cache = cache
+        self.policy = (policy or os.getenv('ROTATION', 'shuffle')).lower()
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown ROTATION '{self.policy}' (expected {', '.join(POLICIES)})")
+        if weights is None:
+            weights = parse_weights(os.getenv('ROTATION_WEIGHTS', ''))
+        self.weights = weights
+        self.state_file = cache.cache_dir / 'rotation.state'
+    
+    def next_entry(self, read: Optional[Callable[[str], Any]] = None) -> Optional[Tuple[str, Any]]:
+        """Pick the next piece, return its ID and art or None if the cache is empty
+        
+        read(art_id) stands in for reading the picked piece's art, e.g. to
+        look for output already rendered from it first; it returns None for
+        a piece that has gone. ROTATION=random picks still read the art.
+        """
+        with trace.span('rotation.pick', policy=self.policy):
+            entry = self._next_entry(read or self.cache.get_art_by_id)
+        if entry is not None:
+            # lib.eviction is only needed once there is a show to log
+            from .eviction import record_show
+            record_show(self.cache.cache_dir, entry[0])
+        return entry
+    
+    def _next_entry(self, read: Callable[[str], Any]) -> Optional[Tuple[str, Any]]:
+        if self.policy == 'random':
+            return self.cache.get_random_entry()
+        
+        import fcntl
+        fd = os.open(self.state_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            state = self._read_state(fd)
+            for _ in range(3):
+                art_id = self._pick(state)
+                if art_id is None:
+                    break
+                art = read(art_id)
+                if art is not None:
+                    state['last'] = self._checksum(art_id)
+                    state['shown'] += 1
+                    if self.policy == 'shuffle':
+                        state['done'] += 1
+                    # No fsync: a pick lost in a crash only costs variety
+                    os.pwrite(fd, STATE.pack(*(state[field] for field in FIELDS)), 0)
+                    return art_id, art
+                # Deleted by a concurrent writer after we loaded the index
+                self.cache._reload()
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(fd)
+        return self.cache.get_random_entry()
+    
+    def status(self) -> Dict:
+        """Return the policy, pieces shown and, for shuffle, the round progress"""
+        state = None
+        try:
+            with open(self.state_file, 'rb') as f:
+                state = self._parse(f.read(STATE.size))
+        except FileNotFoundError:
+            pass
+        info = {'policy': self.policy, 'shown': state['shown'] if state else 0}
+        if self.policy == 'shuffle' and state and state['policy'] == POLICIES.index('shuffle'):
+            # Deletes since the round began can leave it past the cache size
+            info['round'] = (min(state['done'], self.cache.size()), self.cache.size())
+        return info
+    
+    @staticmethod
+    def _parse(data: bytes) -> Optional[Dict]:
+        if len(data) != STATE.size:
+            return None
+        state = dict(zip(FIELDS, STATE.unpack(data)))
+        return state if state['magic'] == STATE_MAGIC else None
+    
+    def _read_state(self, fd: int) -> Dict:
+        """Read the state record, starting afresh if it's missing or for another policy"""
+        state = self._parse(os.pread(fd, STATE.size, 0))
+        policy = POLICIES.index(self.policy)
+        if state is None or state['policy'] != policy:
+            shown = state['shown'] if state else 0
+            state = dict(zip(FIELDS, (STATE_MAGIC, policy, 0, 0, 0, 0, 0, 0, 0.0, shown)))
+        return state
+    
+    @staticmethod
+    def _checksum(art_id: str) -> int:
+        return zlib.crc32(art_id.encode('utf-8'))
+    
+    def _pick(self, state: Dict) -> Optional[str]:
+        """Choose the next piece, updating state; None if no piece is live"""
+        if not self.cache.size():
+            return None
+        size = self.cache._rotation_size()
+        if self.policy == 'shuffle':
+            return self._pick_shuffle(state, size)
+        if self.policy == 'lru':
+            return self._pick_lru(state, size)
+        return self._pick_weighted(state, size)
+    
+    def _pick_shuffle(self, state: Dict, size: int) -> Optional[str]:
+        stamp = zlib.crc32(repr(self.cache._index_stamp()).encode())
+        if state['stamp'] != stamp or state['size'] != size:
+            if state['size']:
+                # Positions may have moved: the rest of the round walks a new
+                # order over the pieces cached now, keeping its count
+                state.update(size=size, seed=random.getrandbits(64), position=0)
+            else:
+                self._new_round(state, size)
+            state['stamp'] = stamp
+        live_count = self.cache.size()
+        
+        # Deleted pack records still hold positions; compaction keeps at
+        # least half of them live, so skipping them is cheap on average
+        for _ in range(2 * size + 1):
+            if state['position'] >= state['size'] or state['done'] >= live_count:
+                self._new_round(state, size)
+            position = permute(state['position'], state['size'], state['seed'])
+            state['position'] += 1
+            art_id, _, live = self.cache._rotation_entry(position)
+            # A new order after a change may open with the last piece shown
+            if live and (live_count < 2 or self._checksum(art_id) != state['last']):
+                return art_id
+        return None
+    
+    def _new_round(self, state: Dict, size: int):
+        """Start a round with a new order, one that doesn't open with the last piece"""
+        for _ in range(8):
+            seed = random.getrandbits(64)
+            if size < 2:
+                break
+            # Deleted pack records may come first in the order
+            entries = (self.cache._rotation_entry(permute(position, size, seed)) for position in range(size))
+            first = next((art_id for art_id, _, live in entries if live), None)
+            if first is None or self._checksum(first) != state['last']:
+                break
+        state.update(size=size, seed=seed, position=0, done=0)
+    
+    def _pick_lru(self, state: Dict, size: int) -> Optional[str]:
+        cursor = state['cursor']
+        position = state['position']
+        if position < size and self.cache._rotation_entry(position)[1] == cursor:
+            start = position + 1
+        else:
+            # The cache changed under the last pick; positions are in
+            # creation order, so bisect for the first piece after it
+            low, high = 0, size
+            while low < high:
+                middle = (low + high) // 2
+                if self.cache._rotation_entry(middle)[1] <= cursor:
+                    low = middle + 1
+                else:
+                    high = middle
+            start = low
+        
+        for offset in range(size):
+            position = (start + offset) % size
+            art_id, created, live = self.cache._rotation_entry(position)
+            if live:
+                state.update(position=position, cursor=created)
+                return art_id
+        return None
+    
+    def _pick_weighted(self, state: Dict, size: int) -> Optional[str]:
+        """Rejection-sample positions by theme weight, unlisted themes weigh 1"""
+        top = max([1.0, *self.weights.values()])
+        several = self.cache.size() > 1
+        for _ in range(WEIGHT_TRIES):
+            position = random.randrange(size)
+            art_id, _, live = self.cache._rotation_entry(position)
+            if not live or (several and self._checksum(art_id) == state['last']):
+                continue
+            weight = self.weights.get(self.cache._rotation_theme(position).lower(), 1.0)
+            if random.random() * top < weight:
+                return art_id
+        return None
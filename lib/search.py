@@ -0,0 +1,228 @@
+"""SQLite index for searching and filtering cached art"""
+
+import json
+import random
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from . import trace
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS art (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    created REAL NOT NULL,
+    theme TEXT NOT NULL COLLATE NOCASE,
+    style TEXT NOT NULL COLLATE NOCASE,
+    width INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    prompt TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS art_theme_style ON art (theme, style);
+CREATE INDEX IF NOT EXISTS art_style ON art (style);
+CREATE INDEX IF NOT EXISTS art_created ON art (created);
+CREATE INDEX IF NOT EXISTS art_size ON art (width, lines);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+'''
+
+# Full-text index over prompts, kept in step with the art table by triggers
+FTS_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS art_fts USING fts5(prompt, content='art', content_rowid='rowid');
+CREATE TRIGGER IF NOT EXISTS art_insert AFTER INSERT ON art BEGIN
+    INSERT INTO art_fts (rowid, prompt) VALUES (new.rowid, new.prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS art_delete AFTER DELETE ON art BEGIN
+    INSERT INTO art_fts (art_fts, rowid, prompt) VALUES ('delete', old.rowid, old.prompt);
+END;
+'''
+
+# Random rowid probes before falling back to counting the matches
+RANDOM_PROBES = 32
+
+class SearchIndex:
+    """Optional index.db next to a cache, for filtered picks and prompt search
+    
+    Rows mirror the cache listings (see ArtCache.iter_cached_art). The index
+    records the cache state it was last synced with; sync() compares IDs
+    only when that state changed, and cache writes update the rows they
+    touch directly, so a current index is never rescanned.
+    
+    Without FTS5 in the local SQLite, search falls back to LIKE matching.
+    """
+    
+    def __init__(self, cache):
+        """Initialize the SearchIndex for an ArtCache"""
+        self.cache = cache
+        self.db_file = cache.cache_dir / 'index.db'
+        self._db = None
+        self.has_fts = False
+    
+    def exists(self) -> bool:
+        """Check if the index has been created"""
+        return self.db_file.exists()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database, creating the schema on first use"""
+        if self._db is None:
+            db = sqlite3.connect(self.db_file, timeout=10)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+            try:
+                db.executescript(FTS_SCHEMA)
+                self.has_fts = True
+            except sqlite3.OperationalError:
+                self.has_fts = False
+            self._db = db
+        return self._db
+    
+    def close(self):
+        """Close the database connection"""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+    
+    def _stamp(self) -> str:
+        return json.dumps(self.cache._index_stamp())
+    
+    @trace.traced('search.sync')
+    def sync(self) -> int:
+        """Bring the index up to date with the cache, return rows changed"""
+        db = self._connect()
+        stamp = self._stamp()
+        row = db.execute("SELECT value FROM meta WHERE key = 'stamp'").fetchone()
+        if row and row[0] == stamp:
+            return 0
+        
+        indexed = {art_id for (art_id,) in db.execute('SELECT id FROM art')}
+        cached = set(self.cache.ids())
+        removed = indexed - cached
+        added = cached - indexed
+        with db:
+            self._remove(db, removed)
+            if added:
+                self._add(db, (item for item in self.cache.iter_cached_art() if item['id'] in added))
+            self._set_stamp(db, stamp)
+        return len(added) + len(removed)
+    
+    def update(self, before, items: Iterable[Dict] = (), removed: Iterable[str] = ()):
+        """Apply a cache write made under the writer lock
+        
+        before is the cache's index stamp from before the write, items are
+        listings of saved pieces and removed the IDs of deleted ones. If the
+        index was already behind the cache, a full sync follows.
+        """
+        db = self._connect()
+        row = db.execute("SELECT value FROM meta WHERE key = 'stamp'").fetchone()
+        current = row is not None and row[0] == json.dumps(before)
+        with db:
+            # Pieces evicted by the same write they were saved in end up removed
+            self._add(db, items)
+            self._remove(db, removed)
+            if current:
+                self._set_stamp(db, self._stamp())
+        if not current:
+            self.sync()
+    
+    @staticmethod
+    def _set_stamp(db: sqlite3.Connection, stamp: str):
+        db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('stamp', ?)", (stamp,))
+    
+    @staticmethod
+    def _add(db: sqlite3.Connection, items: Iterable[Dict]):
+        rows = []
+        for item in items:
+            metrics = item.get('metrics') or {}
+            rows.append((item['id'], datetime.fromisoformat(item['created']).timestamp(),
+                         item.get('theme', ''), item.get('style', ''),
+                         metrics.get('max_width', 0), metrics.get('lines', 0), item.get('prompt', '')))
+        # Same-ID saves replace the row; the delete trigger keeps FTS in step
+        db.executemany('DELETE FROM art WHERE id = ?', [(row[0],) for row in rows])
+        db.executemany('INSERT INTO art (id, created, theme, style, width, lines, prompt) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+    
+    @staticmethod
+    def _remove(db: sqlite3.Connection, art_ids: Iterable[str]):
+        db.executemany('DELETE FROM art WHERE id = ?', [(art_id,) for art_id in art_ids])
+    
+    @staticmethod
+    def _filters(theme: Optional[str], style: Optional[str], max_width: Optional[int],
+                 max_lines: Optional[int]):
+        """Build a WHERE clause, return (clause, params, only equality tests)"""
+        clauses = []
+        params = []
+        for column, value in (('theme', theme), ('style', style)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        equality = True
+        for column, value in (('width', max_width), ('lines', max_lines)):
+            if value is not None:
+                clauses.append(f"{column} <= ?")
+                params.append(value)
+                equality = False
+        return ' AND '.join(clauses) or '1', params, equality
+    
+    def random_id(self, theme: Optional[str] = None, style: Optional[str] = None,
+                  max_width: Optional[int] = None, max_lines: Optional[int] = None) -> Optional[str]:
+        """Pick a random matching piece, None if nothing matches
+        
+        Probes random rowids between the lowest and highest match and takes
+        the first exact hit, so each match is equally likely and a probe is
+        one primary-key lookup. Sparse matches fall back to counting them.
+        """
+        db = self._connect()
+        where, params, equality = self._filters(theme, style, max_width, max_lines)
+        if equality:
+            # min/max over an equality prefix of an index are single seeks
+            low = db.execute(f"SELECT min(rowid) FROM art WHERE {where}", params).fetchone()[0]
+            if low is None:
+                return None
+            high = db.execute(f"SELECT max(rowid) FROM art WHERE {where}", params).fetchone()[0]
+            for _ in range(RANDOM_PROBES):
+                row = db.execute(f"SELECT id FROM art WHERE rowid = ? AND {where}",
+                                 [random.randint(low, high), *params]).fetchone()
+                if row:
+                    return row[0]
+        
+        count = db.execute(f"SELECT count(*) FROM art WHERE {where}", params).fetchone()[0]
+        if not count:
+            return None
+        row = db.execute(f"SELECT id FROM art WHERE {where} LIMIT 1 OFFSET ?",
+                         [*params, random.randrange(count)]).fetchone()
+        return row[0] if row else None
+    
+    def search(self, query: str, theme: Optional[str] = None, style: Optional[str] = None,
+               limit: int = 20) -> List[Dict]:
+        """Find pieces whose prompt contains all words of the query, best first"""
+        db = self._connect()
+        where, params, _ = self._filters(theme, style, None, None)
+        words = query.split()
+        if not words:
+            return []
+        
+        columns = 'art.id, art.created, art.theme, art.style, art.width, art.lines, art.prompt'
+        if self.has_fts:
+            # Quote each word so user input is never parsed as FTS syntax
+            match = ' '.join('"' + word.replace('"', '""') + '"' for word in words)
+            rows = db.execute(f"SELECT {columns} FROM art_fts JOIN art ON art.rowid = art_fts.rowid "
+                              f"WHERE art_fts MATCH ? AND {where} ORDER BY bm25(art_fts) LIMIT ?",
+                              [match, *params, limit])
+        else:
+            likes = ' AND '.join('prompt LIKE ?' for _ in words)
+            rows = db.execute(f"SELECT {columns} FROM art WHERE {likes} AND {where} "
+                              f"ORDER BY created DESC LIMIT ?",
+                              [*(f"%{word}%" for word in words), *params, limit])
+        
+        results = []
+        for art_id, created, art_theme, art_style, width, lines, prompt in rows:
+            results.append({
+                'id': art_id,
+                'created': datetime.fromtimestamp(created).isoformat(),
+                'theme': art_theme,
+                'style': art_style,
+                'width': width,
+                'lines': lines,
+                'prompt': prompt
+            })
+        return results
@@ -0,0 +1,272 @@
+"""Resident daemon serving rendered art over a Unix socket (main.py serve)"""
+
+import os
+import json
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from . import trace
+
+# Seconds a client gets to send its request line
+READ_TIMEOUT = 1.0
+
+# Connections the kernel queues while the daemon is busy; login bursts on a
+# shared host open many at once
+BACKLOG = 1024
+
+def socket_path(cache_dir: Path) -> Path:
+    """Get the daemon socket, MOTD_SOCKET or motd.sock in the cache directory"""
+    return Path(os.path.expanduser(os.getenv('MOTD_SOCKET') or Path(cache_dir) / 'motd.sock'))
+
+def request(path: Path, line: str, timeout: Optional[float] = None) -> Optional[bytes]:
+    """Send one request line to the daemon, return its reply or None on any failure
+    
+    timeout (MOTD_SOCKET_TIMEOUT, default 0.2s) bounds each socket
+    operation, so a stuck daemon delays login by a fraction of a second.
+    """
+    # socket costs a few ms to import; only pay for it when a daemon may run
+    import socket
+    
+    if timeout is None:
+        timeout = float(os.getenv('MOTD_SOCKET_TIMEOUT', '0.2'))
+    chunks = []
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(path))
+            sock.sendall(line.encode('utf-8') + b'\n')
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except OSError:
+        return None
+    return b''.join(chunks) or None
+
+def parse_request(line: bytes) -> Tuple[str, Dict[str, str]]:
+    """Split "show theme=space columns=120" into the verb and its parameters"""
+    words = line.decode('utf-8', 'replace').split()
+    verb = 'show'
+    if words and '=' not in words[0]:
+        verb = words.pop(0).lower()
+    params = {}
+    for word in words:
+        key, _, value = word.partition('=')
+        params[key.lower()] = value
+    return verb, params
+
+class ArtServer:
+    """Serves ready-to-print art to login shells from one long-lived process
+    
+    Requests are a single line, "show" followed by optional key=value
+    parameters, and the reply is the rendered piece; the server then closes
+    the connection. An empty reply means the client should fall back to
+    login.py. Parameters:
+        
+        theme      color theme (default THEME)
+        colorterm  the client's COLORTERM and TERM, which pick the colour
+        term       depth unless COLOR_DEPTH is set
+        columns    center the art in this many columns (default: don't)
+    
+    "status" replies with JSON counters. Pieces are picked by the same
+    Rotation as login.py, so both paths share one no-repeat order. Rendered
+    output is kept in memory within RENDER_CACHE_SIZE bytes, keyed by the
+    piece's creation time as well as its ID, and looked up before the art
+    is read. Each request first stats the cache index and reloads it if a
+    writer changed it, so a piece deleted and saved again under the same ID
+    is never served from its old rendering. Requests are answered one at a
+    time on a worker thread; the flock on rotation.state and any disk reads
+    never block the event loop.
+    """
+    
+    def __init__(self, cache, path: Optional[Path] = None):
+        """Initialize the ArtServer for an ArtCache, path defaults to socket_path()"""
+        from .display import ArtDisplay
+        from .rotation import Rotation
+        
+        self.cache = cache
+        self.path = Path(path) if path else socket_path(cache.cache_dir)
+        self.theme = os.getenv('THEME', 'cyberpunk')
+        self.max_bytes = int(os.getenv('RENDER_CACHE_SIZE', str(4 * 1024 * 1024)))
+        self.rotation = Rotation(cache)
+        self.display = ArtDisplay()
+        self.rendered: 'OrderedDict[tuple, bytes]' = OrderedDict()
+        self.rendered_bytes = 0
+        self.requests = 0
+        self.failures = 0
+        self.started = time.time()
+        self._stamp = self._index_stat()
+        self.versions = self._versions()
+    
+    def _index_stat(self) -> tuple:
+        """Identify the on-disk index; any cache write changes it"""
+        paths = [self.cache.cache_dir / name for name in ('metadata.json', 'art.idx', 'hidden.json')]
+        # A layered cache also changes when the system store is written
+        base = getattr(self.cache, 'base', None)
+        if base is not None:
+            paths += [base.cache_dir / name for name in ('metadata.json', 'art.idx')]
+        stamp = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+    
+    def _versions(self) -> Dict[str, str]:
+        """Creation time of each cached piece, which changes when an ID is saved again"""
+        return {item['id']: item['created'] for item in self.cache.iter_cached_art()}
+    
+    def _refresh(self):
+        """Reload the index if a writer changed it, dropping renders of changed pieces"""
+        stamp = self._index_stat()
+        if stamp == self._stamp:
+            return
+        self._stamp = stamp
+        self.cache._reload()
+        self.versions = self._versions()
+        for key in [key for key in self.rendered if self.versions.get(key[0]) != key[1]]:
+            self.rendered_bytes -= len(self.rendered.pop(key))
+    
+    def serve(self):
+        """Listen until SIGTERM or SIGINT"""
+        import asyncio
+        asyncio.run(self._serve())
+    
+    async def _serve(self):
+        import asyncio
+        import signal
+        from concurrent.futures import ThreadPoolExecutor
+        
+        self._claim_socket()
+        # One worker: requests share the renderer and the in-memory state
+        self._worker = ThreadPoolExecutor(max_workers=1)
+        # Only the owner may connect; the socket carries nothing else
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self._handle, path=str(self.path), backlog=BACKLOG)
+        finally:
+            os.umask(umask)
+        
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            self.path.unlink(missing_ok=True)
+            self._worker.shutdown(wait=False)
+    
+    def _claim_socket(self):
+        """Remove a stale socket, refuse to start if a daemon answers on it"""
+        if not self.path.exists():
+            return
+        if request(self.path, 'status') is not None:
+            raise RuntimeError(f"A daemon is already serving on {self.path}")
+        self.path.unlink()
+    
+    async def _handle(self, reader, writer):
+        import asyncio
+        
+        try:
+            line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+            with trace.span('serve.request'):
+                data = await asyncio.get_running_loop().run_in_executor(self._worker, self.respond, line)
+            writer.write(data)
+            await writer.drain()
+        except Exception:
+            # A bad request or an unreadable piece must not stop the daemon;
+            # the client sees an empty reply and falls back
+            self.failures += 1
+        finally:
+            writer.close()
+    
+    def respond(self, line: bytes) -> bytes:
+        """Answer one request line"""
+        verb, params = parse_request(line)
+        self.requests += 1
+        if verb == 'status':
+            return json.dumps(self.status()).encode('utf-8') + b'\n'
+        if verb != 'show':
+            raise ValueError(f"Unknown request '{verb}'")
+        
+        from .cache import bundled_entry
+        
+        theme = params.get('theme') or self.theme
+        depth = self._depth(params)
+        columns = int(params.get('columns') or 0)
+        self._refresh()
+        
+        def key(art_id: str) -> tuple:
+            return art_id, self.versions.get(art_id), theme, depth, columns
+        
+        def read(art_id: str):
+            # Output rendered before saves reading the art: bytes, not str
+            return self.rendered.get(key(art_id)) or self.cache.get_art_by_id(art_id)
+        
+        # Never fetch here: a login waiting on the daemon has no budget for it
+        art_id, art = self.rotation.next_entry(read) or bundled_entry() or (None, None)
+        if art is None:
+            return b''
+        if isinstance(art, bytes):
+            self.rendered.move_to_end(key(art_id))
+            return art
+        data = self._render(art_id, art, theme, depth, columns)
+        # Random colors differ on every request
+        if art_id is not None and not (self.display.use_color and self.display.random_color):
+            self._remember(key(art_id), data)
+        return data
+    
+    def _depth(self, params: Dict[str, str]) -> str:
+        """Colour depth for the requesting terminal"""
+        from .display import detect_depth
+        
+        if self.display.color_depth != 'auto':
+            return self.display.color_depth
+        return detect_depth(params.get('colorterm', ''), params.get('term', ''))
+    
+    def _render(self, art_id: Optional[str], art: str, theme: str, depth: str, columns: int) -> bytes:
+        """Render a piece as login.py would, optionally centered"""
+        configured = self.display.color_depth
+        self.display.color_depth = depth
+        try:
+            text = self.display.render(art, theme=theme)
+        finally:
+            self.display.color_depth = configured
+        
+        if columns:
+            from .width import metrics
+            widths = ((art_id and self.cache.get_metrics(art_id)) or metrics(art))['widths']
+            lines = text.split('\n')
+            if len(lines) == len(widths):
+                text = '\n'.join(' ' * max(0, (columns - width) // 2) + line
+                                 for line, width in zip(lines, widths))
+        return (text + '\n').encode('utf-8')
+    
+    def _remember(self, key: tuple, data: bytes):
+        """Keep rendered output, dropping the least recently served past the budget"""
+        if len(data) > self.max_bytes:
+            return
+        self.rendered[key] = data
+        self.rendered_bytes += len(data)
+        while self.rendered_bytes > self.max_bytes:
+            _, old = self.rendered.popitem(last=False)
+            self.rendered_bytes -= len(old)
+    
+    def status(self) -> Dict:
+        """Return the daemon's PID, uptime and counters"""
+        return {
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started, 1),
+            'pieces': self.cache.size(),
+            'requests': self.requests,
+            'failures': self.failures,
+            'rendered': len(self.rendered),
+            'rendered_bytes': self.rendered_bytes
+        }
@@ -0,0 +1,107 @@
+"""Near-duplicate detection for ASCII art using simhash fingerprints"""
+
+import os
+import hashlib
+from typing import Optional, Dict, Set, Tuple
+
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 4
+
+# Per bit of a byte, most significant first: a translate table mapping each
+# byte value to 1 if that bit is set, else 0
+BIT_TABLES = [bytes((value >> bit) & 1 for value in range(256)) for bit in range(7, -1, -1)]
+
+def normalise(art: str) -> str:
+    """Reduce art to the parts that matter for similarity
+    
+    Whitespace runs inside a line collapse to one space, lines are stripped
+    and blank lines dropped, so pieces that differ only in indentation or
+    padding normalise to the same text.
+    """
+    lines = (' '.join(line.split()) for line in art.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+def fingerprint(art: str) -> int:
+    """Compute the 64-bit simhash of the character shingles of normalised art"""
+    text = normalise(art)
+    if len(text) < SHINGLE_SIZE:
+        text = text.ljust(SHINGLE_SIZE)
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    
+    # Bit-sliced vote: take each byte position of the digests as one bytes
+    # object and count set bits with translate/count, which run in C
+    digests = b''.join(hashlib.blake2b(s.encode(), digest_size=8).digest() for s in shingles)
+    half = len(shingles) / 2
+    result = 0
+    for position in range(FINGERPRINT_BITS // 8):
+        column = digests[position::8]
+        for table in BIT_TABLES:
+            result = (result << 1) | (column.translate(table).count(1) > half)
+    return result
+
+def max_distance(similarity: float) -> int:
+    """Convert a 0-1 similarity threshold into a maximum Hamming distance"""
+    return max(0, min(FINGERPRINT_BITS - 1, int((1.0 - similarity) * FINGERPRINT_BITS)))
+
+class SimilarityIndex:
+    """Find fingerprints within a Hamming distance without a linear scan
+    
+    Fingerprints are split into max_distance + 1 bands. Two fingerprints that
+    differ in at most max_distance bits must agree exactly on at least one
+    band, so only pieces sharing a band bucket are compared.
+    """
+    
+    def __init__(self, similarity: Optional[float] = None):
+        """Initialize an empty index, threshold defaults to DEDUP_SIMILARITY"""
+        if similarity is None:
+            similarity = float(os.getenv('DEDUP_SIMILARITY', '0.95'))
+        self.max_distance = max_distance(similarity)
+        bands = self.max_distance + 1
+        width = FINGERPRINT_BITS // bands
+        self._bands = [(i * width, width if i < bands - 1 else FINGERPRINT_BITS - i * width)
+                       for i in range(bands)]
+        self._buckets: Dict[Tuple[int, int], Set[str]] = {}
+        self._fingerprints: Dict[str, int] = {}
+    
+    def _keys(self, value: int):
+        for band, (shift, width) in enumerate(self._bands):
+            yield band, (value >> shift) & ((1 << width) - 1)
+    
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+    
+    def __contains__(self, art_id: str) -> bool:
+        return art_id in self._fingerprints
+    
+    def add(self, art_id: str, value: int):
+        """Add or update the fingerprint for an art ID"""
+        self.remove(art_id)
+        self._fingerprints[art_id] = value
+        for key in self._keys(value):
+            self._buckets.setdefault(key, set()).add(art_id)
+    
+    def remove(self, art_id: str):
+        """Remove an art ID if present"""
+        value = self._fingerprints.pop(art_id, None)
+        if value is None:
+            return
+        for key in self._keys(value):
+            bucket = self._buckets.get(key)
+            if bucket:
+                bucket.discard(art_id)
+                if not bucket:
+                    del self._buckets[key]
+    
+    def find(self, value: int, exclude: Optional[str] = None) -> Optional[Tuple[str, int]]:
+        """Return (art ID, distance) of the closest near-duplicate, or None"""
+        best = None
+        seen = set()
+        for key in self._keys(value):
+            for art_id in self._buckets.get(key, ()):
+                if art_id in seen or art_id == exclude:
+                    continue
+                seen.add(art_id)
+                distance = bin(value ^ self._fingerprints[art_id]).count('1')
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (art_id, distance)
+        return best
@@ -0,0 +1,143 @@
+"""Timing spans written as JSON lines when MOTD_TRACE is set"""
+
+import functools
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+# MOTD_TRACE values that leave tracing off, and those that mean stderr;
+# anything else is a file path that trace lines are appended to
+DISABLED = ('', '0', 'false', 'off', 'no')
+STDERR = ('1', 'true', 'on', 'yes', 'stderr')
+
+PERCENTILES = (50, 95, 99)
+
+_file_fd: Optional[int] = None
+_file_path: Optional[str] = None
+
+class _NullSpan:
+    """Span handed out while tracing is off"""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def set(self, **fields):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+class Span:
+    """Times a block and writes one trace line when it ends"""
+    
+    __slots__ = ('name', 'fields', 'start')
+    
+    def __init__(self, name: str, fields: Dict):
+        self.name = name
+        self.fields = fields
+        self.start = 0.0
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        record(self.name, self.start, **self.fields)
+        return False
+    
+    def set(self, **fields):
+        """Attach fields (sizes, counts, token usage) to the trace line"""
+        self.fields.update(fields)
+
+def target() -> Optional[str]:
+    """Return where traces go, None while tracing is off"""
+    value = os.environ.get('MOTD_TRACE', '')
+    return None if value.lower() in DISABLED else value
+
+def span(name: str, **fields):
+    """Context manager timing a phase; a shared no-op while tracing is off"""
+    if os.environ.get('MOTD_TRACE', '').lower() in DISABLED:
+        return NULL_SPAN
+    return Span(name, fields)
+
+def traced(name: str) -> Callable:
+    """Decorator running each call of a function in a span"""
+    def decorate(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def record(name: str, start: float, **fields):
+    """Write a span that began at time.perf_counter() value `start`
+    
+    For phases that can't sit in a with block, such as imports that run
+    before MOTD_TRACE is loaded from .env.
+    """
+    global _file_fd, _file_path
+    
+    destination = target()
+    if destination is None:
+        return
+    elapsed = time.perf_counter() - start
+    entry = {
+        'ts': round(time.time() - elapsed, 6),
+        'span': name,
+        'ms': round(elapsed * 1000, 3),
+        'pid': os.getpid(),
+        **fields
+    }
+    import json
+    line = (json.dumps(entry, default=str) + '\n').encode('utf-8')
+    
+    if destination.lower() in STDERR:
+        os.write(2, line)
+        return
+    if _file_path != destination:
+        # O_APPEND keeps lines from concurrent shells whole
+        _file_fd = os.open(os.path.expanduser(destination), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        _file_path = destination
+    os.write(_file_fd, line)
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+def summarize(lines: Iterable[str], prefix: str = '') -> Dict[str, Dict]:
+    """Aggregate trace lines into counts, percentiles, max and total ms per span
+    
+    Lines that aren't trace records (e.g. a truncated last line) are skipped.
+    """
+    import json
+    
+    durations: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    for line in lines:
+        try:
+            entry = json.loads(line)
+            name, ms = entry['span'], float(entry['ms'])
+        except (ValueError, KeyError, TypeError):
+            continue
+        if name.startswith(prefix):
+            durations.setdefault(name, []).append(ms)
+            if 'error' in entry:
+                errors[name] = errors.get(name, 0) + 1
+    
+    summary = {}
+    for name, values in sorted(durations.items()):
+        values.sort()
+        summary[name] = {
+            'count': len(values),
+            'errors': errors.get(name, 0),
+            **{f"p{pct}": percentile(values, pct) for pct in PERCENTILES},
+            'max': values[-1],
+            'total': round(sum(values), 3)
+        }
+    return summary
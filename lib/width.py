@@ -0,0 +1,129 @@
+"""Terminal display width of art text"""
+
+import re
+import unicodedata
+from typing import Dict, List
+
+# ANSI escape sequences take no columns
+ESCAPE_RE = re.compile(r'\033\[[0-9;?]*[A-Za-z]')
+TOKEN_RE = re.compile(r'\033\[[0-9;?]*[A-Za-z]|.', re.DOTALL)
+
+# Variation selector requesting emoji presentation
+VARIATION_EMOJI = '\ufe0f'
+
+# Width per code point, filled as characters are met
+_widths: Dict[str, int] = {}
+
+def char_width(char: str) -> int:
+    """Return the columns a character takes: 0, 1 or 2
+    
+    Wide and fullwidth East Asian characters (which include most emoji)
+    take two columns; combining marks, format characters and controls take
+    none. Ambiguous-width characters count as one, as in Western locales.
+    """
+    width = _widths.get(char)
+    if width is None:
+        if unicodedata.combining(char) or unicodedata.category(char) in ('Mn', 'Me', 'Cf', 'Cc'):
+            width = 0
+        elif unicodedata.east_asian_width(char) in ('W', 'F'):
+            width = 2
+        else:
+            width = 1
+        _widths[char] = width
+    return width
+
+def char_class(char: str) -> str:
+    """Classify a character for the metrics histogram"""
+    code = ord(char)
+    if code < 0x80:
+        return 'ascii'
+    if 0x2800 <= code <= 0x28ff:
+        return 'braille'
+    if 0x2500 <= code <= 0x259f:
+        return 'box'
+    if code >= 0x1f000 or (0x2600 <= code <= 0x27bf) or char == VARIATION_EMOJI:
+        return 'emoji'
+    if char_width(char) == 2:
+        return 'wide'
+    return 'other'
+
+def line_width(line: str) -> int:
+    """Return the display columns of one line"""
+    if '\033' in line:
+        line = ESCAPE_RE.sub('', line)
+    if line.isascii():
+        return len(line)
+    
+    width = 0
+    previous = 1
+    for char in line:
+        if char == VARIATION_EMOJI and previous == 1:
+            # Emoji presentation widens a preceding narrow symbol (e.g. ❤️)
+            width += 1
+            previous = 2
+            continue
+        previous = char_width(char)
+        width += previous
+    return width
+
+def char_columns(line: str) -> List[int]:
+    """Return the columns each character of a line takes, as line_width counts them"""
+    columns = []
+    previous = 1
+    for char in line:
+        if char == VARIATION_EMOJI and previous == 1:
+            columns.append(1)
+            previous = 2
+            continue
+        previous = char_width(char)
+        columns.append(previous)
+    return columns
+
+def trim(line: str, columns: int) -> str:
+    """Cut a line to at most the given display columns
+    
+    Escape sequences are kept, including those after the cut so colours are
+    still reset, and a wide character that would straddle the limit is
+    dropped rather than split.
+    """
+    if line.isascii() and '\033' not in line:
+        return line[:columns]
+    
+    width = 0
+    full = False
+    out = []
+    for token in TOKEN_RE.findall(line):
+        if token.startswith('\033'):
+            out.append(token)
+            continue
+        char_columns = char_width(token)
+        if full or width + char_columns > columns:
+            full = True
+            continue
+        width += char_columns
+        out.append(token)
+    return ''.join(out)
+
+def metrics(art: str) -> Dict:
+    """Measure art: per-line widths, max width, line count, character classes and UTF-8 bytes"""
+    lines = art.split('\n')
+    widths: List[int] = [line_width(line) for line in lines]
+    classes: Dict[str, int] = {}
+    text = ESCAPE_RE.sub('', art) if '\033' in art else art
+    if text.isascii():
+        visible = len(text) - text.count(' ') - text.count('\n')
+        if visible:
+            classes['ascii'] = visible
+    else:
+        for char in text:
+            if char not in ' \n':
+                name = char_class(char)
+                classes[name] = classes.get(name, 0) + 1
+    
+    return {
+        'lines': len(lines),
+        'max_width': max(widths, default=0),
+        'widths': widths,
+        'classes': classes,
+        'bytes': len(art.encode('utf-8'))
+    }
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Login entry point for MOTD Artisan
+
+The shell wrapper runs this on every interactive login, so it only imports
+what displaying cached art needs: no click, no python-dotenv and no OpenAI SDK.
+"""
+
+import time
+
+# Taken before any other import so MOTD_TRACE can report import time
+_started = time.perf_counter()
+
+import os
+import sys
+from pathlib import Path
+
+# Add lib to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from lib.config import load_env, default_cache_dir
+from lib import trace
+
+def refill_if_low(cache) -> bool:
+    """Start a background refill worker if the cache is below its watermark"""
+    threshold = int(os.getenv('REFILL_THRESHOLD', '1'))
+    if cache.size() >= threshold:
+        return False
+    
+    # Only pay for the subprocess/fcntl imports when a refill is due
+    from lib.refill import RefillWorker
+    return RefillWorker(cache).spawn()
+
+def from_daemon() -> bool:
+    """Print a piece rendered by a running `main.py serve`, False if none answers"""
+    from lib.serve import socket_path, request
+    
+    path = socket_path(default_cache_dir())
+    if not path.exists():
+        return False
+    with trace.span('login.daemon') as span:
+        data = request(path, f"show colorterm={os.getenv('COLORTERM', '')} term={os.getenv('TERM', '')}")
+        span.set(served=data is not None)
+    if data is None:
+        return False
+    sys.stdout.flush()
+    sys.stdout.buffer.write(data)
+    sys.stdout.buffer.flush()
+    return True
+
+def run():
+    """Display a random cached piece, failing silently"""
+    try:
+        # Imported here so that a piece served by the daemon never loads them
+        from lib.cache import open_cache, bundled_entry
+        from lib.display import ArtDisplay
+        from lib.render_cache import RenderCache
+        from lib.rotation import Rotation
+        
+        cache = open_cache()
+        display = ArtDisplay(RenderCache(cache.cache_dir / 'render'))
+        auto_fetch = os.getenv('AUTO_FETCH', 'true').lower() == 'true'
+        
+        # Silent mode - only output art, no messages
+        entry = Rotation(cache).next_entry()
+        if entry is None and auto_fetch:
+            # Only fetch in the foreground if it fits SHOW_BUDGET (lib.breaker)
+            from lib.breaker import fetch_within_budget
+            entry = fetch_within_budget(cache, float(os.getenv('SHOW_BUDGET', '0')))
+        art_id, art = entry or bundled_entry() or (None, None)
+        
+        # Top up the cache in the background
+        if auto_fetch:
+            with trace.span('refill.check') as span:
+                span.set(spawned=refill_if_low(cache))
+        
+        if art:
+            theme = os.getenv('THEME', 'cyberpunk')
+            effect = os.getenv('ANIMATION', 'off').lower()
+            if effect != 'off':
+                display.animate(art, effect, theme=theme, art_id=art_id)
+            else:
+                display.display(art, theme=theme, art_id=art_id)
+        # If no art, fail silently for login
+    
+    except:
+        # Fail silently on login to not disrupt shell startup
+        pass
+
+if __name__ == '__main__':
+    with trace.span('env.load'):
+        load_env(Path(__file__).parent / '.env')
+    trace.record('login.import', _started)
+    with trace.span('login.run'):
+        # The daemon keeps everything loaded; ask it before doing the work here.
+        # It only serves still art
+        if os.getenv('ANIMATION', 'off').lower() != 'off' or not from_daemon():
+            run()
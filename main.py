@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 """Main entry point for MOTD Artisan"""
 
+import time
+
+# Taken before any other import so MOTD_TRACE can report import time
+_started = time.perf_counter()
+
 import click
 import sys
 import os
@@ -10,36 +15,125 @@ from dotenv import load_dotenv
 # Add lib to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from lib import ArtFetcher, ArtCache, ArtDisplay
+from lib import ArtFetcher, ArtDisplay, open_cache
+from lib.cache import bundled_entry
+from lib.render_cache import RenderCache
+from lib import trace
 
 # Load environment variables
 env_file = Path(__file__).parent / '.env'
 if env_file.exists():
-    load_dotenv(env_file)
+    with trace.span('env.load'):
+        load_dotenv(env_file)
+trace.record('main.import', _started)
 
 @click.group()
-def cli():
+@click.option('--system', is_flag=True, help='Work on the shared SYSTEM_STORE instead of your own cache')
+@click.pass_context
+def cli(ctx, system):
     """MOTD Artisan - Display beautiful ASCII art as Message of the Day"""
-    pass
+    if system:
+        # The store is then a plain cache of its own, with no layer below it
+        store = os.getenv('SYSTEM_STORE')
+        if not store:
+            raise click.UsageError("--system needs SYSTEM_STORE to be set")
+        os.environ.update({'CACHE_DIR': store, 'SYSTEM_STORE': ''})
+    if trace.target() is not None:
+        started = time.perf_counter()
+        ctx.call_on_close(lambda: trace.record(f"command.{ctx.invoked_subcommand}", started))
 
 @cli.command()
 @click.option('--prompt', '-p', help='Custom prompt for art generation')
-def fetch(prompt):
+@click.option('--count', '-n', default=1, type=click.IntRange(min=1), help='Number of pieces to fetch')
+@click.option('--concurrency', '-j', default=lambda: int(os.getenv('FETCH_CONCURRENCY', '4')),
+              type=click.IntRange(min=1), help='Parallel requests when fetching several pieces')
+@click.option('--rate', default=lambda: float(os.getenv('FETCH_RATE', '0')) or None, type=float,
+              help='Maximum requests started per second (default: unlimited)')
+@click.option('--progressive', '-P', is_flag=True, help='Print lines as they stream in (single fetch)')
+def fetch(prompt, count, concurrency, rate, progressive):
     """Fetch new ASCII art from OpenAI"""
     try:
         fetcher = ArtFetcher()
-        cache = ArtCache()
+        cache = open_cache()
+        
+        if count > 1:
+            click.echo(f"Fetching {count} pieces of ASCII art ({concurrency} in parallel)...")
+            done = [0]
+            
+            def progress(art_data, error):
+                done[0] += 1
+                status = 'ok' if error is None else f"failed: {error}"
+                click.echo(f"  [{done[0]}/{count}] {status}")
+            
+            results, errors = fetcher.fetch_batch(count, concurrency=concurrency, rate=rate,
+                                                  prompt=prompt, on_done=progress)
+            # Commit the whole batch with one metadata write
+            art_ids = cache.save_many(results) if results else []
+            rejected = len(cache.last_rejected) if results else 0
+            click.echo(f"Saved {len(art_ids) - rejected} pieces, {rejected} near-duplicates skipped, "
+                       f"{len(errors)} failed")
+            if not results:
+                sys.exit(1)
+            return
         
         click.echo("Fetching new ASCII art from OpenAI...")
-        art_data = fetcher.fetch_art(prompt)
+        art_data = fetcher.fetch_art(prompt, on_line=click.echo if progressive else None)
         
         art_id = cache.save_art(art_data)
-        click.echo(f"Art saved with ID: {art_id}")
+        if cache.last_rejected:
+            click.echo(f"Not saved: near-duplicate of cached art {art_id}")
+        else:
+            click.echo(f"Art saved with ID: {art_id}")
         
-        # Display the fetched art
-        display = ArtDisplay()
-        display.display(art_data['art'], theme=art_data.get('theme'))
+        # Display the fetched art, unless it was already printed as it arrived
+        if not progressive:
+            display = ArtDisplay()
+            display.display(art_data['art'], theme=art_data.get('theme'))
+    
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+@cli.command()
+@click.argument('sources', nargs=-1, required=True)
+@click.option('--mode', '-m', type=click.Choice(['ascii', 'blocks', 'braille']),
+              default=lambda: os.getenv('CONVERT_MODE', 'braille'), help='Characters to draw with')
+@click.option('--width', '-W', type=click.IntRange(min=1), help='Maximum columns (default: ASCII_WIDTH)')
+@click.option('--height', '-H', type=click.IntRange(min=1), help='Maximum lines (default: ASCII_HEIGHT)')
+@click.option('--dither/--no-dither', default=None, help='Ordered dithering (default: CONVERT_DITHER)')
+@click.option('--invert', is_flag=True, default=None, help='Draw dark parts of the image instead of bright ones')
+@click.option('--theme', '-t', default=lambda: os.getenv('THEME', 'cyberpunk'), help='Theme category')
+@click.option('--pattern', default=None, help='Files to convert from directories and archives')
+@click.option('--jobs', '-j', type=click.IntRange(min=1), help='Worker processes (default: CPU count)')
+def convert(sources, mode, width, height, dither, invert, theme, pattern, jobs):
+    """Convert images into art locally, without the API
+    
+    SOURCES are image files, directories, globs or .tar/.zip archives. PNG
+    and PGM/PPM are read as is; other formats need Pillow.
+    """
+    from lib.bulk import import_sources
+    from lib.convert import IMAGE_PATTERN, ImageConverter
+    
+    try:
+        converter = ImageConverter(mode, width, height, dither, invert)
+        cache = open_cache()
+        report = import_sources(cache, [*sources], {'theme': theme}, pattern=pattern or IMAGE_PATTERN,
+                                jobs=jobs, prepare_piece=converter.prepare)
         
+        imported = report['imported']
+        seconds = sum(report['seconds'].values())
+        click.echo(f"Converted {len(imported)} of {report['found']} images in {seconds:.2f}s "
+                   f"({converter.mode}, {converter.width}x{converter.height}), "
+                   f"{len(report['duplicates']) + len(report['near_duplicates'])} duplicates skipped, "
+                   f"{len(report['failed'])} failed")
+        for failure in report['failed'][:5]:
+            click.echo(f"  {failure['name']}: {failure['error']}")
+        if len(imported) == 1:
+            click.echo(f"Art saved with ID: {imported[0]['id']}")
+            ArtDisplay().display(cache.get_art_by_id(imported[0]['id']), theme=theme)
+        if not imported and report['failed']:
+            sys.exit(1)
+    
     except Exception as e:
         click.echo(f"Error: {e}", err=True)
         sys.exit(1)
@@ -48,57 +142,127 @@ def fetch(prompt):
 @click.option('--id', '-i', help='Display specific art by ID')
 @click.option('--border', '-b', is_flag=True, help='Display with border')
 @click.option('--center', '-c', is_flag=True, help='Center the art')
-def show(id, border, center):
+@click.option('--theme', '-t', 'theme_filter', help='Pick from art of this theme')
+@click.option('--style', '-s', 'style_filter', help='Pick from art of this style')
+@click.option('--max-width', type=click.IntRange(min=1), help='Pick from art at most this many columns wide')
+@click.option('--animate', 'effect', type=click.Choice(['off', 'frames', 'rain', 'typewriter', 'scroll']),
+              default=lambda: os.getenv('ANIMATION', 'off').lower(), help='Animation effect (default: ANIMATION)')
+@click.option('--stats', is_flag=True, help='Report frame render time and bytes per frame (with --animate)')
+@click.option('--budget', type=click.FloatRange(min=0), default=lambda: float(os.getenv('SHOW_BUDGET', '0')),
+              help='Seconds to spend fetching when the cache is empty (default: SHOW_BUDGET)')
+def show(id, border, center, theme_filter, style_filter, max_width, effect, stats, budget):
     """Display random cached ASCII art"""
+    effect = None if effect == 'off' else effect
+    if effect and (border or center):
+        raise click.UsageError("--animate can't be combined with --border or --center")
     try:
-        cache = ArtCache()
-        display = ArtDisplay()
-        
-        # Check if cache is empty and auto-fetch if configured
-        if cache.is_empty() and os.getenv('AUTO_FETCH', 'true').lower() == 'true':
-            click.echo("Cache is empty, fetching new art...", err=True)
-            fetcher = ArtFetcher()
-            art_data = fetcher.fetch_art()
-            cache.save_art(art_data)
+        cache = open_cache()
+        display = ArtDisplay(RenderCache(cache.cache_dir / 'render'))
+        auto_fetch = os.getenv('AUTO_FETCH', 'true').lower() == 'true'
         
         # Get art from cache
         if id:
-            art = cache.get_art_by_id(id)
+            art_id, art = id, cache.get_art_by_id(id)
             if not art:
                 click.echo(f"Art with ID {id} not found", err=True)
                 sys.exit(1)
+        elif theme_filter or style_filter or max_width:
+            # Filtered picks go through the search index, created on first use
+            from lib.search import SearchIndex
+            index = SearchIndex(cache)
+            index.sync()
+            art_id = index.random_id(theme=theme_filter, style=style_filter, max_width=max_width)
+            index.close()
+            art = cache.get_art_by_id(art_id) if art_id else None
+            if not art:
+                click.echo("No cached art matches the filters", err=True)
+                sys.exit(1)
         else:
-            art = cache.get_random_art()
+            from lib.rotation import Rotation
+            entry = Rotation(cache).next_entry()
+            if entry is None and auto_fetch:
+                # Fetch only what can arrive within the budget, else show bundled art
+                from lib.breaker import fetch_within_budget
+                entry = fetch_within_budget(cache, budget)
+            art_id, art = entry or bundled_entry() or (None, None)
             if not art:
                 click.echo("No art in cache. Run 'fetch' to get some!", err=True)
                 sys.exit(1)
         
-        # Display the art
-        theme = os.getenv('THEME', 'cyberpunk')
+        # Refill in the background if the cache is low and auto-fetch is on
+        if auto_fetch:
+            from lib.refill import RefillWorker
+            with trace.span('refill.check') as span:
+                worker = RefillWorker(cache)
+                spawned = worker.needs_refill() and worker.spawn()
+                span.set(spawned=spawned)
+            if spawned:
+                click.echo("Cache is low, fetching new art in the background...", err=True)
+        
+        if id or theme_filter or style_filter or max_width:
+            # Rotation picks record themselves; count these for EVICTION too
+            from lib.eviction import record_show
+            record_show(cache.cache_dir, art_id)
         
+        # Display the art, in the colors of the requested theme if it has any
+        theme = theme_filter if theme_filter in display.themes else os.getenv('THEME', 'cyberpunk')
+        
+        # Layouts pad by display width, measured when the art was saved
+        metrics = cache.get_metrics(art_id) if art_id and (border or center) else None
         if border:
-            display.display_with_border(art)
+            display.display_with_border(art, art_id=art_id, metrics=metrics)
         elif center:
-            display.print_centered(art)
+            display.print_centered(art, art_id=art_id, metrics=metrics)
+        elif effect:
+            player = display.animate(art, effect, theme=theme, art_id=art_id)
+            if stats and player is not None:
+                report = player.report()
+                click.echo(f"{report['frames']} frames ({report['dropped']} dropped) in {report['seconds']:.2f}s; "
+                           f"render {report['render_us']['p50']:.0f} us median, {report['render_us']['max']:.0f} us max; "
+                           f"{report['bytes']['mean']:.0f} bytes per frame on average, "
+                           f"{report['bytes']['max']} max, {report['bytes']['total']} total", err=True)
         else:
-            display.display(art, theme=theme)
-        
+            display.display(art, theme=theme, art_id=art_id)
+    
     except Exception as e:
         click.echo(f"Error: {e}", err=True)
         sys.exit(1)
 
 @cli.command()
-def list():
+@click.option('--limit', type=click.IntRange(min=0), help='Show at most this many pieces')
+@click.option('--offset', default=0, type=click.IntRange(min=0), help='Skip this many pieces first')
+@click.option('--sort', default='created', show_default=True, type=click.Choice(['created', 'theme']),
+              help='Order of the listing')
+@click.option('--desc', is_flag=True, help='Sort in descending order')
+@click.option('--format', 'output_format', default='table', show_default=True,
+              type=click.Choice(['table', 'json', 'jsonl']), help='Output format')
+def list(limit, offset, sort, desc, output_format):
     """List all cached ASCII art"""
+    import json
+    
     try:
-        cache = ArtCache()
-        items = cache.list_cached_art()
+        cache = open_cache()
+        # Pieces are streamed from the cache index as they are printed
+        items = cache.iter_cached_art(offset=offset, limit=limit, sort=sort, descending=desc)
+        
+        if output_format == 'jsonl':
+            for item in items:
+                click.echo(json.dumps(item, ensure_ascii=False))
+            return
+        if output_format == 'json':
+            separator = '['
+            for item in items:
+                click.echo(separator + json.dumps(item, ensure_ascii=False), nl=False)
+                separator = ',\n'
+            click.echo(']' if separator != '[' else '[]')
+            return
         
-        if not items:
+        total = cache.size()
+        if not total:
             click.echo("No art in cache")
             return
         
-        click.echo(f"Cached ASCII Art ({len(items)} items):")
+        click.echo(f"Cached ASCII Art ({total} items):")
         click.echo("-" * 50)
         
         for item in items:
@@ -106,10 +270,53 @@ def list():
             click.echo(f"  Created: {item['created']}")
             click.echo(f"  Theme: {item.get('theme', 'N/A')}")
             click.echo(f"  Style: {item.get('style', 'N/A')}")
+            metrics = item.get('metrics')
+            if metrics:
+                classes = ', '.join(f"{name} {count}" for name, count in
+                                    sorted(metrics['classes'].items(), key=lambda c: -c[1]))
+                click.echo(f"  Size: {metrics['max_width']}x{metrics['lines']} ({classes or 'blank'})")
+            if item.get('pinned'):
+                click.echo("  Pinned: yes")
+            if item.get('system'):
+                click.echo("  System: yes")
             if item.get('prompt'):
                 click.echo(f"  Prompt: {item['prompt'][:50]}...")
             click.echo()
+    
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+@cli.command()
+@click.argument('query')
+@click.option('--theme', '-t', help='Only art of this theme')
+@click.option('--style', '-s', help='Only art of this style')
+@click.option('--limit', '-n', default=20, show_default=True, type=click.IntRange(min=1),
+              help='Maximum results')
+@click.option('--format', 'output_format', default='table', show_default=True,
+              type=click.Choice(['table', 'jsonl']), help='Output format')
+def search(query, theme, style, limit, output_format):
+    """Search cached art by prompt text"""
+    import json
+    from lib.search import SearchIndex
+    
+    try:
+        index = SearchIndex(open_cache())
+        index.sync()
+        results = index.search(query, theme=theme, style=style, limit=limit)
+        index.close()
         
+        if output_format == 'jsonl':
+            for item in results:
+                click.echo(json.dumps(item, ensure_ascii=False))
+            return
+        if not results:
+            click.echo(f"No art matches '{query}'")
+            return
+        for item in results:
+            click.echo(f"{item['id']}  {item['theme']:<10} {item['width']:>3}x{item['lines']:<3} "
+                       f"{item['style'][:20]:<20} {item['prompt'][:50]}")
+    
     except Exception as e:
         click.echo(f"Error: {e}", err=True)
         sys.exit(1)
@@ -120,7 +327,7 @@ def list():
 def delete(art_id, force):
     """Delete specific ASCII art by ID from cache"""
     try:
-        cache = ArtCache()
+        cache = open_cache()
         
         # Check if art exists
         art = cache.get_art_by_id(art_id)
@@ -148,7 +355,23 @@ def delete(art_id, force):
                 sys.exit(1)
         else:
             click.echo("Deletion cancelled")
-        
+    
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+@cli.command()
+@click.argument('art_id')
+@click.option('--unpin', is_flag=True, help='Let eviction remove the piece again')
+def pin(art_id, unpin):
+    """Keep a piece in the cache whatever EVICTION and the budgets say"""
+    try:
+        cache = open_cache()
+        if not cache.set_pinned(art_id, not unpin):
+            click.echo(f"Art with ID {art_id} not found", err=True)
+            sys.exit(1)
+        click.echo(f"Art {art_id} {'unpinned' if unpin else 'pinned'}")
+    
     except Exception as e:
         click.echo(f"Error: {e}", err=True)
         sys.exit(1)
@@ -158,32 +381,297 @@ def delete(art_id, force):
 def clear():
     """Clear all cached ASCII art"""
     try:
-        cache = ArtCache()
+        cache = open_cache()
         cache.clear_cache()
         click.echo("Cache cleared successfully")
+    
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+@cli.command()
+@click.option('--delete', 'delete_dupes', is_flag=True, help='Delete the newer piece of each near-duplicate pair')
+def dedupe(delete_dupes):
+    """Find near-duplicate art in the cache"""
+    try:
+        cache = open_cache()
+        duplicates = cache.find_duplicates()
+        if not duplicates:
+            click.echo("No near-duplicates found")
+            return
         
+        for art_id, original_id, distance in duplicates:
+            click.echo(f"{art_id}  duplicates {original_id}  ({distance} bits apart)")
+        if delete_dupes:
+            deleted = sum(cache.delete_art_by_id(art_id) for art_id, _, _ in duplicates)
+            click.echo(f"Deleted {deleted} near-duplicates")
+        else:
+            click.echo(f"{len(duplicates)} near-duplicates, run with --delete to remove them")
+    
     except Exception as e:
         click.echo(f"Error: {e}", err=True)
         sys.exit(1)
 
 @cli.command()
-def login():
-    """Display art for login (used by shell integration)"""
+@click.option('--remove', is_flag=True, help='Delete compiled output and disable compiled mode')
+def compile(remove):
+    """Pre-render cached art for Python-free shell login"""
+    from lib.compiled import MotdCompiler
+    
     try:
-        cache = ArtCache()
-        display = ArtDisplay()
+        compiler = MotdCompiler(open_cache())
+        if remove:
+            compiler.remove()
+            click.echo("Compiled MOTD removed")
+            return
         
-        # Silent mode - only output art, no messages
-        art = cache.get_random_art()
+        count = compiler.build()
+        click.echo(f"Compiled {count} art pieces into {compiler.compiled_dir}")
+    
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+@cli.command()
+@click.option('--to', 'backend', type=click.Choice(['pack', 'files']), required=True,
+              help='Storage backend to convert the cache to')
+def migrate(backend):
+    """Convert the cache between per-file and packed storage"""
+    from lib.pack import migrate_to_pack, migrate_to_files
+    
+    try:
+        if backend == 'pack':
+            count = migrate_to_pack()
+        else:
+            count = migrate_to_files()
+        click.echo(f"Migrated {count} art pieces to {backend} storage")
+        if os.getenv('CACHE_BACKEND'):
+            click.echo(f"Remember to set CACHE_BACKEND={backend} in .env", err=True)
+    
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+@cli.command()
+@click.option('--dict-size', default='32k', show_default=True,
+              help='Dictionary size (at most 32k, all deflate can use)')
+def recompress(dict_size):
+    """Store cached art per CACHE_COMPRESS, retraining the dictionary"""
+    from lib.eviction import parse_size
+    
+    try:
+        report = open_cache().recompress(parse_size(dict_size))
+        if report['compression'] == 'off':
+            click.echo(f"Stored {report['pieces']} art pieces as plain text "
+                       f"({report['stored_before'] / 1024:.1f} KiB before, {report['stored_bytes'] / 1024:.1f} KiB now)")
+            return
+        if not report['pieces']:
+            click.echo("No cached art to train a dictionary on")
+            return
         
-        if art:
-            theme = os.getenv('THEME', 'cyberpunk')
-            display.display(art, theme=theme)
-        # If no art, fail silently for login
+        ratio = report['text_bytes'] / report['stored_bytes'] if report['stored_bytes'] else 0
+        decode = report['decode_us']
+        click.echo(f"Recompressed {report['pieces']} art pieces with {report['compression']} dictionary "
+                   f"{report['dictionary']} ({report['dictionary_bytes'] / 1024:.1f} KiB, "
+                   f"trained in {report['train_seconds']:.2f}s)")
+        click.echo(f"Size: {report['text_bytes'] / 1024:.1f} KiB as text, {report['stored_before'] / 1024:.1f} KiB "
+                   f"stored before, {report['stored_bytes'] / 1024:.1f} KiB now ({ratio:.2f}x)")
+        click.echo(f"Decode: {decode['p50']:.0f} us median, {decode['p99']:.0f} us p99 per piece, "
+                   f"plus {report['dictionary_load_us']:.0f} us to read the dictionary once per process")
+    
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+@cli.command()
+@click.option('--repair', is_flag=True, help='Rebuild the index from the pieces on disk')
+@click.option('--jobs', '-j', type=click.IntRange(min=1), help='Worker processes for hashing (default: CPU count)')
+@click.option('--show', 'show_count', default=10, show_default=True, type=click.IntRange(min=0),
+              help='Pieces listed per kind of problem')
+@click.option('--format', 'output_format', default='table', show_default=True,
+              type=click.Choice(['table', 'json']), help='Output format')
+def fsck(repair, jobs, show_count, output_format):
+    """Check the cache index against the files on disk"""
+    import json
+    from lib.fsck import PROBLEMS, check
+    
+    try:
+        report = check(open_cache(), repair=repair, jobs=jobs)
+        problems = report['problems']
+        if output_format == 'json':
+            click.echo(json.dumps(report, indent=2))
+        else:
+            click.echo(f"Checked {report['checked']} pieces ({report['backend']} backend) in {report['seconds']:.2f}s")
+            for kind, description in PROBLEMS:
+                if kind not in problems:
+                    continue
+                click.echo(f"{kind}: {len(problems[kind])} {description}")
+                for name, detail in problems[kind][:show_count]:
+                    click.echo(f"  {name}  {detail}".rstrip())
+                if len(problems[kind]) > show_count:
+                    click.echo(f"  ... and {len(problems[kind]) - show_count} more")
+            if 'repaired' in report:
+                repaired = report['repaired']
+                click.echo(f"Repaired: {repaired['adopted']} adopted, {repaired['dropped']} index entries dropped, "
+                           f"{repaired['metadata_restored']} .json restored, {repaired['files_removed']} files removed")
+            elif problems:
+                click.echo("Run with --repair to fix the index")
+            else:
+                click.echo("No problems found")
+        
+        # Like fsck(8), exit 1 while problems remain; repair leaves hash
+        # mismatches alone since a custom ID may just look like a hash
+        remaining = set(problems) & {'mismatch'} if 'repaired' in report else set(problems)
+        if remaining:
+            sys.exit(1)
+    
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+@cli.command()
+@click.option('--background', is_flag=True, help='Start a detached worker and return')
+def refill(background):
+    """Fetch art until the cache reaches REFILL_TARGET"""
+    from lib.refill import RefillWorker
+    
+    try:
+        worker = RefillWorker(open_cache())
+        if background:
+            if worker.spawn():
+                click.echo(f"Refill worker started, logging to {worker.log_file}")
+            else:
+                click.echo(f"Refill worker already running (PID {worker.running_pid()})")
+            return
         
-    except:
-        # Fail silently on login to not disrupt shell startup
-        pass
+        saved = worker.run()
+        click.echo(f"Refill saved {saved} art pieces")
+    
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+@cli.command()
+@click.option('--socket', 'socket_file', type=click.Path(dir_okay=False),
+              help='Unix socket to listen on (default: MOTD_SOCKET or cache/motd.sock)')
+def serve(socket_file):
+    """Serve rendered art to login shells over a Unix socket"""
+    from lib.serve import ArtServer
+    
+    try:
+        server = ArtServer(open_cache(), socket_file)
+        click.echo(f"Serving {server.cache.size()} art pieces on {server.path}", err=True)
+        server.serve()
+    
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+@cli.command()
+@click.option('--lines', '-n', default=10, help='Number of log lines to show')
+def status(lines):
+    """Show cache level and background refill worker status"""
+    from lib.breaker import CircuitBreaker
+    from lib.refill import RefillWorker
+    from lib.rotation import Rotation
+    
+    try:
+        cache = open_cache()
+        worker = RefillWorker(cache)
+        pid = worker.running_pid()
+        
+        click.echo(f"Cached art: {cache.size()} (threshold {worker.threshold}, target {worker.target})")
+        click.echo(f"Refill worker: {'running (PID ' + str(pid) + ')' if pid is not None else 'not running'}")
+        breaker = CircuitBreaker(cache.cache_dir).status()
+        latency = f", fetches take {breaker['latency']:.1f}s" if breaker['latency'] is not None else ''
+        if breaker['state'] == 'open':
+            click.echo(f"Fetching: paused after {breaker['failures']} failures, "
+                       f"retrying in {breaker['retry_in']:.0f}s{latency}")
+        else:
+            failed = f", {breaker['failures']} failed in a row" if breaker['failures'] else ''
+            click.echo(f"Fetching: ok{failed}{latency}")
+        rotation = Rotation(cache).status()
+        progress = f", {rotation['round'][0]} of {rotation['round'][1]} this round" if 'round' in rotation else ''
+        click.echo(f"Rotation: {rotation['policy']} ({rotation['shown']} shown{progress})")
+        eviction = cache.eviction_status()
+        budget = f"{eviction['items']} of {eviction['max_items']} pieces"
+        if eviction['max_bytes']:
+            budget += f", {eviction['bytes'] / 1024:.0f} of {eviction['max_bytes'] / 1024:.0f} KiB"
+        pinned = f"; {eviction['pinned']} pinned, {eviction['pinned_bytes'] / 1024:.0f} KiB" if eviction['pinned'] else ''
+        click.echo(f"Eviction: {eviction['policy']} ({budget}{pinned})")
+        compression = cache.compression_status()
+        if compression['mode'] != 'off':
+            dictionary = (f"dictionary {compression['dictionary']}" if compression['dictionary']
+                          else "no dictionary yet, run recompress")
+            click.echo(f"Compression: {compression['mode']} ({dictionary})")
+        if hasattr(cache, 'layer_status'):
+            layers = cache.layer_status()
+            hidden = f", {layers['hidden']} hidden" if layers['hidden'] else ''
+            click.echo(f"Layers: {layers['system']} system pieces from {layers['store']}{hidden}, "
+                       f"{layers['own']} your own")
+        daemon = serve_status(cache)
+        if daemon is not None:
+            click.echo(f"Daemon: PID {daemon['pid']} on {daemon['socket']}, {daemon['requests']} requests "
+                       f"in {daemon['uptime'] / 60:.0f} min, {daemon['rendered']} renders in memory")
+        log_lines = worker.tail_log(lines)
+        if log_lines:
+            click.echo(f"Recent log ({worker.log_file}):")
+            for line in log_lines:
+                click.echo(f"  {line}")
+    
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+def serve_status(cache):
+    """Ask a running `serve` daemon for its counters, None if none answers"""
+    import json
+    from lib.serve import socket_path, request
+    
+    path = socket_path(cache.cache_dir)
+    reply = request(path, 'status') if path.exists() else None
+    if reply is None:
+        return None
+    return dict(json.loads(reply), socket=str(path))
+
+@cli.command()
+@click.argument('trace_file', required=False, type=click.Path(exists=True, dir_okay=False))
+@click.option('--span', 'prefix', default='', help='Only phases whose name starts with this')
+@click.option('--format', 'output_format', default='table', show_default=True,
+              type=click.Choice(['table', 'json']), help='Output format')
+def stats(trace_file, prefix, output_format):
+    """Summarize MOTD_TRACE timings per phase (p50/p95/p99)"""
+    import json
+    
+    try:
+        if trace_file is None:
+            trace_file = trace.target()
+            if trace_file is None or trace_file.lower() in trace.STDERR:
+                raise ValueError("Give a trace file or set MOTD_TRACE to one")
+        with open(os.path.expanduser(trace_file), 'r') as f:
+            summary = trace.summarize(f, prefix)
+        
+        if output_format == 'json':
+            click.echo(json.dumps(summary, indent=2))
+            return
+        if not summary:
+            click.echo("No trace records found")
+            return
+        click.echo(f"{'phase':<24}{'count':>7}{'errors':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name, row in summary.items():
+            click.echo(f"{name:<24}{row['count']:>7}{row['errors']:>7}{row['p50']:>10.2f}{row['p95']:>10.2f}"
+                       f"{row['p99']:>10.2f}{row['max']:>10.2f}")
+    
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+@cli.command()
+def login():
+    """Display art for login (used by shell integration)"""
+    # Shell startup calls login.py directly; this command shares its code
+    from login import run
+    run()
 
 if __name__ == '__main__':
     cli()
\ No newline at end of file
@@ -28,13 +28,17 @@ motd-show() {
 }
 
 motd-list() {
-    python3 "$SCRIPT_DIR/main.py" list
+    python3 "$SCRIPT_DIR/main.py" list "$@"
 }
 
 motd-delete() {
     python3 "$SCRIPT_DIR/main.py" delete "$@"
 }
 
+motd-pin() {
+    python3 "$SCRIPT_DIR/main.py" pin "$@"
+}
+
 motd-clear() {
     python3 "$SCRIPT_DIR/main.py" clear
 }
@@ -43,12 +47,89 @@ motd-import() {
     python3 "$SCRIPT_DIR/import_art.py" "$@"
 }
 
+motd-convert() {
+    python3 "$SCRIPT_DIR/main.py" convert "$@"
+}
+
+motd-status() {
+    python3 "$SCRIPT_DIR/main.py" status "$@"
+}
+
+motd-compile() {
+    python3 "$SCRIPT_DIR/main.py" compile "$@"
+}
+
+motd-dedupe() {
+    python3 "$SCRIPT_DIR/main.py" dedupe "$@"
+}
+
+motd-search() {
+    python3 "$SCRIPT_DIR/main.py" search "$@"
+}
+
+motd-fsck() {
+    python3 "$SCRIPT_DIR/main.py" fsck "$@"
+}
+
+motd-stats() {
+    python3 "$SCRIPT_DIR/main.py" stats "$@"
+}
+
+motd-serve() {
+    python3 "$SCRIPT_DIR/main.py" serve "$@"
+}
+
+# The cache directory: CACHE_DIR if exported, else cache/ next to this script
+_motd_cache_dir() {
+    local dir="${CACHE_DIR:-$SCRIPT_DIR/cache}"
+    printf '%s\n' "${dir/#\~/$HOME}"
+}
+
+# Print a random pre-rendered piece using shell builtins only (no python3).
+# Fails if compiled output is missing or older than the cache index, the
+# SYSTEM_STORE index or .env.
+_motd_compiled() {
+    local cache="$(_motd_cache_dir)"
+    local dir="$cache/compiled"
+    local store="${SYSTEM_STORE/#\~/$HOME}"
+    local count gen file line
+    local src
+    [[ -f "$dir/index" ]] || return 1
+    for src in "$cache/metadata.json" "$cache/art.idx" "$cache/hidden.json" \
+               ${store:+"$store/metadata.json" "$store/art.idx"} "$SCRIPT_DIR/.env"; do
+        [[ -e "$src" && "$src" -nt "$dir/index" ]] && return 1
+    done
+    read -r count gen < "$dir/index" || return 1
+    (( count > 0 )) || return 1
+    file="$dir/$gen/$(( RANDOM % count )).ans"
+    [[ -f "$file" ]] || return 1
+    while IFS= read -r line || [[ -n "$line" ]]; do
+        printf '%s\n' "$line"
+    done < "$file"
+}
+
+# Print a piece rendered by a running `main.py serve` daemon (needs socat).
+# Fails within MOTD_SOCKET_TIMEOUT seconds if the daemon doesn't answer.
+_motd_daemon() {
+    local sock="${MOTD_SOCKET:-$(_motd_cache_dir)/motd.sock}"
+    sock="${sock/#\~/$HOME}"
+    local out
+    [[ -S "$sock" ]] || return 1
+    command -v socat >/dev/null 2>&1 || return 1
+    out=$(printf 'show colorterm=%s term=%s\n' "${COLORTERM:-}" "${TERM:-}" |
+        socat -T "${MOTD_SOCKET_TIMEOUT:-0.2}" - "UNIX-CONNECT:$sock" 2>/dev/null) || return 1
+    [[ -n "$out" ]] || return 1
+    printf '%s\n' "$out"
+}
+
 # Auto-display on login (only if interactive shell)
 if [[ $- == *i* ]]; then
     # Check if we should display art on login
     if [[ -z "$MOTD_ARTISAN_SHOWN" ]]; then
         export MOTD_ARTISAN_SHOWN=1
-        python3 "$SCRIPT_DIR/main.py" login 2>/dev/null
+        # Prefer the daemon, then compiled output; login.py also tries the
+        # daemon first and skips click/dotenv/openai imports
+        _motd_daemon 2>/dev/null || _motd_compiled 2>/dev/null || python3 "$SCRIPT_DIR/login.py" 2>/dev/null
     fi
 fi
 